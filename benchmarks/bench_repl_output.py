@@ -0,0 +1,188 @@
+"""Benchmark of the REPL output cleaning: legacy string-slicing emulator vs ScreenBuffer.
+
+Usage:
+    python benchmarks/bench_repl_output.py [--size-mb 4]
+"""
+import argparse
+import re
+import time
+from collections.abc import Callable
+
+from repltilian import repl_output
+
+
+def legacy_clean(text: str) -> str:
+    """Reference implementation of repl_output.clean before the incremental rewrite."""
+    # Initialize the screen buffer as a list of lines
+    screen_lines = [""]
+    line = 0  # Current line index
+    col = 0  # Current column index
+    i = 0  # Current index in the input text
+    n = len(text)
+
+    def read_escape_sequence(s: str, i_: int) -> tuple[str | None, int]:
+        """Reads an ANSI escape sequence starting from index i in string s.
+
+        Returns the escape sequence and the index after the sequence.
+        """
+        if s[i_ : i_ + 2] != "\x1b[":
+            return None, i_ + 1  # Not an escape sequence we recognize
+        j = i_ + 2
+        while j < len(s):
+            if "A" <= s[j] <= "Z" or "a" <= s[j] <= "z":
+                # End of the escape sequence
+                j += 1  # Include the command character
+                return s[i_:j], j
+            else:
+                j += 1
+        # If we reach here, didn't find the end of escape sequence
+        return s[i_:j], j
+
+    while i < n:
+        c = text[i]
+        if c == "\x1b":
+            # Process escape sequence
+            esc_seq, next_i = read_escape_sequence(text, i)
+            if esc_seq:
+                # Process the escape sequence
+                i = next_i
+                # Extract the command and parameters
+                cmd_match = re.match(r"\x1b\[([0-9;]*)([A-Za-z])", esc_seq)
+                if cmd_match:
+                    params = cmd_match.group(1)
+                    cmd = cmd_match.group(2)
+                    # Process the command
+                    if cmd == "G":
+                        # Cursor horizontal absolute
+                        # Move cursor to column N (default 1)
+                        N = int(params) if params else 1
+                        col = max(N - 1, 0)  # Adjust for zero-based index
+                    elif cmd == "J":
+                        # Erase display from cursor to end of screen
+                        # Clear from current line and position to end
+                        screen_lines = screen_lines[: line + 1]
+                        # Truncate the current line from cursor position
+                        screen_lines[line] = screen_lines[line][:col]
+                    else:
+                        # Other commands can be implemented as needed
+                        pass
+                continue
+            else:
+                # Not a recognized escape sequence
+                i += 1
+                continue
+        elif c == "\r":
+            # Carriage return
+            col = 0
+            i += 1
+        elif c == "\n":
+            # Line feed
+            line += 1
+            if line >= len(screen_lines):
+                screen_lines.append("")
+            i += 1
+        else:
+            # Printable character
+            # Ensure the current line exists
+            while len(screen_lines) <= line:
+                screen_lines.append("")
+            current_line = screen_lines[line]
+            # Extend the line with spaces if necessary
+            if col > len(current_line):
+                current_line += " " * (col - len(current_line))
+            # Insert or replace the character at the current position
+            if col < len(current_line):
+                current_line = current_line[:col] + c + current_line[col + 1 :]
+            else:
+                current_line += c
+            # Update the screen buffer
+            screen_lines[line] = current_line
+            # Move cursor forward
+            col += 1
+            i += 1
+
+    # After processing, join the lines
+    result = "\n".join(screen_lines)
+    return result.strip()
+
+
+def make_transcript(size: int) -> str:
+    """Build a synthetic raw REPL transcript of roughly `size` characters. It mixes the echo of
+    typed input lines (with the cursor movements and redraws emitted by the REPL) and a large
+    multi-line variable dump, similar to big arrays echoed as $R values.
+    """
+    parts = []
+    total = 0
+    index = 0
+    while total < size:
+        prompt = f" {index}. "
+        code = f"let value{index} = Point<Float>(x: {index}, y: {index})"
+        head, tail = code.split(":", 1)
+        echo = (
+            f"\x1b[1G{prompt}\r{prompt}\x1b[1G{prompt}\x1b[{len(prompt) + 1}G{head}\r"
+            f"{prompt}{head}:\x1b[1G{prompt}\x1b[{len(prompt) + len(head) + 2}G{tail}"
+            f"\x1b[1G\x1b[1G\x1b[J{prompt}{code} \r\n"
+        )
+        dump = "".join(f"  [{i}] = {{\r\n    x = {i}\r\n    y = {i}\r\n  }}\r\n" for i in range(20))
+        part = echo + f"$R{index}: [Point<Float>] = 20 values {{\r\n{dump}}}\r\n"
+        parts.append(part)
+        total += len(part)
+        index += 1
+    return "".join(parts)
+
+
+def make_long_line_transcript(size: int) -> str:
+    """Build a transcript with a single long line, e.g. an array echoed on one line."""
+    values: list[str] = []
+    total = 0
+    while total < size:
+        value = str(len(values))
+        values.append(value)
+        total += len(value) + 2
+    return f"\x1b[1G\x1b[J $R0: [Int] = [{', '.join(values)}]\r\n\x1b[1G\x1b[J 2>  \x1b[6G"
+
+
+def incremental_clean(text: str, chunk_size: int = 4096) -> str:
+    """Clean the transcript fed in chunks, as it is done while reading from the REPL."""
+    screen = repl_output.ScreenBuffer()
+    for i in range(0, len(text), chunk_size):
+        screen.feed(text[i : i + chunk_size])
+    return screen.text()
+
+
+def measure(function: Callable[[str], str], text: str) -> tuple[float, str]:
+    start = time.perf_counter()
+    result = function(text)
+    return time.perf_counter() - start, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=float, default=4.0)
+    parser.add_argument("--line-kb", type=float, default=128.0)
+    args = parser.parse_args()
+
+    text = make_transcript(int(args.size_mb * 1024 * 1024))
+    print(f"Transcript size: {len(text) / 1024 / 1024:.2f} MB")
+    compare(text)
+    text = make_long_line_transcript(int(args.line_kb * 1024))
+    print(f"Single line transcript size: {len(text) / 1024:.2f} KB")
+    compare(text)
+
+
+def compare(text: str) -> None:
+    legacy_time, legacy_result = measure(legacy_clean, text)
+    clean_time, clean_result = measure(repl_output.clean, text)
+    incremental_time, incremental_result = measure(incremental_clean, text)
+    assert legacy_result == clean_result == incremental_result
+
+    print(f"legacy clean:          {legacy_time:8.3f} s")
+    print(f"clean:                 {clean_time:8.3f} s  ({legacy_time / clean_time:.1f}x)")
+    print(
+        f"ScreenBuffer (chunks): {incremental_time:8.3f} s  "
+        f"({legacy_time / incremental_time:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""Benchmark suite of the Python code executed with each REPL run, on the inputs of growing size.
+
+The REPL transcripts and Swift sources are generated for each size, the runs are replayed
+without a Swift toolchain (see replay.py). The transcripts recorded with replay.py and stored in
+benchmarks/transcripts are replayed too. The results can be saved and compared with the saved
+results to catch regressions.
+
+Usage:
+    python benchmarks/bench_suite.py [--sizes 1k,64k,1m,50m] [--filter code.]
+        [--save results.json] [--compare results.json]
+"""
+import argparse
+import glob
+import json
+import os
+import timeit
+from collections.abc import Callable
+from functools import cache
+from typing import Any
+
+from bench_repl_output import incremental_clean, make_transcript
+from replay import ReplayREPL, Transcript, synthetic_transcript
+
+from repltilian import code, repl_output
+
+TRANSCRIPTS_DIRECTORY = os.path.join(os.path.dirname(__file__), "transcripts")
+# slowdown reported as a regression when comparing with the saved results
+REGRESSION_THRESHOLD = 0.1
+
+_SIZE_UNITS = {"k": 1024, "m": 1024 * 1024}
+
+_SWIFT_FUNCTION = """\
+/// Sum of the scaled values, the strings contain escaped quotes and interpolations
+func compute{index}(values: [Double], scale: Double) -> Double {{
+    var total = 0.0
+    // accumulate the scaled values
+    for value in values {{
+        if value > 0 {{
+            total += value * scale
+        }} else {{
+            total -= Double("\\"-\\"".count)
+        }}
+    }}
+    let message = "total: \\(total), scale: \\(scale)"
+    print(message, [1, 2, 3].map {{ $0 * 2 }})
+    return total
+}}
+
+"""
+
+
+def parse_size(text: str) -> int:
+    """Parse the size like "64k" or "1m" into the number of characters."""
+    unit = _SIZE_UNITS.get(text[-1].lower(), 1)
+    return int(float(text[:-1] if unit > 1 else text) * unit)
+
+
+def format_size(size: int) -> str:
+    for unit, scale in [("MB", 1024 * 1024), ("KB", 1024)]:
+        if size >= scale:
+            return f"{size / scale:g} {unit}"
+    return f"{size} B"
+
+
+@cache
+def swift_source(size: int) -> str:
+    """Swift source of at least `size` characters made of the functions with strings, comments
+    and nested blocks.
+    """
+    function_size = len(_SWIFT_FUNCTION.format(index=0))
+    count = max(size // function_size, 1)
+    return "".join(_SWIFT_FUNCTION.format(index=index) for index in range(count))
+
+
+@cache
+def transcript(size: int) -> str:
+    return make_transcript(size)
+
+
+@cache
+def cleaned_transcript(size: int) -> str:
+    return repl_output.clean(transcript(size))
+
+
+@cache
+def replay_transcript(size: int) -> Transcript:
+    text = transcript(size)
+    prompt = "\n".join(
+        f"let value{index} = Point<Float>(x: {index}, y: {index})"
+        for index in range(text.count("$R"))
+    )
+    return synthetic_transcript(text, prompt)
+
+
+def _find_last_function(size: int, indexed: bool = False) -> code.FunctionCode:
+    source = swift_source(size)
+    name = source[source.rindex("func ") + 5 : source.rindex("(values")]
+    if not indexed:
+        # the index of the source is cached, measure the lookup with the scan
+        code.index_source.cache_clear()
+    return code.find_function(name, source)
+
+
+# benchmark name -> function of the input size which returns the timed call
+CASES: dict[str, Callable[[int], Callable[[], Any]]] = {
+    "repl_output.clean": lambda size: lambda: repl_output.clean(transcript(size)),
+    "ScreenBuffer.feed (4 KB chunks)": lambda size: lambda: incremental_clean(transcript(size)),
+    "repl_output.find_variables": lambda size: lambda: repl_output.find_variables(
+        cleaned_transcript(size)
+    ),
+    "repl_output.find_variable_offsets": lambda size: lambda: repl_output.find_variable_offsets(
+        cleaned_transcript(size)
+    ),
+    "repl_output.batch_prompt": lambda size: lambda: repl_output.batch_prompt(swift_source(size)),
+    "code.scan_code": lambda size: lambda: code.scan_code(swift_source(size)),
+    "code.SourceIndex": lambda size: lambda: code.SourceIndex(swift_source(size)),
+    "code.extract_code_blocks": lambda size: lambda: code.extract_code_blocks(
+        swift_source(size).split("\n")
+    ),
+    "code.split_declarations": lambda size: lambda: code.split_declarations(swift_source(size)),
+    "code.find_function": lambda size: lambda: _find_last_function(size),
+    "code.find_function (indexed)": lambda size: lambda: _find_last_function(size, indexed=True),
+    "replay run": lambda size: lambda: ReplayREPL().replay(replay_transcript(size)),
+    "replay stream": lambda size: lambda: ReplayREPL().replay_stream(replay_transcript(size)),
+}
+
+
+def measure(call: Callable[[], Any], repeat: int) -> float:
+    """Return the minimum time of a single call in seconds, the number of calls of a repeat is
+    chosen so the repeat takes at least 0.2 seconds.
+    """
+    timer = timeit.Timer(call)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run_suite(sizes: list[int], pattern: str, repeat: int) -> dict[str, dict[str, float]]:
+    results: dict[str, dict[str, float]] = {}
+    for name, case in CASES.items():
+        if pattern not in name:
+            continue
+        for size in sizes:
+            call = case(size)
+            # build the cached inputs before the timing
+            call()
+            seconds = measure(call, repeat)
+            results.setdefault(name, {})[format_size(size)] = seconds
+            print(f"{name:36} {format_size(size):>8} {seconds * 1e3:12.3f} ms", flush=True)
+    for path in sorted(glob.glob(os.path.join(TRANSCRIPTS_DIRECTORY, "*.json"))):
+        name = f"replay {os.path.basename(path)}"
+        if pattern not in name:
+            continue
+        recorded = Transcript.load(path)
+        seconds = measure(lambda: ReplayREPL().replay(recorded), repeat)
+        results[name] = {format_size(recorded.size): seconds}
+        print(f"{name:36} {format_size(recorded.size):>8} {seconds * 1e3:12.3f} ms", flush=True)
+    return results
+
+
+def compare(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]]) -> None:
+    print("\nComparison with the saved results:")
+    for name, times in results.items():
+        for size, seconds in times.items():
+            previous = baseline.get(name, {}).get(size)
+            if previous is None:
+                continue
+            ratio = seconds / previous
+            status = "REGRESSION" if ratio > 1 + REGRESSION_THRESHOLD else ""
+            print(f"{name:36} {size:>8} {ratio:8.2f}x  {status}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="1k,64k,1m", help="comma separated input sizes")
+    parser.add_argument("--filter", default="", help="run only the benchmarks with this text")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", help="save the results to the JSON file")
+    parser.add_argument("--compare", help="compare the results with the saved JSON file")
+    args = parser.parse_args()
+
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    results = run_suite(sizes, args.filter, args.repeat)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
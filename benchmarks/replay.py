@@ -0,0 +1,110 @@
+"""Record the raw pty output of the REPL runs and replay it without a Swift toolchain.
+
+The replay runs the Python side of `SwiftREPL.run` on the recorded chunks: the prompt is split
+into the input blocks, the chunks are rendered by the screen buffer, the output is checked for
+errors and parsed for the variables. Only the communication with the process is skipped.
+
+Usage (recording requires Swift):
+    python benchmarks/replay.py transcripts/knn.json --prompt "let x = 1" [--reload demo.swift]
+"""
+import argparse
+import json
+from dataclasses import asdict, dataclass
+
+from repltilian import SwiftREPL, repl_output
+from repltilian.repl import BaseSwiftREPL, Options, VariablesRegister
+
+
+@dataclass
+class Transcript:
+    prompt: str
+    # raw output chunks in the order they were read from the pty
+    chunks: list[str]
+
+    @property
+    def size(self) -> int:
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(asdict(self), f)
+
+    @classmethod
+    def load(cls, path: str) -> "Transcript":
+        with open(path) as f:
+            return cls(**json.load(f))
+
+
+def record(repl: SwiftREPL, prompt: str, autoreload: bool = False) -> Transcript:
+    """Run the prompt and record the raw output chunks read from the REPL process."""
+    chunks: list[str] = []
+    read_nonblocking = repl._process.read_nonblocking
+
+    def recording_read(size: int = 1, timeout: float | None = -1) -> str:
+        buffer: str = read_nonblocking(size=size, timeout=timeout)
+        chunks.append(buffer)
+        return buffer
+
+    repl._process.read_nonblocking = recording_read
+    try:
+        repl.run(prompt, autoreload=autoreload, verbose=False)
+    finally:
+        del repl._process.read_nonblocking
+    return Transcript(prompt, chunks)
+
+
+class ReplayREPL(BaseSwiftREPL):
+    """REPL which replays the recorded transcripts instead of running a process."""
+
+    def __init__(self, options: Options | None = None) -> None:
+        super().__init__(options=options)
+        self.vars = VariablesRegister(self)
+        self._initialized = True
+
+    def replay(self, transcript: Transcript) -> None:
+        """Process the transcript as `SwiftREPL.run` processes the output of the process."""
+        _, reloaded_files = self._prepare_run(transcript.prompt, autoreload=False)
+        screen = repl_output.ScreenBuffer()
+        for chunk in transcript.chunks:
+            screen.feed(chunk)
+        sentinel = self.options.completion_mode == "sentinel"
+        self._complete_run(screen.text(), reloaded_files, verbose=False, sentinel=sentinel)
+
+    def replay_stream(self, transcript: Transcript) -> list[str]:
+        """Process the transcript as `SwiftREPL.stream` processes the output of the process."""
+        blocks, reloaded_files = self._prepare_run(transcript.prompt, autoreload=False)
+        screen = repl_output.ScreenBuffer()
+        output = self._output_stream(blocks)
+        lines = []
+        for chunk in transcript.chunks:
+            screen.feed(chunk)
+            lines += output.feed(screen.pop_completed_lines())
+        lines += output.feed(screen.pop_lines())
+        self._complete_stream(output, reloaded_files)
+        return lines
+
+
+def synthetic_transcript(text: str, prompt: str, chunk_size: int = 4096) -> Transcript:
+    """Split the raw output into chunks of the size typically read from the pty."""
+    chunks = [text[i : i + chunk_size] for i in range(0, len(text), chunk_size)]
+    return Transcript(prompt, chunks)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="output path of the transcript")
+    parser.add_argument("--prompt", required=True, help="Swift code to run")
+    parser.add_argument("--reload", action="append", default=[], help="reload file path")
+    args = parser.parse_args()
+
+    repl = SwiftREPL()
+    for path in args.reload:
+        repl.add_reload_file(path)
+    transcript = record(repl, args.prompt, autoreload=bool(args.reload))
+    repl.close()
+    transcript.save(args.path)
+    print(f"Recorded {len(transcript.chunks)} chunks, {transcript.size / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
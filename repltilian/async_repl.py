@@ -0,0 +1,424 @@
+"""Swift REPL driven by the asyncio event loop."""
+import asyncio
+import codecs
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+from repltilian import benchmark, buffers, channel, constants, profiler, repl_output, sampler
+from repltilian.benchmark import BenchmarkResult, Comparison
+from repltilian.repl import (
+    _ECHO_STALL_TIMEOUT,
+    BaseSwiftREPL,
+    BaseVariable,
+    BaseVariablesRegister,
+    Options,
+    SwiftREPLException,
+    _crash_exception,
+    _EchoTracker,
+    _tty_input_buffer_size,
+)
+
+
+class AsyncSwiftREPL(BaseSwiftREPL):
+    """Swift REPL with the same interface as `SwiftREPL`, but `run`, variables transfer and
+    `close` are coroutines. The REPL output is read with `loop.add_reader` when the pty is
+    readable, so many REPLs can be driven concurrently from a single thread without polling.
+
+    The run completion is always detected with the completion marker (see
+    `Options.completion_mode`), the prompt polling is not used.
+
+    Example:
+        async with AsyncSwiftREPL() as repl:
+            await repl.run("var values = [1, 2, 3]")
+            values = await repl.vars["values"].get()
+    """
+
+    def __init__(self, cwd: str | None = None, options: Options | None = None) -> None:
+        """Spawn the REPL process, `start` (or `async with`) must be awaited before the first
+        run, `create` does both.
+
+        Args:
+            cwd: optional path to the working directory, see `SwiftREPL`
+            options: REPL options
+        """
+        super().__init__(cwd, options)
+        self.vars: AsyncVariablesRegister = AsyncVariablesRegister(self)
+        self._started = False
+        self._process = self._initiate_repl()
+        self._fd: int = self._process.child_fd
+        os.set_blocking(self._fd, False)
+        self._channel = channel.TransferChannel()
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        # output received from the REPL since the last screen update
+        self._received = ""
+        self._eof = False
+        self._readable = asyncio.Event()
+        # set when the REPL echo acknowledges more input, see `_write`
+        self._echoed = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    async def create(
+        cls, cwd: str | None = None, options: Options | None = None
+    ) -> "AsyncSwiftREPL":
+        """Spawn and initialize the REPL."""
+        repl = cls(cwd, options)
+        await repl.start()
+        return repl
+
+    async def start(self) -> None:
+        """Send the init commands to the REPL."""
+        if self._started:
+            return
+        self._started = True
+        try:
+            await self.run(constants.INIT_COMMANDS, verbose=False)
+            await self.run("""print("REPL is running !")""")
+        except BaseException:
+            # do not leak the process and the channel file when the REPL fails to start
+            self._initialized = False
+            await asyncio.get_running_loop().run_in_executor(None, self._close_process)
+            self._channel.close()
+            raise
+
+    async def run(self, prompt: str, autoreload: bool = False, verbose: bool = True) -> None:
+        """Run the code in the REPL, see `SwiftREPL.run`. Concurrent runs of the same REPL are
+        executed one after another.
+        """
+        async with self._lock:
+            await self._run_unlocked(prompt, verbose, autoreload)
+
+    async def _run_unlocked(self, prompt: str, verbose: bool, autoreload: bool = False) -> None:
+        with self._record_stats("run"):
+            loop = asyncio.get_running_loop()
+            include_text, reloaded_files = self._prepare_include(autoreload)
+            if self._should_import(include_text):
+                # the module compilation takes seconds, the other REPLs are not blocked
+                with self._phase("reload"):
+                    include_text = await loop.run_in_executor(
+                        None, self._import_include, include_text
+                    )
+            blocks = self._prepare_blocks(prompt, include_text)
+            self._sentinel_id += 1
+            blocks += ["", repl_output.sentinel_command(self._sentinel_id)]
+            echo = _EchoTracker(blocks)
+
+            screen = repl_output.ScreenBuffer()
+            loop.add_reader(self._fd, self._on_readable)
+            start = time.perf_counter_ns()
+            write_ns = 0
+
+            async def write() -> None:
+                nonlocal write_ns
+                await self._write(echo.data, echo)
+                write_ns = time.perf_counter_ns() - start
+
+            try:
+                # the output is read while writing, otherwise both sides could block on full
+                # buffers
+                await asyncio.gather(write(), self._read_until_sentinel(screen, echo))
+            finally:
+                loop.remove_reader(self._fd)
+            if self._stats is not None:
+                self._stats.add("write", write_ns)
+                self._stats.add("wait", time.perf_counter_ns() - start - write_ns)
+                self._stats.bytes_sent += len(echo.data)
+            self._complete_run(screen.text(), reloaded_files, verbose, sentinel=True)
+
+    async def line_profile(
+        self,
+        prompt: str,
+        function_name: str,
+        source_path: str,
+        autoreload: bool = False,
+        verbose: bool = True,
+    ) -> profiler.LineProfileResult:
+        """Run the prompt with the line profiling instrumentation, see `SwiftREPL.line_profile`."""
+        profile = await self._profile(prompt, source_path, [function_name], autoreload, verbose)
+        result = profile.functions[function_name]
+        if verbose:
+            print(result.to_text())
+        return result
+
+    async def profile_functions(
+        self,
+        prompt: str,
+        source_path: str,
+        function_names: list[str] | None = None,
+        autoreload: bool = False,
+        verbose: bool = True,
+    ) -> profiler.ProfileResult:
+        """Run the prompt with the line profiling instrumentation of many functions, see
+        `SwiftREPL.profile_functions`.
+        """
+        result = await self._profile(prompt, source_path, function_names, autoreload, verbose)
+        if verbose:
+            print(result.to_text())
+        return result
+
+    async def _profile(
+        self,
+        prompt: str,
+        source_path: str,
+        function_names: list[str] | None,
+        autoreload: bool,
+        verbose: bool,
+    ) -> profiler.ProfileResult:
+        prompt, functions = self._profile_prompt(prompt, source_path, function_names)
+        try:
+            await self.run(prompt, autoreload=autoreload, verbose=verbose)
+            counters = await self.vars.get_many([profiler.PROFILE_VARIABLE])
+        finally:
+            with self._restoring_functions(functions):
+                await self.run(self._restore_prompt(functions), verbose=False)
+        return profiler.ProfileResult.from_counters(functions, counters[profiler.PROFILE_VARIABLE])
+
+    async def benchmark(
+        self,
+        setup: str,
+        stmt: str,
+        repeat: int = 5,
+        number: int | None = None,
+        warmup: int = 1,
+        autoreload: bool = False,
+        verbose: bool = True,
+    ) -> BenchmarkResult:
+        """Measure the execution time of the statement, see `SwiftREPL.benchmark`."""
+        prompt = benchmark.benchmark_code(setup, stmt, repeat, number, warmup)
+        await self.run(prompt, autoreload=autoreload, verbose=verbose)
+        times = (await self.vars.get_many([benchmark.RESULT_VARIABLE]))[benchmark.RESULT_VARIABLE]
+        result = BenchmarkResult.from_repeat_times(times["number"], times["times"])
+        if verbose:
+            print(result.to_text())
+        return result
+
+    async def compare_benchmarks(
+        self,
+        stmt: str,
+        baseline: str | Path,
+        candidate: str | Path,
+        setup: str = "",
+        repeat: int = 5,
+        number: int | None = None,
+        warmup: int = 1,
+        rounds: int = 3,
+        labels: tuple[str, str] = ("baseline", "candidate"),
+        name: str | None = None,
+        history_path: str | Path | None = None,
+        verbose: bool = True,
+    ) -> Comparison:
+        """Benchmark the statement with two versions of the code, see
+        `SwiftREPL.compare_benchmarks`.
+        """
+        versions_code = [self._version_code(baseline), self._version_code(candidate)]
+        results: list[list[BenchmarkResult]] = [[], []]
+        try:
+            for _ in range(rounds):
+                for version, version_code in enumerate(versions_code):
+                    await self.run(version_code, verbose=False)
+                    result = await self.benchmark(
+                        setup, stmt, repeat, number, warmup, verbose=False
+                    )
+                    number = result.number
+                    results[version].append(result)
+        finally:
+            self._reload_tracker.reset()
+        comparison = Comparison(
+            BenchmarkResult.merge(results[0]),
+            BenchmarkResult.merge(results[1]),
+            *labels,
+        )
+        self._record_comparison(comparison, name or stmt, versions_code, history_path)
+        if verbose:
+            print(comparison.to_text())
+        return comparison
+
+    async def sample_profile(
+        self,
+        prompt: str,
+        interval_us: int = 1000,
+        max_samples: int = 10_000,
+        autoreload: bool = False,
+        verbose: bool = True,
+    ) -> sampler.SampleProfileResult:
+        """Run the prompt with the sampling profiler, see `SwiftREPL.sample_profile`."""
+        prompt = self._sample_prompt(prompt, interval_us, max_samples)
+        await self.run(prompt, autoreload=autoreload, verbose=verbose)
+        frames = await self.vars[sampler.SAMPLES_VARIABLE].get_binary()
+        samples = sampler.split_samples([int(address) for address in frames])
+        symbols = {}
+        for lookup_prompt in self._lookup_prompts(samples):
+            await self.run(lookup_prompt, verbose=False)
+            symbols.update(sampler.parse_lookup_output(self._output or ""))
+        locator = sampler.SourceLocator(sorted(self._reload_paths))
+        result = sampler.aggregate(samples, symbols, locator, interval_us)
+        if verbose:
+            print(result.to_text())
+        return result
+
+    async def close(self) -> None:
+        if not self._initialized:
+            return
+        self._initialized = False
+        try:
+            await self._write(b":quit\n")
+        except OSError:
+            pass
+        # terminating the process may sleep, do not block the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self._close_process)
+        self._channel.close()
+
+    def _close_process(self) -> None:
+        self._process.terminate()
+        self._process.close()
+
+    async def _write(self, data: bytes, echo: _EchoTracker | None = None) -> None:
+        """Write the data to the pty, wait until the pty is writable when its buffer is full.
+
+        If the echo tracker is given, the number of bytes sent but not echoed yet is limited to
+        `Options.input_window` as in `SwiftREPL`, so the tty input buffer never overflows. The
+        echo is fed by `_read_until_sentinel`, which must run concurrently.
+        """
+        loop = asyncio.get_running_loop()
+        window = self.options.input_window or _tty_input_buffer_size(self._fd)
+        view = memoryview(data)
+        sent = 0
+        while sent < len(view):
+            end = len(view)
+            if echo is not None:
+                in_flight = sent - min(echo.acked, sent)
+                if in_flight >= window:
+                    self._echoed.clear()
+                    try:
+                        await asyncio.wait_for(self._echoed.wait(), _ECHO_STALL_TIMEOUT)
+                    except TimeoutError:
+                        # the echo is late or missing, do not wait for it anymore
+                        echo.acked = max(echo.acked, sent)
+                    continue
+                end = sent + window - in_flight
+            try:
+                sent += os.write(self._fd, view[sent:end])
+            except BlockingIOError:
+                writable = loop.create_future()
+
+                def on_writable() -> None:
+                    if not writable.done():
+                        writable.set_result(None)
+
+                loop.add_writer(self._fd, on_writable)
+                try:
+                    await writable
+                finally:
+                    loop.remove_writer(self._fd)
+
+    def _on_readable(self) -> None:
+        try:
+            data = os.read(self._fd, self.options.maxread)
+        except BlockingIOError:
+            return
+        except OSError:
+            # EIO is raised on Linux when the process exited
+            data = b""
+        if data:
+            self._received += self._decoder.decode(data)
+        else:
+            self._eof = True
+            asyncio.get_running_loop().remove_reader(self._fd)
+        self._readable.set()
+
+    async def _read_until_sentinel(
+        self, screen: repl_output.ScreenBuffer, echo: _EchoTracker
+    ) -> None:
+        while True:
+            with self._phase("render"):
+                rendered, self._raw_output, done = repl_output.scan_for_sentinel(
+                    self._raw_output + self._received, self._sentinel_id
+                )
+                screen.feed(rendered)
+            self._count_received(self._received)
+            echo.feed(self._received)
+            self._echoed.set()
+            self._received = ""
+            if done:
+                return
+            if self._eof:
+                raise _crash_exception(EOFError("End Of File (EOF) read from the REPL process."))
+            self._readable.clear()
+            await self._readable.wait()
+
+    async def __aenter__(self) -> "AsyncSwiftREPL":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        await self.close()
+
+
+class AsyncVariable(BaseVariable):
+    _repl: AsyncSwiftREPL
+
+    async def get(self, verbose: bool = False) -> Any:
+        """Return the JSON representation of the variable, see `Variable.get`."""
+        return (await self._repl.vars.get_many([self.name], verbose=verbose))[self.name]
+
+    async def get_binary(self, verbose: bool = False, copy: bool = True) -> Any:
+        """Return the numeric array variable, see `Variable.get_binary`."""
+        async with self._repl._lock:
+            with self._repl._record_stats("get"):
+                await self._repl._run_unlocked(self._get_binary_prompt(), verbose)
+                return self._read_binary(copy)
+
+
+class AsyncVariablesRegister(BaseVariablesRegister[AsyncVariable]):
+    _repl_ref: AsyncSwiftREPL
+
+    def _new_variable(
+        self,
+        name: str,
+        dtype: str | None = None,
+        value: str | None = None,
+        echo: tuple[int, int] | None = None,
+    ) -> AsyncVariable:
+        return AsyncVariable(self._repl_ref, name, dtype, value, echo)
+
+    async def get_many(self, names: list[str], verbose: bool = False) -> dict[str, Any]:
+        """Return the JSON representation of many variables, see `VariablesRegister.get_many`."""
+        if not names:
+            return {}
+        async with self._repl_ref._lock:
+            # the channel is reused by every transfer, other runs must not write to it before
+            # the result is read
+            with self._repl_ref._record_stats("get"):
+                await self._repl_ref._run_unlocked(self._get_many_prompt(names), verbose)
+                return self._read_many(names)
+
+    async def get_array(self, name: str, copy: bool = True, verbose: bool = False) -> Any:
+        """Return the array with its shape, see `VariablesRegister.get_array`."""
+        if not buffers.HAS_NUMPY:
+            raise SwiftREPLException("NumPy is required to get the arrays with their shape.")
+        async with self._repl_ref._lock:
+            with self._repl_ref._record_stats("get"):
+                await self._repl_ref._run_unlocked(self._get_array_prompt(name), verbose)
+                return self._read_binary(copy)
+
+    async def set_array(
+        self, name: str, value: Any, dtype: str | None = None, verbose: bool = False
+    ) -> None:
+        """Set the NumPy array and its shape, see `VariablesRegister.set_array`."""
+        await self.set_many(self._array_variables(name, value, dtype), verbose=verbose)
+
+    async def set(self, name: str, dtype: str, value: Any, verbose: bool = False) -> None:
+        """Set the variable in the REPL, see `VariablesRegister.set`."""
+        await self.set_many({name: (dtype, value)}, verbose=verbose)
+
+    async def set_many(self, variables: dict[str, tuple[str, Any]], verbose: bool = False) -> None:
+        """Set many variables in the REPL, see `VariablesRegister.set_many`."""
+        if not variables:
+            return
+        async with self._repl_ref._lock:
+            with self._repl_ref._record_stats("set"):
+                prompt = self._set_many_prompt(variables)
+                await self._repl_ref._run_unlocked(prompt, verbose)
+        self._register_many(variables)
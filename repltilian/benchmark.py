@@ -0,0 +1,241 @@
+"""Functions related to the microbenchmarks of Swift code executed in the REPL."""
+import random
+import re
+import statistics
+from dataclasses import dataclass
+
+from repltilian import code
+
+# Swift variable with the measured times, see _BenchmarkTimes in the init commands
+RESULT_VARIABLE = "_benchmarkResult"
+# minimum time of a single repeat when the number of iterations is chosen automatically
+AUTORANGE_TIME_NS = 200_000_000
+
+# number of the bootstrap resamples of the speedup confidence interval
+BOOTSTRAP_RESAMPLES = 2000
+
+# statements whose value must not be consumed, e.g. declarations, assignments and loops
+_STATEMENT_PATTERN = re.compile(
+    r"^\s*(?:let|var|if|guard|for|while|repeat|switch|do|return|defer|throw|break|continue|"
+    r"func|struct|class|enum|import|_\s*=)\b|^\s*[\w.\[\]\s]+(?:[-+*/%&|^]|<<|>>)?=(?!=)"
+)
+
+
+@dataclass
+class BenchmarkResult:
+    """Times of the benchmarked statement, `times_ns` is the time of a single iteration in each
+    repeat (the repeat time divided by `number`).
+    """
+
+    number: int
+    times_ns: list[float]
+
+    @classmethod
+    def from_repeat_times(cls, number: int, repeat_times_ns: list[int]) -> "BenchmarkResult":
+        return cls(number, [time / number for time in repeat_times_ns])
+
+    @property
+    def min_ns(self) -> float:
+        return min(self.times_ns)
+
+    @property
+    def median_ns(self) -> float:
+        return statistics.median(self.times_ns)
+
+    @property
+    def mean_ns(self) -> float:
+        return statistics.fmean(self.times_ns)
+
+    @property
+    def p95_ns(self) -> float:
+        if len(self.times_ns) == 1:
+            return self.times_ns[0]
+        return statistics.quantiles(self.times_ns, n=20, method="inclusive")[-1]
+
+    @property
+    def stddev_ns(self) -> float:
+        return statistics.stdev(self.times_ns) if len(self.times_ns) > 1 else 0.0
+
+    @property
+    def ns_per_iter(self) -> float:
+        """The median time of a single iteration."""
+        return self.median_ns
+
+    def to_text(self) -> str:
+        return (
+            f"{len(self.times_ns)} repeats x {self.number} iterations: "
+            f"{_format_time(self.ns_per_iter)} per iteration "
+            f"(min {_format_time(self.min_ns)}, p95 {_format_time(self.p95_ns)}, "
+            f"stddev {_format_time(self.stddev_ns)})"
+        )
+
+    def __str__(self) -> str:
+        return self.to_text()
+
+    @classmethod
+    def merge(cls, results: list["BenchmarkResult"]) -> "BenchmarkResult":
+        """Combine the repeats of the results measured with the same number of iterations."""
+        if len({result.number for result in results}) != 1:
+            raise ValueError("Only results with the same number of iterations can be merged.")
+        return cls(results[0].number, [time for result in results for time in result.times_ns])
+
+
+@dataclass
+class Comparison:
+    """A/B comparison of two benchmark results. The speedup is the ratio of the baseline median
+    to the candidate median, so values above 1 mean the candidate is faster. The confidence
+    interval of the speedup is estimated with the bootstrap of the repeat times.
+    """
+
+    baseline: BenchmarkResult
+    candidate: BenchmarkResult
+    baseline_label: str = "baseline"
+    candidate_label: str = "candidate"
+    confidence: float = 0.95
+
+    @property
+    def speedup(self) -> float:
+        return _ratio(self.baseline.median_ns, self.candidate.median_ns)
+
+    @property
+    def speedup_interval(self) -> tuple[float, float]:
+        return speedup_interval(self.baseline.times_ns, self.candidate.times_ns, self.confidence)
+
+    @property
+    def significant(self) -> bool:
+        """True if the confidence interval of the speedup does not contain 1."""
+        low, high = self.speedup_interval
+        return low > 1 or high < 1
+
+    def to_text(self) -> str:
+        low, high = self.speedup_interval
+        if not self.significant:
+            verdict = "no significant difference"
+        elif self.speedup > 1:
+            verdict = f"{self.candidate_label} is faster"
+        else:
+            verdict = f"{self.candidate_label} is slower"
+        return "\n".join(
+            [
+                f"{self.baseline_label}: {self.baseline.to_text()}",
+                f"{self.candidate_label}: {self.candidate.to_text()}",
+                f"Speedup: {self.speedup:.3f}x "
+                f"({self.confidence:.0%} CI {low:.3f}x - {high:.3f}x), {verdict}",
+            ]
+        )
+
+    def __str__(self) -> str:
+        return self.to_text()
+
+
+def speedup_interval(
+    baseline_ns: list[float],
+    candidate_ns: list[float],
+    confidence: float = 0.95,
+    resamples: int = BOOTSTRAP_RESAMPLES,
+    seed: int = 0,
+) -> tuple[float, float]:
+    """Bootstrap confidence interval of the ratio of the baseline and candidate medians. The
+    seed is fixed, so the same times give the same interval.
+    """
+    rng = random.Random(seed)
+    ratios = sorted(
+        _ratio(
+            statistics.median(rng.choices(baseline_ns, k=len(baseline_ns))),
+            statistics.median(rng.choices(candidate_ns, k=len(candidate_ns))),
+        )
+        for _ in range(resamples)
+    )
+    alpha = (1 - confidence) / 2
+    return ratios[int(alpha * resamples)], ratios[min(int((1 - alpha) * resamples), resamples - 1)]
+
+
+def _ratio(baseline_ns: float, candidate_ns: float) -> float:
+    return baseline_ns / candidate_ns if candidate_ns > 0 else float("inf")
+
+
+def _format_time(time_ns: float) -> str:
+    for unit, scale in [("s", 1e9), ("ms", 1e6), ("us", 1e3)]:
+        if time_ns >= scale:
+            return f"{time_ns / scale:.3f} {unit}"
+    return f"{time_ns:.1f} ns"
+
+
+def consume_result(stmt: str) -> str:
+    """Pass the value of the last statement to `_blackHole`, if it is an expression, so the
+    compiler cannot remove the code which computes it.
+    """
+    lines = stmt.rstrip().split("\n")
+    blocks = code.extract_code_blocks(lines)
+    if not blocks:
+        return stmt
+    last = blocks[-1]
+    if last.is_comment_block() or _STATEMENT_PATTERN.match(last.code_lines[0]):
+        return stmt
+    if "//" in last.code_lines[-1]:
+        # the closing parenthesis would be commented out
+        return stmt
+    first = last.code_lines[0]
+    indent = first[: len(first) - len(first.lstrip())]
+    lines[last.start_line] = f"{indent}_blackHole({first.lstrip()}"
+    lines[last.end_line] += ")"
+    return "\n".join(lines)
+
+
+def benchmark_code(setup: str, stmt: str, repeat: int, number: int | None, warmup: int) -> str:
+    """Return the code which defines and runs the timing loops, the times are stored in the
+    `_benchmarkResult` variable.
+
+    Args:
+        setup: code executed once before the timing loops, its declarations are visible in stmt
+        stmt: benchmarked code
+        repeat: number of the timed repeats
+        number: number of iterations of each repeat, if None the number is increased until a
+            repeat takes at least 0.2 seconds (the 1, 2, 5, 10, 20, 50, ... sequence).
+        warmup: number of untimed repeats executed before the timed ones
+    """
+    if repeat < 1:
+        raise ValueError("Number of repeats must be positive.")
+    if number is not None and number < 1:
+        raise ValueError("Number of iterations must be positive.")
+    stmt = consume_result(stmt)
+    lines = [
+        "func _benchmarkRun() throws -> _BenchmarkTimes {",
+        _indent(setup, 1),
+        f"    var __number = {number or 0}",
+        "    if __number == 0 {",
+        "        __number = 1",
+        "        var __step = 0",
+        "        while true {",
+        "            let __start = DispatchTime.now().uptimeNanoseconds",
+        "            for _ in 0..<__number {",
+        _indent(stmt, 4),
+        "            }",
+        "            let __time = DispatchTime.now().uptimeNanoseconds - __start",
+        f"            if __time >= {AUTORANGE_TIME_NS} || __number >= 1 << 40 {{ break }}",
+        "            __number = __step % 3 == 1 ? __number * 5 / 2 : __number * 2",
+        "            __step += 1",
+        "        }",
+        "    }",
+        "    var __times = [UInt64]()",
+        f"    __times.reserveCapacity({repeat})",
+        f"    for __repeat in 0..<{warmup + repeat} {{",
+        "        let __start = DispatchTime.now().uptimeNanoseconds",
+        "        for _ in 0..<__number {",
+        _indent(stmt, 3),
+        "        }",
+        "        let __time = DispatchTime.now().uptimeNanoseconds - __start",
+        f"        if __repeat >= {warmup} {{",
+        "            __times.append(__time)",
+        "        }",
+        "    }",
+        "    return _BenchmarkTimes(number: __number, times: __times)",
+        "}",
+        f"{RESULT_VARIABLE} = try _benchmarkRun()",
+    ]
+    return "\n".join(lines)
+
+
+def _indent(text: str, level: int) -> str:
+    prefix = "    " * level
+    return "\n".join(prefix + line if line.strip() else line for line in text.split("\n"))
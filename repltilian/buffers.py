@@ -0,0 +1,250 @@
+"""Functions related to the binary transfer of numeric arrays between Python and REPL.
+
+Arrays are exchanged as a header followed by the raw little-endian array elements. The header is
+made of 8 bytes little-endian integers: number of dimensions, the size of each dimension and the
+element type code (array module type code stored as ASCII in the first byte).
+"""
+import array
+import itertools
+import re
+import struct
+import sys
+from collections.abc import Sequence
+from typing import Any
+
+try:
+    import numpy as np  # type: ignore[import-not-found, unused-ignore]
+
+    HAS_NUMPY = True
+except ImportError:  # pragma: no cover
+    HAS_NUMPY = False
+
+# Swift scalar types and their array module type codes
+SCALAR_TYPECODES = {
+    "Float": "f",
+    "Float32": "f",
+    "Double": "d",
+    "Float64": "d",
+    "Int": "q",
+    "Int64": "q",
+    "Int32": "i",
+    "Int16": "h",
+    "Int8": "b",
+    "UInt": "Q",
+    "UInt64": "Q",
+    "UInt32": "I",
+    "UInt16": "H",
+    "UInt8": "B",
+}
+# Swift scalar types of the NumPy dtypes by the dtype kind and item size
+_NUMPY_SCALAR_TYPES = {
+    ("f", 4): "Float",
+    ("f", 8): "Double",
+    ("i", 1): "Int8",
+    ("i", 2): "Int16",
+    ("i", 4): "Int32",
+    ("i", 8): "Int",
+    ("u", 1): "UInt8",
+    ("u", 2): "UInt16",
+    ("u", 4): "UInt32",
+    ("u", 8): "UInt",
+}
+# maximum number of dimensions supported by the Swift helpers e.g. [[[Float]]]
+MAX_NDIM = 3
+
+_ARRAY_TYPE_PATTERNS = [re.compile(r"\[(.*)\]"), re.compile(r"Array<(.*)>")]
+
+
+def parse_array_type(dtype: str) -> tuple[str, int] | None:
+    """Return the element type code and the number of dimensions of a numeric Swift array type
+    e.g. "[[Float]]" or "Array<Double>". Returns None if the type is not a numeric array.
+    """
+    dtype = dtype.replace(" ", "")
+    ndim = 0
+    while match := next((m for p in _ARRAY_TYPE_PATTERNS if (m := p.fullmatch(dtype))), None):
+        dtype = match.group(1)
+        ndim += 1
+    if ndim == 0 or ndim > MAX_NDIM or dtype not in SCALAR_TYPECODES:
+        return None
+    return SCALAR_TYPECODES[dtype], ndim
+
+
+def itemsize(typecode: str) -> int:
+    """Size in bytes of the single element with the given type code."""
+    return struct.calcsize("<" + typecode)
+
+
+def encode_header(shape: Sequence[int], typecode: str) -> bytes:
+    """Encode the binary array header for the given shape and element type code."""
+    return struct.pack(f"<q{len(shape)}q8s", len(shape), *shape, typecode.encode())
+
+
+def decode_header(buffer: bytes | memoryview) -> tuple[tuple[int, ...], str, int]:
+    """Decode the binary array header.
+
+    Returns:
+        - shape of the array
+        - element type code
+        - offset of the first array element in the buffer
+    """
+    if len(buffer) < 8:
+        raise ValueError("Binary array buffer is too short.")
+    (ndim,) = struct.unpack_from("<q", buffer, 0)
+    if not 0 <= ndim <= MAX_NDIM or len(buffer) < 8 * (ndim + 2):
+        raise ValueError(f"Invalid binary array header with {ndim} dimensions.")
+    shape = struct.unpack_from(f"<{ndim}q", buffer, 8)
+    typecode = bytes(buffer[8 * (ndim + 1) : 8 * (ndim + 1) + 1]).decode()
+    return shape, typecode, 8 * (ndim + 2)
+
+
+def encode_array(value: Any, typecode: str, ndim: int) -> tuple[bytes, memoryview]:
+    """Convert the numeric array to the binary header and the contiguous little-endian payload.
+
+    Args:
+        value: NumPy array (if NumPy is installed), array.array, memoryview or (nested) list of
+            numbers with a fixed shape.
+        typecode: array module type code of the target element type
+        ndim: expected number of dimensions of the array
+
+    Raises:
+        ValueError: if the value cannot be represented as a fixed-shape array with the given
+            number of dimensions.
+    """
+    if HAS_NUMPY and isinstance(value, np.ndarray):
+        dtype = np.dtype(typecode).newbyteorder("<")
+        _check_conversion(value, dtype)
+        contiguous = np.ascontiguousarray(value, dtype=dtype)
+        shape: tuple[int, ...] = contiguous.shape
+        payload = contiguous.reshape(-1).view(np.uint8).data
+    elif isinstance(value, memoryview) and value.format.lstrip("@=<") == typecode:
+        if sys.byteorder == "big" and not value.format.startswith("<"):
+            return encode_array(value.tolist(), typecode, ndim)
+        shape = tuple(value.shape or ())
+        payload = value.cast("B") if value.c_contiguous else memoryview(value.tobytes())
+    elif isinstance(value, array.array) and value.typecode == typecode:
+        shape = (len(value),)
+        payload = memoryview(_to_little_endian(value)).cast("B")
+    elif isinstance(value, array.array | memoryview | list | tuple):
+        if isinstance(value, memoryview):
+            value = value.tolist()
+        shape = _find_shape(value, ndim)
+        flat = value
+        for _ in range(ndim - 1):
+            flat = list(itertools.chain.from_iterable(flat))
+        try:
+            values = array.array(typecode, flat)
+        except (TypeError, OverflowError) as e:
+            raise ValueError(f"Array values cannot be converted to '{typecode}': {e}")
+        payload = memoryview(_to_little_endian(values)).cast("B")
+    else:
+        raise ValueError(f"Unsupported array type: {type(value)}")
+
+    if len(shape) != ndim:
+        raise ValueError(f"Expected array with {ndim} dimensions, got shape {shape}.")
+    return encode_header(shape, typecode), payload
+
+
+def decode_array(buffer: bytes | memoryview) -> Any:
+    """Load the binary array without parsing: returns a NumPy array viewing the buffer when
+    NumPy is installed, otherwise a flat array.array with the array elements.
+    """
+    shape, typecode, offset = decode_header(buffer)
+    count = 1
+    for size in shape:
+        count *= size
+    payload = memoryview(buffer)[offset : offset + count * itemsize(typecode)]
+    if len(payload) != count * itemsize(typecode):
+        raise ValueError("Binary array buffer is truncated.")
+    if HAS_NUMPY:
+        return np.frombuffer(payload, dtype=np.dtype(typecode).newbyteorder("<")).reshape(shape)
+    values = array.array(typecode)
+    values.frombytes(payload)
+    return _to_little_endian(values)
+
+
+def swift_scalar_type(dtype: Any) -> str:
+    """Return the Swift scalar type of the NumPy dtype, e.g. "Float" for float32.
+
+    Raises:
+        ValueError: if the dtype has no matching Swift scalar type e.g. float16, bool or object.
+    """
+    dtype = np.dtype(dtype)
+    scalar = _NUMPY_SCALAR_TYPES.get((dtype.kind, dtype.itemsize))
+    if scalar is None:
+        raise ValueError(f"Arrays of {dtype} cannot be transferred to Swift.")
+    return scalar
+
+
+def flatten_array(value: Any, scalar: str | None = None) -> tuple[str, Any, tuple[int, ...]]:
+    """Convert the NumPy array (or array-like) to the flat, contiguous little-endian array of a
+    Swift scalar type. The array is not copied if it is already contiguous, little-endian and
+    of the target type.
+
+    Args:
+        value: NumPy array or a value accepted by `np.asarray`
+        scalar: Swift scalar type of the elements e.g. "Float", by default the type matching
+            the array dtype. The array is converted only if the values do not change, except
+            for the rounding of floats (e.g. float64 to Float, but not float to Int).
+
+    Returns:
+        - Swift scalar type
+        - flat NumPy array
+        - shape of the array
+
+    Raises:
+        ValueError: if NumPy is not installed or the array cannot be converted to the type.
+    """
+    if not HAS_NUMPY:
+        raise ValueError("NumPy is required to transfer the arrays with their shape.")
+    values = np.asarray(value)
+    if scalar is None:
+        scalar = swift_scalar_type(values.dtype)
+    if scalar not in SCALAR_TYPECODES:
+        raise ValueError(f"Unsupported Swift scalar type: {scalar}")
+    dtype = np.dtype(SCALAR_TYPECODES[scalar]).newbyteorder("<")
+    _check_conversion(values, dtype)
+    flat = np.ascontiguousarray(values, dtype=dtype).reshape(-1)
+    return scalar, flat, values.shape
+
+
+def _check_conversion(values: Any, dtype: Any) -> None:
+    """Raise ValueError if the NumPy array values would change when converted to the dtype,
+    the same conversions as with array.array are allowed: numbers to floats with the rounding,
+    integers in the range of the integer type.
+    """
+    if np.can_cast(values.dtype, dtype, casting="safe"):
+        return
+    if dtype.kind == "f" and values.dtype.kind in "biuf":
+        return
+    if dtype.kind not in "iu" or values.dtype.kind not in "iu":
+        raise ValueError(f"Array of {values.dtype} cannot be converted to {dtype}.")
+    if values.size == 0:
+        return
+    info = np.iinfo(dtype)
+    if values.min() < info.min or values.max() > info.max:
+        raise ValueError(f"Array values are out of the range of {dtype}.")
+
+
+def _to_little_endian(values: array.array) -> array.array:  # type: ignore[type-arg]
+    """Byte swap is symmetric, so the same function converts to and from little-endian."""
+    if sys.byteorder == "big":
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+def _find_shape(value: Any, ndim: int) -> tuple[int, ...]:
+    """Return the shape of the nested sequence, raise ValueError if it is not fixed-shape."""
+    shape = []
+    level = [value]
+    for dim in range(ndim):
+        try:
+            sizes = {len(item) for item in level}
+        except TypeError:
+            raise ValueError("Nested array does not have a fixed shape.")
+        if len(sizes) > 1:
+            raise ValueError("Nested array does not have a fixed shape.")
+        shape.append(sizes.pop() if sizes else 0)
+        if dim < ndim - 1:
+            level = list(itertools.chain.from_iterable(level))
+    return tuple(shape)
@@ -0,0 +1,119 @@
+"""Memory mapped file used to exchange variables between Python and REPL."""
+import mmap
+import os
+import struct
+import tempfile
+
+# shared memory file system on Linux, on other platforms the default temporary directory is used
+SHARED_MEMORY_DIR = "/dev/shm"
+_LENGTH_HEADER = struct.Struct("<q")
+_ALIGNMENT = 8
+
+
+def pack_items(items: list[list[bytes | memoryview]]) -> list[bytes | memoryview]:
+    """Pack many items into a single channel message. Each item is given as a list of parts.
+
+    The message starts with little-endian Int64 values: number of items and the size of each
+    item, followed by the items data, each padded to a multiple of 8 bytes. Returns the message
+    parts which can be passed to TransferChannel.write without copying the items.
+    """
+    sizes = [sum(memoryview(part).nbytes for part in parts) for parts in items]
+    message: list[bytes | memoryview] = [struct.pack(f"<q{len(sizes)}q", len(sizes), *sizes)]
+    for parts, size in zip(items, sizes):
+        message.extend(parts)
+        message.append(bytes(-size % _ALIGNMENT))
+    return message
+
+
+def unpack_items(message: memoryview) -> list[memoryview]:
+    """Split the message created by `pack_items` (or `_packItems` in REPL) into items views."""
+    (count,) = struct.unpack_from("<q", message, 0)
+    sizes = struct.unpack_from(f"<{count}q", message, 8)
+    offset = 8 * (count + 1)
+    items = []
+    for size in sizes:
+        items.append(message[offset : offset + size])
+        offset += size + (-size % _ALIGNMENT)
+    if offset > len(message):
+        raise ValueError("Channel message is truncated.")
+    return items
+
+
+class TransferChannel:
+    """A memory mapped file which is created once per REPL and reused for every transfer.
+
+    Each message is stored at the beginning of the file as 8 bytes little-endian payload length
+    followed by the payload. The file is never truncated, it only grows when a larger message is
+    written, so both sides can keep it mapped. Swift helpers `_readChannel` and `_writeChannel`
+    from `constants.INIT_COMMANDS` implement the REPL side of the protocol.
+    """
+
+    def __init__(self, capacity: int = 1 << 20, directory: str | None = None) -> None:
+        """Create the channel file.
+
+        Args:
+            capacity: initial size of the channel file in bytes
+            directory: optional directory for the channel file, by default /dev/shm is used if
+                it exists, otherwise the default temporary directory.
+        """
+        if directory is None and os.path.isdir(SHARED_MEMORY_DIR):
+            directory = SHARED_MEMORY_DIR
+        self._fd, self.path = tempfile.mkstemp(prefix="repltilian-", suffix=".bin", dir=directory)
+        os.ftruncate(self._fd, max(capacity, _LENGTH_HEADER.size))
+        self._mmap = mmap.mmap(self._fd, os.fstat(self._fd).st_size)
+        self._closed = False
+
+    @property
+    def capacity(self) -> int:
+        return len(self._mmap)
+
+    def write(self, *parts: bytes | memoryview) -> None:
+        """Write the message composed of the given parts into the channel."""
+        views = [memoryview(part).cast("B") for part in parts]
+        size = sum(view.nbytes for view in views)
+        self._ensure_capacity(_LENGTH_HEADER.size + size)
+        _LENGTH_HEADER.pack_into(self._mmap, 0, size)
+        offset = _LENGTH_HEADER.size
+        for view in views:
+            self._mmap[offset : offset + view.nbytes] = view
+            offset += view.nbytes
+
+    def read(self) -> memoryview:
+        """Return the view of the last message written to the channel. The view is not copied,
+        so it is only valid until the next message is written.
+        """
+        file_size = os.fstat(self._fd).st_size
+        if file_size > self.capacity:
+            # REPL wrote a message larger than the current mapping
+            self._remap(file_size)
+        (size,) = _LENGTH_HEADER.unpack_from(self._mmap, 0)
+        if not 0 <= size <= self.capacity - _LENGTH_HEADER.size:
+            raise ValueError(f"Invalid channel message size: {size}")
+        return memoryview(self._mmap)[_LENGTH_HEADER.size : _LENGTH_HEADER.size + size]
+
+    def close(self) -> None:
+        """Release the memory mapping and remove the channel file."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._mmap.close()
+        except BufferError:
+            # views returned by read are still alive, the mapping is released with them
+            pass
+        os.close(self._fd)
+        os.unlink(self.path)
+
+    def _ensure_capacity(self, size: int) -> None:
+        if size <= self.capacity:
+            return
+        capacity = max(size, 2 * self.capacity)
+        os.ftruncate(self._fd, capacity)
+        self._remap(capacity)
+
+    def _remap(self, size: int) -> None:
+        try:
+            self._mmap.resize(size)
+        except (BufferError, SystemError, OSError):
+            # the old mapping is still exported by views, create a new one instead
+            self._mmap = mmap.mmap(self._fd, size)
@@ -1,4 +1,7 @@
 """Functions related to parsing Swift code."""
+import bisect
+import functools
+import itertools
 import re
 from dataclasses import dataclass
 from typing import Self, final
@@ -60,101 +63,304 @@ def _count_delta(text: str, start: str, end: str) -> int:
     return text.count(start) - text.count(end)
 
 
-def find_function(function_name: str, source_code: str) -> FunctionCode:
-    """Extract the code for a function from the given source code text.
+# kinds of the lexer states, see `scan_code`
+_COMMENT, _STRING, _INTERPOLATION = range(3)
+# tokens which change the lexer state, the text between them is copied or skipped as a whole.
+# Line comments and simple string literals (without interpolations) are matched as a whole.
+_SIMPLE_STRING = r'"(?!"")(?:[^"\\\n]|\\[^(\n])*"'
+_CODE_TOKENS = re.compile(rf'//[^\n]*|/\*|{_SIMPLE_STRING}|#*"')
+_INTERPOLATION_TOKENS = re.compile(rf'//[^\n]*|/\*|{_SIMPLE_STRING}|#*"|[()]')
+_COMMENT_TOKENS = re.compile(r"/\*|\*/")
+_STRING_TOKENS = re.compile(r'\\|"|\n')
+_BRACKETS = re.compile(r"[{}()\[\]]")
+
+
+@dataclass
+class ScannedCode:
+    # lines of the code without the comments and string literals
+    code_lines: list[str]
+    # indices of the lines which end inside a block comment or a multi-line string literal
+    open_lines: set[int]
+
 
-    Returns:
-        - full function content as a string
-        - function body as a string
-        - start index of the first body line (0-based)
-        - end index of the last body line (0-based)
+def scan_code(source_code: str) -> ScannedCode:
+    """Remove the comments and string literals from the code in a single pass. Block comments
+    (which may be nested), multi-line and raw string literals and string interpolations are
+    handled, so the brackets and declarations can be matched on the returned lines.
     """
-    lines = source_code.split("\n")
-
-    func_lines = []  # To collect the full function content
-    brace_count = 0  # To track opening and closing braces
-    inside_function = False  # Flag to indicate if we're inside the target function
-
-    func_start_index = None  # Line where the function definition starts
-    body_start_index = None  # Line where the function body starts
-    body_end_index = None  # Line where the function body ends
-
-    # Regular expression to match the function definition (including multiline)
-    func_def_pattern = re.compile(r"\bfunc\b[\s\S]*?\b" + re.escape(function_name) + r"\b")
-    lines_wo_comments = [line.split("//")[0] for line in lines]
-
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        line_wo_comments = lines_wo_comments[i]
-
-        # If we're not yet inside the function
-        if not inside_function:
-            # Check if the function definition starts here
-            # Collect lines until we find the opening brace '{'
-            potential_def_lines = []
-            def_start_index = i
-            while i < len(lines):
-                potential_def_lines.append(lines[i])
-                joined_lines = "\n".join(potential_def_lines)
-                if re.search(func_def_pattern, joined_lines):
-                    if "{" in lines_wo_comments[i]:
-                        # Found the opening brace
-                        func_start_index = def_start_index
-                        func_lines.extend(potential_def_lines)
-                        brace_count += _count_delta(lines_wo_comments[i], "{", "}")
-                        # Determine where the body starts
-                        if lines_wo_comments[i].strip().endswith("{"):
-                            body_start_index = i + 1
-                        else:
-                            body_start_index = i
-                        inside_function = True
-                        i += 1
-                        break
-                    else:
-                        i += 1
+    text = source_code
+    size = len(text)
+    output: list[str] = []
+    open_lines: set[int] = set()
+    line_number = 0
+    # open comments, strings and interpolations, the innermost last
+    stack: list[list[int]] = []
+    pos = 0
+    while pos < size:
+        top = stack[-1] if stack else None
+        if top is None:
+            match = _CODE_TOKENS.search(text, pos)
+        elif top[0] == _COMMENT:
+            match = _COMMENT_TOKENS.search(text, pos)
+        elif top[0] == _STRING:
+            match = _STRING_TOKENS.search(text, pos)
+        else:
+            match = _INTERPOLATION_TOKENS.search(text, pos)
+        start = match.start() if match is not None else size
+        if top is None:
+            output.append(text[pos:start])
+            line_number += text.count("\n", pos, start)
+        elif newlines := text.count("\n", pos, start):
+            output.append("\n" * newlines)
+            open_lines.update(range(line_number, line_number + newlines))
+            line_number += newlines
+        if match is None:
+            break
+        token = match.group()
+        pos = match.end()
+
+        if top is not None and top[0] == _COMMENT:
+            if token == "/*":
+                stack.append([_COMMENT])
+            else:
+                stack.pop()
+        elif top is not None and top[0] == _STRING:
+            hashes, multiline = top[1], top[2]
+            if token == "\n":
+                output.append(token)
+                if multiline:
+                    open_lines.add(line_number)
                 else:
-                    # Not the function we're looking for
-                    i += 1
-                    break
+                    # unterminated string, the line is skipped
+                    stack.pop()
+                line_number += 1
+            elif token == "\\":
+                if text.startswith("#" * hashes, pos):
+                    pos += hashes
+                    if text.startswith("(", pos):
+                        stack.append([_INTERPOLATION, 1])
+                        pos += 1
+                    elif pos < size and text[pos] != "\n":
+                        # escaped character
+                        pos += 1
             else:
-                # End of file reached without finding function
-                break
-        else:
-            # We're inside the function body
-            func_lines.append(line)
-            brace_count += _count_delta(line_wo_comments, "{", "}")
-            if brace_count == 0:
-                # Function body ends here
-                body_end_index = i
-                break
-            i += 1
-
-    if func_start_index is not None and body_start_index is not None and body_end_index is not None:
-        full_function_content = "\n".join(func_lines)
-        # The body is from body_start_index to body_end_index - 1
-        function_body = "\n".join(lines[body_start_index:body_end_index])
-        function_header = "\n".join(lines[func_start_index:body_start_index])
-        return FunctionCode(
-            name=function_name,
-            # full function content
-            code=full_function_content,
-            code_start_line=func_start_index,
-            code_end_line=i,
-            # header
-            header=function_header,
-            header_start_line=func_start_index,
-            header_end_line=body_start_index - 1,
-            # body
-            body=function_body,
-            body_start_line=body_start_index,
-            body_end_line=body_end_index - 1,
+                closing = 3 if multiline else 1
+                if text.startswith('"' * closing + "#" * hashes, start):
+                    stack.pop()
+                    pos = start + closing + hashes
+        elif token.startswith("//") or (len(token) > 1 and token[0] == '"'):
+            # line comment or simple string literal
+            pass
+        elif token == "/*":
+            stack.append([_COMMENT])
+        elif token.endswith('"'):
+            multiline = text.startswith('""', pos)
+            stack.append([_STRING, len(token) - 1, multiline])
+            if multiline:
+                pos += 2
+        elif top is not None:
+            # parentheses of the interpolation
+            top[1] += 1 if token == "(" else -1
+            if top[1] == 0:
+                stack.pop()
+    return ScannedCode("".join(output).split("\n"), open_lines)
+
+
+@dataclass
+class DeclarationSpan:
+    kind: str
+    name: str
+    # 0-based lines of the declaration header start, the body opening brace and the body
+    # closing brace
+    start_line: int
+    body_line: int = -1
+    end_line: int = -1
+
+
+class SourceIndex:
+    """Functions and types declared in the source code (including the nested declarations e.g.
+    methods), found with a single scan of the code.
+    """
+
+    # declarations which have a body with the braces
+    KINDS = {"func", "struct", "class", "enum", "protocol", "actor", "extension"}
+
+    def __init__(self, source_code: str) -> None:
+        self.lines = source_code.split("\n")
+        scanned = scan_code(source_code)
+        self.code_lines = scanned.code_lines
+        self.open_lines = scanned.open_lines
+        self.declarations: dict[str, list[DeclarationSpan]] = {}
+        for span in self._find_declarations():
+            self.declarations.setdefault(span.name, []).append(span)
+
+    def find(self, name: str, kind: str | None = None) -> DeclarationSpan | None:
+        """Return the first declaration with the given name and kind."""
+        for span in self.declarations.get(name, []):
+            if kind is None or span.kind == kind:
+                return span
+        return None
+
+    def _find_declarations(self) -> list[DeclarationSpan]:
+        code_text = "\n".join(self.code_lines)
+        # offsets of the line starts, to find the line numbers of the matches
+        line_starts = list(
+            itertools.accumulate((len(line) + 1 for line in self.code_lines), initial=0)
         )
-    else:
+        spans = []
+        # declaration of the body opened by each open brace, None for other braces
+        open_braces: list[DeclarationSpan | None] = []
+        # declaration waiting for its body and the nesting of its header
+        pending: DeclarationSpan | None = None
+        pending_nesting = (0, 0)
+        parentheses = 0
+        for match in _DECLARATIONS_AND_BRACKETS.finditer(code_text):
+            bracket = match.group()
+            if match.lastindex:
+                kind, name = match.groups()
+                pending = None
+                if kind in self.KINDS:
+                    line_number = bisect.bisect_right(line_starts, match.start(1)) - 1
+                    pending = DeclarationSpan(kind, name, line_number)
+                pending_nesting = (len(open_braces), parentheses)
+            elif bracket in "([":
+                parentheses += 1
+            elif bracket in ")]":
+                parentheses -= 1
+            elif bracket == "{":
+                if pending is not None and (len(open_braces), parentheses) == pending_nesting:
+                    pending.body_line = bisect.bisect_right(line_starts, match.start()) - 1
+                    spans.append(pending)
+                    open_braces.append(pending)
+                    pending = None
+                else:
+                    open_braces.append(None)
+            elif open_braces:
+                if (span := open_braces.pop()) is not None:
+                    span.end_line = bisect.bisect_right(line_starts, match.start()) - 1
+                if pending is not None and len(open_braces) < pending_nesting[0]:
+                    # a declaration without a body, e.g. a protocol requirement
+                    pending = None
+        return [span for span in spans if span.end_line >= 0]
+
+
+@functools.lru_cache(maxsize=16)
+def index_source(source_code: str) -> SourceIndex:
+    """Return the index of the source code, the index is cached for the recently used sources."""
+    return SourceIndex(source_code)
+
+
+def find_function(function_name: str, source_code: str) -> FunctionCode:
+    """Extract the code for a function from the given source code text. The first function
+    with the given name is returned, including the methods declared inside the types.
+    """
+    index = index_source(source_code)
+    span = index.find(function_name, "func")
+    if span is None:
         raise ValueError(
             f"Function '{function_name}' not found or improperly formatted, check for unmatched "
             f"{{}} or () or [] in the text or comments inside the function."
         )
+    lines = index.lines
+    start, end = span.start_line, span.end_line
+    # the body starts on the line of the opening brace if it is followed by code
+    body_start = span.body_line
+    if index.code_lines[body_start].rstrip().endswith("{"):
+        body_start += 1
+    return FunctionCode(
+        name=function_name,
+        # full function content
+        code="\n".join(lines[start : end + 1]),
+        code_start_line=start,
+        code_end_line=end,
+        # header
+        header="\n".join(lines[start:body_start]),
+        header_start_line=start,
+        header_end_line=body_start - 1,
+        # body
+        body="\n".join(lines[body_start:end]),
+        body_start_line=body_start,
+        body_end_line=end - 1,
+    )
+
+
+# declaration header e.g. "public struct Point<T>", "func findKNearestNeighbors<T>(...)" or
+# "public func +<T: NumberType>(...)", groups: declaration kind and name
+DECLARATION_PATTERN = re.compile(
+    r"^\s*(?:(?:@\w+(?:\([^)]*\))?|public|private|fileprivate|internal|open|final|indirect|"
+    r"static|mutating|nonisolated|prefix|postfix|infix)\s+)*"
+    r"(func|struct|class|enum|protocol|actor|typealias|let|var|extension|import)\s+"
+    r"([A-Za-z_][\w.]*|[^\s\w(<{]+)"
+)
+# declaration headers (with the kind and name groups) and brackets, in the order of the code
+_DECLARATIONS_AND_BRACKETS = re.compile(rf"(?m){DECLARATION_PATTERN.pattern}|{_BRACKETS.pattern}")
+# declarations which do not declare new names
+_NAMELESS_KINDS = {"extension", "import"}
+
+
+@dataclass
+class Declaration:
+    kind: str
+    name: str
+    code: str
+    start_line: int
+    end_line: int
+
+    @property
+    def declares_name(self) -> bool:
+        """Check if the declaration declares a new name which can be used by other code."""
+        return self.kind not in _NAMELESS_KINDS and self.name.isidentifier()
+
+
+def find_declared_names(source_code: str) -> set[str]:
+    """Return the names of functions, types and variables declared at the top level of the
+    source code. Operator functions and extensions are skipped.
+    """
+    names = set()
+    depth = 0
+    for line in index_source(source_code).code_lines:
+        if depth == 0 and (match := DECLARATION_PATTERN.match(line)):
+            kind, name = match.groups()
+            if kind not in _NAMELESS_KINDS and name.isidentifier():
+                names.add(name)
+        depth += _count_delta(line, "{", "}")
+    return names
+
+
+def split_declarations(source_code: str) -> list[Declaration]:
+    """Split the source code into top-level declarations: functions, types, extensions,
+    protocols etc. Comment lines between declarations are skipped, attribute lines (e.g.
+    "@inlinable") are attached to the following declaration. Top-level statements which are not
+    declarations are returned with empty kind and name.
+    """
+    declarations = []
+    attribute_lines: list[str] = []
+    code_lines = index_source(source_code).code_lines
+    for block in extract_code_blocks(source_code.split("\n")):
+        if block.is_comment_block():
+            continue
+        lines = block.code_lines
+        while lines and (not lines[0].strip() or lines[0].strip().startswith("//")):
+            lines = lines[1:]
+        if re.fullmatch(r"\s*@\w+(\(.*\))?\s*", block.text):
+            attribute_lines.extend(lines)
+            continue
+        kind, name = "", ""
+        first_line = block.end_line - len(lines) + 1
+        if match := DECLARATION_PATTERN.match(code_lines[first_line]):
+            kind, name = match.groups()
+        start_line = first_line - len(attribute_lines)
+        declarations.append(
+            Declaration(
+                kind=kind,
+                name=name,
+                code="\n".join(attribute_lines + lines),
+                start_line=start_line,
+                end_line=block.end_line,
+            )
+        )
+        attribute_lines = []
+    return declarations
 
 
 @final
@@ -224,6 +430,8 @@ def extract_code_blocks(source_lines: list[str]) -> list[CodeBlock]:
     current_block: list[str] = []
     start_line_num = 0
     grouping_levels = {"paren": 0, "bracket": 0, "brace": 0}
+    # lines without comments and strings
+    scanned = scan_code("\n".join(source_lines))
 
     for i in range(0, len(source_lines)):
         line = source_lines[i]
@@ -231,21 +439,20 @@ def extract_code_blocks(source_lines: list[str]) -> list[CodeBlock]:
             # Start of a new block
             start_line_num = i
         current_block.append(line)
-
-        # Remove comments
-        line_no_comment = line.split("//")[0]
-        line_no_strings = _remove_string_literals(line_no_comment)
+        line_code = scanned.code_lines[i]
 
         # Update grouping levels
-        grouping_levels["paren"] += _count_delta(line_no_strings, "(", ")")
-        grouping_levels["brace"] += _count_delta(line_no_strings, "{", "}")
-        grouping_levels["bracket"] += _count_delta(line_no_strings, "[", "]")
+        grouping_levels["paren"] += _count_delta(line_code, "(", ")")
+        grouping_levels["brace"] += _count_delta(line_code, "{", "}")
+        grouping_levels["bracket"] += _count_delta(line_code, "[", "]")
 
-        # Check if grouping levels are zero
+        # Check if grouping levels are zero and the line does not end inside a multi-line
+        # string or comment
         if (
             grouping_levels["paren"] == 0
             and grouping_levels["brace"] == 0
             and grouping_levels["bracket"] == 0
+            and i not in scanned.open_lines
         ):
             # Statement is complete
             end_line_num = i
@@ -272,26 +479,3 @@ def extract_code_blocks(source_lines: list[str]) -> list[CodeBlock]:
     # remove empty blocks
     blocks = [block for block in blocks if block.text.strip() != ""]
     return blocks
-
-
-def _remove_string_literals(text: str) -> str:
-    """Remove string literals to avoid counting braces inside strings"""
-    result = ""
-    in_string = False
-    escape_next = False
-    for c in text:
-        if escape_next:
-            escape_next = False
-            continue
-        if c == "\\":
-            escape_next = True
-            continue
-        if c == '"' and not in_string:
-            in_string = True
-            continue
-        elif c == '"' and in_string:
-            in_string = False
-            continue
-        if not in_string:
-            result += c
-    return result
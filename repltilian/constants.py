@@ -2,24 +2,221 @@ INIT_COMMANDS = """
 import Foundation
 import Dispatch
 
+/// Function to decode an object from JSON data
+func _decodeObject<T: Decodable>(_ data: Data) throws -> T {
+    let decoder = JSONDecoder()
+    return try decoder.decode(T.self, from: data)
+}
+
+/// Function to encode an object as JSON data
+func _encodeObject<T: Encodable>(_ object: T) throws -> Data {
+    let encoder = JSONEncoder()
+    return try encoder.encode(object)
+}
+
 /// Function to deserialize an object from a JSON file at the given path
 func _deserializeObject<T: Decodable>(_ path: String) throws -> T {
     let url = URL(fileURLWithPath: path)
     let data = try Data(contentsOf: url)
-    let decoder = JSONDecoder()
-    let object = try decoder.decode(T.self, from: data)
-    return object
+    return try _decodeObject(data)
 }
 
 /// Function to serialize an object and save it as a JSON file at the given path
 func _serializeObject<T: Encodable>(_ object: T, to path: String) throws {
-    let encoder = JSONEncoder()
-    encoder.outputFormatting = [.prettyPrinted, .sortedKeys] // Optional formatting
-    let data = try encoder.encode(object)
+    let data = try _encodeObject(object)
     let url = URL(fileURLWithPath: path)
     try data.write(to: url)
 }
 
+/// Numeric types which can be transferred as raw little-endian binary arrays, the type code
+/// must match the Python array module type code of the element.
+protocol _BinaryScalar {
+    static var _binaryTypeCode: UInt8 { get }
+}
+
+extension Float: _BinaryScalar { static var _binaryTypeCode: UInt8 { UInt8(ascii: "f") } }
+extension Double: _BinaryScalar { static var _binaryTypeCode: UInt8 { UInt8(ascii: "d") } }
+extension Int: _BinaryScalar { static var _binaryTypeCode: UInt8 { UInt8(ascii: "q") } }
+extension Int32: _BinaryScalar { static var _binaryTypeCode: UInt8 { UInt8(ascii: "i") } }
+extension Int16: _BinaryScalar { static var _binaryTypeCode: UInt8 { UInt8(ascii: "h") } }
+extension Int8: _BinaryScalar { static var _binaryTypeCode: UInt8 { UInt8(ascii: "b") } }
+extension UInt: _BinaryScalar { static var _binaryTypeCode: UInt8 { UInt8(ascii: "Q") } }
+extension UInt32: _BinaryScalar { static var _binaryTypeCode: UInt8 { UInt8(ascii: "I") } }
+extension UInt16: _BinaryScalar { static var _binaryTypeCode: UInt8 { UInt8(ascii: "H") } }
+extension UInt8: _BinaryScalar { static var _binaryTypeCode: UInt8 { UInt8(ascii: "B") } }
+
+enum _BinaryTransferError: Error {
+    case invalidHeader
+    case typeMismatch(expected: UInt8, found: Int)
+    case shapeMismatch(shape: [Int])
+}
+
+/// Read the file content, the file is memory mapped if possible
+func _readData(_ path: String) throws -> Data {
+    return try Data(contentsOf: URL(fileURLWithPath: path), options: .alwaysMapped)
+}
+
+func _writeData(_ data: Data, to path: String) throws {
+    try data.write(to: URL(fileURLWithPath: path))
+}
+
+enum _ChannelError: Error {
+    case invalidMessage
+}
+
+/// Read little-endian Int64 value at the given offset from the data start
+func _readInt64(_ data: Data, at offset: Int) throws -> Int {
+    guard offset >= 0 && offset + 8 <= data.count else { throw _ChannelError.invalidMessage }
+    var value: Int64 = 0
+    let start = data.startIndex + offset
+    withUnsafeMutableBytes(of: &value) { data.copyBytes(to: $0, from: start ..< start + 8) }
+    return Int(Int64(littleEndian: value))
+}
+
+/// Read the message from the transfer channel file: 8 bytes little-endian payload length
+/// followed by the payload. The file is memory mapped and the payload is not copied.
+func _readChannel(_ path: String) throws -> Data {
+    let data = try _readData(path)
+    let size = try _readInt64(data, at: 0)
+    guard size >= 0 && 8 + size <= data.count else { throw _ChannelError.invalidMessage }
+    return data[8 ..< 8 + size]
+}
+
+/// Read the item with the given index from the channel message created with _packItems
+func _readChannelItem(_ path: String, _ index: Int) throws -> Data {
+    return try _unpackItem(_readChannel(path), index)
+}
+
+/// Pack the items into a single message: number of items and the size of each item as
+/// little-endian Int64 values, followed by the items, each padded to a multiple of 8 bytes.
+func _packItems(_ items: [Data]) -> Data {
+    let header = ([items.count] + items.map { $0.count }).map { Int64($0).littleEndian }
+    var data = Data()
+    header.withUnsafeBytes { data.append(contentsOf: $0) }
+    for item in items {
+        data.append(item)
+        data.append(Data(count: (8 - item.count % 8) % 8))
+    }
+    return data
+}
+
+func _unpackItem(_ data: Data, _ index: Int) throws -> Data {
+    let count = try _readInt64(data, at: 0)
+    guard index >= 0 && index < count else { throw _ChannelError.invalidMessage }
+    var offset = (count + 1) * 8
+    for i in 0 ..< index {
+        let size = try _readInt64(data, at: (i + 1) * 8)
+        offset += size + (8 - size % 8) % 8
+    }
+    let size = try _readInt64(data, at: (index + 1) * 8)
+    guard offset + size <= data.count else { throw _ChannelError.invalidMessage }
+    return data[data.startIndex + offset ..< data.startIndex + offset + size]
+}
+
+/// Write the message to the transfer channel file. The file is overwritten in place and never
+/// truncated, so it stays valid for the memory mapping on the Python side.
+func _writeChannel(_ data: Data, to path: String) throws {
+    let handle = try FileHandle(forWritingTo: URL(fileURLWithPath: path))
+    defer { try? handle.close() }
+    var length = Int64(data.count).littleEndian
+    try handle.write(contentsOf: Data(bytes: &length, count: 8))
+    try handle.write(contentsOf: data)
+}
+
+/// Encode the array as the header: [ndim, shape..., type code] of little-endian Int64 values,
+/// followed by the raw array elements.
+func _encodeBinaryArray<T: _BinaryScalar>(_ values: [T], shape: [Int]) throws -> Data {
+    guard values.count == shape.reduce(1, *) else {
+        throw _BinaryTransferError.shapeMismatch(shape: shape)
+    }
+    let header = ([shape.count] + shape + [Int(T._binaryTypeCode)]).map { Int64($0).littleEndian }
+    var data = Data(capacity: header.count * 8 + values.count * MemoryLayout<T>.stride)
+    header.withUnsafeBytes { data.append(contentsOf: $0) }
+    values.withUnsafeBytes { data.append(contentsOf: $0) }
+    return data
+}
+
+func _encodeBinaryArray<T: _BinaryScalar>(_ values: [T]) throws -> Data {
+    return try _encodeBinaryArray(values, shape: [values.count])
+}
+
+func _encodeBinaryArray<T: _BinaryScalar>(_ values: [[T]]) throws -> Data {
+    let shape = [values.count, values.first?.count ?? 0]
+    // ragged arrays could match the total count with a wrong shape
+    guard values.allSatisfy({ $0.count == shape[1] }) else {
+        throw _BinaryTransferError.shapeMismatch(shape: shape)
+    }
+    return try _encodeBinaryArray(values.flatMap { $0 }, shape: shape)
+}
+
+func _encodeBinaryArray<T: _BinaryScalar>(_ values: [[[T]]]) throws -> Data {
+    let shape = [values.count, values.first?.count ?? 0, values.first?.first?.count ?? 0]
+    guard values.allSatisfy({ $0.count == shape[1] && $0.allSatisfy { $0.count == shape[2] } })
+    else {
+        throw _BinaryTransferError.shapeMismatch(shape: shape)
+    }
+    return try _encodeBinaryArray(values.flatMap { $0.flatMap { $0 } }, shape: shape)
+}
+
+/// Decode the binary array header and copy the raw elements into a flat array
+func _decodeBinaryBuffer<T: _BinaryScalar>(_ data: Data) throws -> (shape: [Int], values: [T]) {
+    return try data.withUnsafeBytes { (raw: UnsafeRawBufferPointer) -> ([Int], [T]) in
+        func field(_ index: Int) throws -> Int {
+            guard (index + 1) * 8 <= raw.count else { throw _BinaryTransferError.invalidHeader }
+            var value: Int64 = 0
+            let bytes = UnsafeRawBufferPointer(rebasing: raw[index * 8 ..< (index + 1) * 8])
+            withUnsafeMutableBytes(of: &value) { $0.copyMemory(from: bytes) }
+            return Int(Int64(littleEndian: value))
+        }
+        let ndim = try field(0)
+        let shape = try (0 ..< ndim).map { try field($0 + 1) }
+        let typeCode = try field(ndim + 1)
+        guard typeCode == Int(T._binaryTypeCode) else {
+            throw _BinaryTransferError.typeMismatch(expected: T._binaryTypeCode, found: typeCode)
+        }
+        let offset = (ndim + 2) * 8
+        let count = shape.reduce(1, *)
+        let size = count * MemoryLayout<T>.stride
+        guard offset + size <= raw.count else { throw _BinaryTransferError.invalidHeader }
+        let values = [T](unsafeUninitializedCapacity: count) { buffer, initializedCount in
+            UnsafeMutableRawBufferPointer(buffer).copyMemory(
+                from: UnsafeRawBufferPointer(rebasing: raw[offset ..< offset + size])
+            )
+            initializedCount = count
+        }
+        return (shape, values)
+    }
+}
+
+func _decodeBinaryArray<T: _BinaryScalar>(_ data: Data) throws -> [T] {
+    return try _decodeBinaryBuffer(data).values
+}
+
+func _decodeBinaryArray<T: _BinaryScalar>(_ data: Data) throws -> [[T]] {
+    let (shape, values): ([Int], [T]) = try _decodeBinaryBuffer(data)
+    guard shape.count == 2 else { throw _BinaryTransferError.shapeMismatch(shape: shape) }
+    return (0 ..< shape[0]).map { i in Array(values[i * shape[1] ..< (i + 1) * shape[1]]) }
+}
+
+func _decodeBinaryArray<T: _BinaryScalar>(_ data: Data) throws -> [[[T]]] {
+    let (shape, values): ([Int], [T]) = try _decodeBinaryBuffer(data)
+    guard shape.count == 3 else { throw _BinaryTransferError.shapeMismatch(shape: shape) }
+    let stride = shape[1] * shape[2]
+    return (0 ..< shape[0]).map { i in
+        (0 ..< shape[1]).map { j in
+            let start = i * stride + j * shape[2]
+            return Array(values[start ..< start + shape[2]])
+        }
+    }
+}
+
+/// Function to load the dynamic library with the compiled reload files
+func _loadLibrary(_ path: String) {
+    if dlopen(path, RTLD_NOW | RTLD_GLOBAL) == nil {
+        print("error: cannot load '\\(path)': \\(String(cString: dlerror()))")
+    }
+}
+
 /// Runs async function in a synchronous manner. REPL crashes when await is called in the
 /// main thread.
 func runSync<T>(_ asyncClosure: @escaping () async throws -> T) throws -> T {
@@ -40,6 +237,190 @@ func runSync<T>(_ asyncClosure: @escaping () async throws -> T) throws -> T {
     return try result.get()
 }
 
+/// Measure the average cost in nanoseconds of the line profiler probe, the same statements
+/// are executed as in the instrumented function. The minimum of a few rounds is used to skip
+/// the rounds interrupted by the scheduler.
+func _measureLineProfilerProbeCost(rounds: Int = 5, probes: Int = 10_000) -> UInt64 {
+    let __line_times = UnsafeMutablePointer<UInt64>.allocate(capacity: 2)
+    let __line_hits = UnsafeMutablePointer<UInt64>.allocate(capacity: 2)
+    __line_times.initialize(repeating: 0, count: 2)
+    __line_hits.initialize(repeating: 0, count: 2)
+    defer {
+        __line_times.deallocate()
+        __line_hits.deallocate()
+    }
+    var __line = 0
+    var __now: UInt64 = 0
+    var best = UInt64.max
+    for _ in 0..<rounds {
+        var __last = DispatchTime.now().uptimeNanoseconds
+        let start = __last
+        for i in 0..<probes {
+            __now = DispatchTime.now().uptimeNanoseconds
+            __line_times[__line] &+= __now &- __last
+            __last = __now
+            __line = i & 1
+            __line_hits[__line] &+= 1
+        }
+        best = min(best, (DispatchTime.now().uptimeNanoseconds - start) / UInt64(probes))
+    }
+    return best
+}
+
+let _lineProfilerProbeCost = _measureLineProfilerProbeCost()
+
+/// Counters of the line profiler accumulated over all calls of the profiled function, the
+/// times are in nanoseconds and include the probes cost. The callee counters are indexed by
+/// the profiled function index and count only the direct calls.
+struct _LineProfile: Codable {
+    var calls: UInt64 = 0
+    var totalTime: UInt64 = 0
+    /// number of probes executed by the profiled functions called from this function
+    var childProbes: UInt64 = 0
+    var probeCost: UInt64 = _lineProfilerProbeCost
+    var hits: [UInt64] = []
+    var times: [UInt64] = []
+    var calleeCalls: [UInt64]
+    var calleeTimes: [UInt64]
+    var calleeProbes: [UInt64]
+
+    init(functions: Int) {
+        calleeCalls = [UInt64](repeating: 0, count: functions)
+        calleeTimes = [UInt64](repeating: 0, count: functions)
+        calleeProbes = [UInt64](repeating: 0, count: functions)
+    }
+
+    mutating func add(
+        times: UnsafeMutablePointer<UInt64>,
+        hits: UnsafeMutablePointer<UInt64>,
+        count: Int,
+        totalTime: UInt64,
+        childProbes: UInt64
+    ) {
+        if self.times.count != count {
+            self.times = [UInt64](repeating: 0, count: count)
+            self.hits = [UInt64](repeating: 0, count: count)
+        }
+        for line in 0..<count {
+            self.times[line] &+= times[line]
+            self.hits[line] &+= hits[line]
+        }
+        self.totalTime &+= totalTime
+        self.childProbes &+= childProbes
+        self.calls &+= 1
+    }
+}
+
+/// Counters of the profiled functions, indexed by the function index
+var _lineProfiles: [_LineProfile] = []
+/// Profiled functions being executed: the function index and the number of probes executed by
+/// the profiled functions called from it
+var _lineProfileStack: [(function: Int, childProbes: UInt64)] = []
+
+func _lineProfileReset(functions: Int) {
+    _lineProfiles = (0..<functions).map { _ in _LineProfile(functions: functions) }
+    _lineProfileStack = []
+}
+
+func _lineProfileEnter(_ function: Int) {
+    // the instrumented functions of a previous profiling run are still defined in the REPL
+    guard function < _lineProfiles.count else { return }
+    _lineProfileStack.append((function, 0))
+}
+
+func _lineProfileExit(
+    _ function: Int,
+    times: UnsafeMutablePointer<UInt64>,
+    hits: UnsafeMutablePointer<UInt64>,
+    count: Int,
+    totalTime: UInt64
+) {
+    guard function < _lineProfiles.count else { return }
+    let frame = _lineProfileStack.removeLast()
+    _lineProfiles[function].add(
+        times: times, hits: hits, count: count, totalTime: totalTime,
+        childProbes: frame.childProbes
+    )
+    guard let caller = _lineProfileStack.last?.function else { return }
+    var probes = frame.childProbes
+    for line in 0..<count {
+        probes &+= hits[line]
+    }
+    _lineProfileStack[_lineProfileStack.count - 1].childProbes &+= probes
+    _lineProfiles[caller].calleeCalls[function] &+= 1
+    _lineProfiles[caller].calleeTimes[function] &+= totalTime
+    _lineProfiles[caller].calleeProbes[function] &+= probes
+}
+
+/// Sampling profiler: the SIGPROF handler stores the return addresses of the interrupted thread
+/// (up to _sampleDepth frames padded with zeros) in a preallocated buffer, so it does not
+/// allocate memory.
+let _sampleDepth = 32
+var _sampleCapacity = 0
+var _sampleCount = 0
+var _sampleBuffer = UnsafeMutablePointer<UnsafeMutableRawPointer?>.allocate(capacity: 1)
+var _sampleFrames: [UInt] = []
+
+func _setProfileTimer(intervalMicroseconds: Int) {
+    let interval = timeval(
+        tv_sec: .init(intervalMicroseconds / 1_000_000),
+        tv_usec: .init(intervalMicroseconds % 1_000_000)
+    )
+    var timer = itimerval(it_interval: interval, it_value: interval)
+    #if os(Linux)
+    setitimer(__itimer_which_t(ITIMER_PROF.rawValue), &timer, nil)
+    #else
+    setitimer(ITIMER_PROF, &timer, nil)
+    #endif
+}
+
+func _sampleProfileStart(intervalMicroseconds: Int, maxSamples: Int) {
+    _sampleBuffer.deallocate()
+    _sampleBuffer = .allocate(capacity: maxSamples * _sampleDepth)
+    _sampleBuffer.initialize(repeating: nil, count: maxSamples * _sampleDepth)
+    _sampleCapacity = maxSamples
+    _sampleCount = 0
+    // backtrace is not async-signal-safe on its first call: it loads the unwinder, which takes
+    // the dynamic loader and malloc locks, and the interrupted code may hold them. Calling it
+    // once before the timer is armed leaves only the lock-free stack walk to the handler.
+    _ = backtrace(_sampleBuffer, Int32(_sampleDepth))
+    signal(SIGPROF) { _ in
+        guard _sampleCount < _sampleCapacity else { return }
+        _ = backtrace(_sampleBuffer + _sampleCount * _sampleDepth, Int32(_sampleDepth))
+        _sampleCount += 1
+    }
+    _setProfileTimer(intervalMicroseconds: intervalMicroseconds)
+}
+
+/// Stop the sampling, returns the samples frames as a flat array
+func _sampleProfileStop() -> [UInt] {
+    _setProfileTimer(intervalMicroseconds: 0)
+    signal(SIGPROF, SIG_IGN)
+    return (0..<_sampleCount * _sampleDepth).map { UInt(bitPattern: _sampleBuffer[$0]) }
+}
+
+/// Consumes the value, so the compiler cannot remove the benchmarked code which computes it
+@inline(never) @_optimize(none)
+func _blackHole<T>(_ value: T) {}
+
+/// Returns the value unchanged, the compiler cannot assume anything about the returned value
+@inline(never) @_optimize(none)
+func _opaque<T>(_ value: T) -> T {
+    return value
+}
+
+/// Times of the benchmark repeats in nanoseconds, each repeat runs `number` iterations
+struct _BenchmarkTimes: Codable {
+    var number: Int = 0
+    var times: [UInt64] = []
+}
+
+var _benchmarkResult = _BenchmarkTimes()
+
 """
 
 END_OF_INCLUDE = "// -- END OF AUTO REPL INCLUDE --"
+
+# Prefix of the marker printed after each prompt when Options.completion_mode is "sentinel". The
+# marker is rendered through string interpolation so the echoed input never matches the output.
+SENTINEL_PREFIX = "__REPLTILIAN_DONE_"
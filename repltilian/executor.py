@@ -0,0 +1,196 @@
+"""Parallel execution of jobs in many REPL processes."""
+import collections
+import os
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, TypeVar
+
+from repltilian.pool import REPLPool
+from repltilian.repl import Options, SwiftREPL, SwiftREPLException
+
+T = TypeVar("T")
+
+_Job = tuple[Future[Any], Callable[..., Any], tuple[Any, ...], dict[str, Any]]
+
+
+class SwiftREPLExecutor:
+    """Runs jobs in a number of REPL worker processes and returns `concurrent.futures.Future`
+    objects, e.g. to run parameter sweeps or independent benchmark cases on all cores.
+
+    Each worker owns one REPL and a thread which executes the jobs in this REPL one by one.
+    Jobs submitted with `submit` or `run` are executed by the first idle worker, jobs submitted
+    with `broadcast` or `run_all` are executed by every worker before any job submitted later.
+    The REPL state is not shared between workers, so the setup code and reload files should be
+    broadcast.
+
+    Example:
+        with SwiftREPLExecutor(workers=4) as executor:
+            executor.run_all("func square(_ x: Int) -> Int { x * x }")
+            futures = [executor.run(f"let y = square({x})", outputs=["y"]) for x in range(10)]
+            results = [f.result()["y"] for f in futures]
+    """
+
+    def __init__(
+        self, workers: int | None = None, cwd: str | None = None, options: Options | None = None
+    ) -> None:
+        """Start the REPL workers, the processes are started in parallel.
+
+        Args:
+            workers: number of REPL processes, by default the number of CPUs
+            cwd: optional path to the working directory passed to each SwiftREPL
+            options: REPL options, each worker gets its own copy
+        """
+        workers = workers if workers is not None else os.cpu_count() or 1
+        self._pool = REPLPool(size=workers, cwd=cwd, options=options)
+        self._repls: list[SwiftREPL] = []
+        try:
+            for _ in range(workers):
+                self._repls.append(self._pool.acquire())
+        except SwiftREPLException:
+            self._close_repls()
+            raise
+
+        self._condition = threading.Condition()
+        self._jobs: collections.deque[_Job] = collections.deque()
+        self._worker_jobs: list[collections.deque[_Job]] = [
+            collections.deque() for _ in self._repls
+        ]
+        self._shutdown = False
+        self._threads = [
+            threading.Thread(target=self._work, args=(index,), name=f"repltilian-{index}")
+            for index in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def workers(self) -> int:
+        return len(self._repls)
+
+    def submit(self, function: Callable[..., T], *args: Any, **kwargs: Any) -> "Future[T]":
+        """Schedule `function(repl, *args, **kwargs)` in the first idle worker."""
+        future: Future[T] = Future()
+        with self._condition:
+            self._check_running()
+            self._jobs.append((future, function, args, kwargs))
+            self._condition.notify()
+        return future
+
+    def broadcast(
+        self, function: Callable[..., T], *args: Any, **kwargs: Any
+    ) -> "list[Future[T]]":
+        """Schedule `function(repl, *args, **kwargs)` in every worker, returns the futures in
+        the workers order.
+        """
+        futures: list[Future[T]] = [Future() for _ in self._repls]
+        with self._condition:
+            self._check_running()
+            for jobs, future in zip(self._worker_jobs, futures):
+                jobs.append((future, function, args, kwargs))
+            self._condition.notify_all()
+        return futures
+
+    def run(
+        self,
+        prompt: str,
+        outputs: list[str] | None = None,
+        autoreload: bool = False,
+        verbose: bool = False,
+    ) -> "Future[dict[str, Any]]":
+        """Run the prompt in the first idle worker.
+
+        Args:
+            prompt: Swift code to run
+            outputs: names of the variables returned by the future, fetched from the same
+                worker right after the prompt is executed.
+            autoreload: send the reload files of the worker before the prompt
+            verbose: print the REPL output
+        """
+        return self.submit(_run, prompt, outputs or [], autoreload, verbose)
+
+    def run_all(
+        self, prompt: str, autoreload: bool = False, verbose: bool = False
+    ) -> "list[Future[dict[str, Any]]]":
+        """Run the prompt (e.g. the setup code) in every worker."""
+        return self.broadcast(_run, prompt, [], autoreload, verbose)
+
+    def add_reload_file(self, path: str | Path) -> None:
+        """Add the reload file to every worker, see `SwiftREPL.add_reload_file`."""
+        if not Path(path).is_file():
+            raise FileNotFoundError(f"File '{path}' does not exist.")
+        for future in self.broadcast(SwiftREPL.add_reload_file, path):
+            future.result()
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        """Stop the workers and close the REPL processes.
+
+        Args:
+            wait: wait until the pending jobs are executed and the REPLs are closed
+            cancel_futures: cancel the jobs which did not start yet
+        """
+        with self._condition:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            if cancel_futures:
+                for jobs in [self._jobs, *self._worker_jobs]:
+                    while jobs:
+                        jobs.popleft()[0].cancel()
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+            self._close_repls()
+        else:
+            threading.Thread(target=self._close_repls, args=(True,), daemon=True).start()
+
+    def _check_running(self) -> None:
+        if self._shutdown:
+            raise SwiftREPLException("Executor is shut down.")
+
+    def _work(self, index: int) -> None:
+        repl = self._repls[index]
+        own_jobs = self._worker_jobs[index]
+        while True:
+            with self._condition:
+                while not own_jobs and not self._jobs and not self._shutdown:
+                    self._condition.wait()
+                if own_jobs:
+                    job = own_jobs.popleft()
+                elif self._jobs:
+                    job = self._jobs.popleft()
+                else:
+                    return
+            future, function, args, kwargs = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = function(repl, *args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def _close_repls(self, join: bool = False) -> None:
+        if join:
+            for thread in self._threads:
+                thread.join()
+        for repl in self._repls:
+            repl.close()
+        self._repls = []
+        self._pool.close()
+
+    def __enter__(self) -> "SwiftREPLExecutor":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.shutdown()
+
+
+def _run(
+    repl: SwiftREPL, prompt: str, outputs: list[str], autoreload: bool, verbose: bool
+) -> dict[str, Any]:
+    repl.run(prompt, autoreload=autoreload, verbose=verbose)
+    return repl.vars.get_many(outputs)
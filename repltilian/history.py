@@ -0,0 +1,127 @@
+"""Functions related to the history of the benchmark results.
+
+The results are appended to a JSON lines file, one record per measured benchmark version, so
+the file can be kept next to the benchmarked code and compared between the sessions.
+"""
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+
+from repltilian.benchmark import BenchmarkResult, Comparison
+
+
+@dataclass
+class HistoryEntry:
+    # name of the benchmark, e.g. the benchmarked statement
+    name: str
+    # version of the benchmarked code, e.g. "baseline" or "candidate"
+    label: str
+    # seconds since the epoch
+    timestamp: float
+    # hash of the benchmarked code, None if unknown
+    digest: str | None
+    result: BenchmarkResult
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "name": self.name,
+                "label": self.label,
+                "timestamp": self.timestamp,
+                "digest": self.digest,
+                "number": self.result.number,
+                "times_ns": self.result.times_ns,
+            }
+        )
+
+    @classmethod
+    def from_json(cls, text: str) -> "HistoryEntry":
+        record = json.loads(text)
+        return cls(
+            name=record["name"],
+            label=record["label"],
+            timestamp=record["timestamp"],
+            digest=record["digest"],
+            result=BenchmarkResult(record["number"], record["times_ns"]),
+        )
+
+
+def code_digest(source_code: str) -> str:
+    return hashlib.sha1(source_code.encode()).hexdigest()
+
+
+class BenchmarkHistory:
+    """Benchmark results stored in a JSON lines file."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def entries(self, name: str | None = None, label: str | None = None) -> list[HistoryEntry]:
+        """Return the stored entries in the order of recording, optionally filtered by the
+        benchmark name and label.
+        """
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path) as f:
+            entries = [HistoryEntry.from_json(line) for line in f if line.strip()]
+        return [
+            entry
+            for entry in entries
+            if (name is None or entry.name == name) and (label is None or entry.label == label)
+        ]
+
+    def latest(self, name: str, label: str) -> HistoryEntry | None:
+        entries = self.entries(name, label)
+        return entries[-1] if entries else None
+
+    def record(
+        self, name: str, label: str, result: BenchmarkResult, digest: str | None = None
+    ) -> HistoryEntry:
+        """Append the result to the history file."""
+        entry = HistoryEntry(name, label, time.time(), digest, result)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(entry.to_json() + "\n")
+        return entry
+
+    def check_regression(
+        self, name: str, label: str, result: BenchmarkResult, threshold: float = 0.05
+    ) -> Comparison | None:
+        """Compare the result with the latest stored result of the same benchmark and label.
+        Returns the comparison if the result is significantly slower by more than the threshold
+        (a fraction of the previous time), otherwise None.
+        """
+        previous = self.latest(name, label)
+        if previous is None:
+            return None
+        comparison = Comparison(previous.result, result, "previous", "current")
+        _, high = comparison.speedup_interval
+        if high < 1 / (1 + threshold):
+            return comparison
+        return None
+
+    def report(self, name: str, label: str | None = None) -> str:
+        """Format the history of the benchmark, with the speedup of each entry relative to the
+        previous entry of the same label.
+        """
+        rows = [
+            "Date                 Label         Per iteration    Speedup  Digest",
+            "===============================================================",
+        ]
+        previous: dict[str, HistoryEntry] = {}
+        for entry in self.entries(name, label):
+            date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry.timestamp))
+            last = previous.get(entry.label)
+            speedup = (
+                f"{Comparison(last.result, entry.result).speedup:9.3f}x" if last else f"{'':10}"
+            )
+            rows.append(
+                f"{date}  {entry.label:12} {entry.result.ns_per_iter:12.1f} ns {speedup}  "
+                f"{(entry.digest or '')[:8]}"
+            )
+            previous[entry.label] = entry
+        return "\n".join(rows)
@@ -0,0 +1,128 @@
+"""Functions related to loading the Swift code into the REPL as a compiled module."""
+import functools
+import hashlib
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+LIBRARY_SUFFIX = ".dylib" if sys.platform == "darwin" else ".so"
+# top-level statements are not allowed in the library module
+_STATEMENT_PATTERN = re.compile(r"^[A-Za-z_][\w.]*\s*\(", re.MULTILINE)
+
+
+def default_cache_directory() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "repltilian", "modules")
+
+
+def is_declarations_only(source: str) -> bool:
+    """Check if the code can be compiled as a library, top-level statements like function calls
+    are only allowed in the REPL.
+    """
+    return _STATEMENT_PATTERN.search(source) is None
+
+
+def library_path(directory: str, module_name: str) -> str:
+    return os.path.join(directory, f"lib{module_name}{LIBRARY_SUFFIX}")
+
+
+@functools.cache
+def compiler_version() -> str:
+    """Version of the swiftc compiler, modules built by another compiler cannot be imported."""
+    result = subprocess.run(["swiftc", "--version"], check=True, capture_output=True, text=True)
+    return result.stdout.strip()
+
+
+def compile_module(
+    source: str,
+    directory: str,
+    module_name: str,
+    search_paths: list[str] | None = None,
+    flags: list[str] | None = None,
+) -> str:
+    """Write the code to a generated file and compile it into a dynamic library and a Swift
+    module which can be imported by the REPL. Returns the path to the library.
+
+    Raises:
+        subprocess.CalledProcessError: if the compilation failed, the compiler output is
+            available in the `stderr` attribute.
+    """
+    source_path = os.path.join(directory, f"{module_name}.swift")
+    with open(source_path, "w") as file:
+        file.write(source)
+
+    output_path = library_path(directory, module_name)
+    command = [
+        "swiftc",
+        "-parse-as-library",
+        "-emit-library",
+        "-emit-module",
+        # internal declarations are visible with @testable import
+        "-enable-testing",
+        "-module-name",
+        module_name,
+        "-emit-module-path",
+        os.path.join(directory, f"{module_name}.swiftmodule"),
+        "-o",
+        output_path,
+        *(flags or []),
+    ]
+    for path in search_paths or []:
+        command += ["-I", path, "-L", path]
+    command.append(source_path)
+    subprocess.run(command, check=True, capture_output=True, text=True)
+    return output_path
+
+
+def cached_module_name(
+    source: str, search_paths: list[str] | None = None, flags: list[str] | None = None
+) -> str:
+    """Name of the module compiled from the code, derived from the hash of the code, flags and
+    compiler version.
+    """
+    key = hashlib.sha1()
+    for part in [source, compiler_version(), *(flags or []), *(search_paths or [])]:
+        key.update(part.encode() + b"\0")
+    return f"ReplInclude_{key.hexdigest()[:16]}"
+
+
+def build_cached_module(
+    source: str,
+    cache_directory: str,
+    search_paths: list[str] | None = None,
+    flags: list[str] | None = None,
+) -> str:
+    """Compile the code into a module stored in the cache directory, returns the module name
+    (see `cached_module_name`), so the unchanged code is compiled only once, also across REPL
+    sessions.
+    """
+    module_name = cached_module_name(source, search_paths, flags)
+    if os.path.isfile(library_path(cache_directory, module_name)):
+        return module_name
+
+    os.makedirs(cache_directory, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=cache_directory) as build_directory:
+        library = compile_module(source, build_directory, module_name, search_paths, flags)
+        # the library is moved last, it marks the complete module in the cache
+        for name in os.listdir(build_directory):
+            if name != os.path.basename(library):
+                os.replace(os.path.join(build_directory, name), os.path.join(cache_directory, name))
+        os.replace(library, library_path(cache_directory, module_name))
+    return module_name
+
+
+def load_commands(directory: str, module_name: str) -> list[str]:
+    """REPL input which loads the module compiled with `compile_module`."""
+    return [
+        f":settings append target.swift-module-search-paths {_quote(directory)}",
+        f"_loadLibrary({_quote(library_path(directory, module_name))})",
+        f"@testable import {module_name}",
+    ]
+
+
+def _quote(text: str) -> str:
+    """Quote the path as an LLDB command argument or a Swift string literal."""
+    escaped = text.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
@@ -0,0 +1,138 @@
+"""A pool of pre-initialized REPL processes."""
+import contextlib
+import dataclasses
+import queue
+import threading
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+from repltilian.repl import Options, SwiftREPL, SwiftREPLException
+
+
+class REPLPool:
+    """Keeps `size` initialized REPL processes for the given working directory.
+
+    Starting the REPL (spawning the process, sending the init commands and, for `swift run
+    --repl`, building the package) takes seconds. The pool starts the processes in background
+    threads, so `acquire` returns an already running REPL. Released REPLs are either reused or
+    closed and replaced in the background, while the next REPL from the pool is used.
+
+    Example:
+        pool = REPLPool(size=2)
+        with pool.checkout() as repl:
+            repl.run("let x = 1")
+        pool.close()
+    """
+
+    def __init__(
+        self, size: int = 2, cwd: str | None = None, options: Options | None = None
+    ) -> None:
+        """Create the pool and start the REPL processes in the background.
+
+        Args:
+            size: number of REPL processes managed by the pool, `acquire` blocks when all of
+                them are in use
+            cwd: optional path to the working directory passed to each SwiftREPL
+            options: REPL options, each REPL gets its own copy
+        """
+        if size < 1:
+            raise ValueError("Pool size must be a positive number.")
+        self.size = size
+        self.cwd = cwd
+        self.options = options if options is not None else Options()
+        # ready REPLs or the exceptions raised while starting them
+        self._ready: queue.Queue[SwiftREPL | Exception] = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="repltilian")
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(size):
+            self._executor.submit(self._start)
+
+    def acquire(self, timeout: float | None = None) -> SwiftREPL:
+        """Take the running REPL from the pool.
+
+        Args:
+            timeout: maximum number of seconds to wait for the REPL, wait forever if None
+
+        Raises:
+            SwiftREPLException: if the pool is closed, the REPL did not start in time or it
+                failed to start.
+        """
+        if self._closed:
+            raise SwiftREPLException("REPL pool is closed.")
+        try:
+            repl = self._ready.get(timeout=timeout)
+        except queue.Empty:
+            raise SwiftREPLException(f"No REPL is ready after {timeout} seconds.")
+        if isinstance(repl, Exception):
+            self._submit(self._start)
+            raise SwiftREPLException(f"REPL failed to start: {repl}") from repl
+        if not repl.is_alive:
+            # the process died while waiting in the pool
+            self.release(repl)
+            return self.acquire(timeout=timeout)
+        return repl
+
+    def release(self, repl: SwiftREPL, recycle: bool = False) -> None:
+        """Return the REPL to the pool.
+
+        Args:
+            repl: REPL obtained from `acquire`
+            recycle: if True, the REPL process is reused: the Python side state (options,
+                variables register and reload files) is reset, but the code which was already
+                executed stays in the REPL. Otherwise the process is closed and a new one is
+                started in the background.
+        """
+        if recycle and not self._closed and repl.is_alive:
+            repl.reset(options=dataclasses.replace(self.options))
+            self._ready.put(repl)
+        elif not self._submit(lambda: self._replace(repl)):
+            repl.close()
+
+    @contextlib.contextmanager
+    def checkout(self, recycle: bool = False) -> Iterator[SwiftREPL]:
+        """Context manager which acquires the REPL and releases it at exit."""
+        repl = self.acquire()
+        try:
+            yield repl
+        finally:
+            self.release(repl, recycle=recycle)
+
+    def close(self) -> None:
+        """Close all REPL processes of the pool, including the ones being started."""
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=True)
+        while not self._ready.empty():
+            repl = self._ready.get_nowait()
+            if isinstance(repl, SwiftREPL):
+                repl.close()
+
+    def _start(self) -> None:
+        try:
+            repl: SwiftREPL | Exception = SwiftREPL(
+                cwd=self.cwd, options=dataclasses.replace(self.options)
+            )
+        except Exception as e:
+            repl = e
+        self._ready.put(repl)
+
+    def _replace(self, repl: SwiftREPL) -> None:
+        try:
+            repl.close()
+        finally:
+            self._start()
+
+    def _submit(self, function: Callable[[], None]) -> bool:
+        """Run the function in the background unless the pool is closed."""
+        with self._lock:
+            if self._closed:
+                return False
+            self._executor.submit(function)
+            return True
+
+    def __enter__(self) -> "REPLPool":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
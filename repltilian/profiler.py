@@ -1,79 +1,318 @@
 """Functions related to line profiler functionality."""
 import re
+from dataclasses import dataclass, field
+from typing import Any
 
 from repltilian import code
 
+# Swift variable with the profiler counters of each function, see _LineProfile in the init
+# commands
+PROFILE_VARIABLE = "_lineProfiles"
+
+
+@dataclass
+class InstrumentedFunction:
+    name: str
+    # index of the function counters in the profiled functions
+    index: int
+    code: str
+    # 1-based line number of the function in the source file
+    line: int
+    # body lines, indexed by the line number used by the probes
+    lines: list[str]
+    # compound blocks (e.g. loops) as a mapping from the first line to the last line
+    block_ends: dict[int, int]
+    # code of the function before the instrumentation, sent again after the profiling run
+    original_code: str
+
+
+@dataclass
+class LineStats:
+    line: int
+    hits: int
+    time_ns: int
+    source: str
+
+    @property
+    def per_hit_ns(self) -> float:
+        return self.time_ns / self.hits if self.hits > 0 else 0.0
+
+
+@dataclass
+class CallStats:
+    calls: int
+    time_ns: int
+
+
+@dataclass
+class LineProfileResult:
+    """Line profiler statistics of the function accumulated over all its calls. The time of a
+    compound block (e.g. a for loop) is the sum of the times of its lines, the probes cost is
+    already subtracted from all times.
+
+    `total_time_ns` is the inclusive time of the function, `exclusive_time_ns` excludes the time
+    spent in the other profiled functions, which are listed in `callees` (direct calls only).
+    The time of a line which calls other profiled functions includes the cost of their probes.
+    """
+
+    function_name: str
+    function_line: int
+    calls: int
+    total_time_ns: int
+    exclusive_time_ns: int
+    probe_cost_ns: int
+    lines: list[LineStats]
+    callees: dict[str, CallStats] = field(default_factory=dict)
+
+    @classmethod
+    def from_counters(
+        cls,
+        function: InstrumentedFunction,
+        counters: dict[str, Any],
+        function_names: list[str] | None = None,
+    ) -> "LineProfileResult":
+        """Create the result from the _LineProfile counters transferred from the REPL.
+
+        Args:
+            function: the instrumented function
+            counters: the function counters
+            function_names: names of all profiled functions in the order of their indices,
+                used to name the callees.
+        """
+        num_lines = len(function.lines)
+        probe_cost = counters["probeCost"]
+        hits = counters["hits"][:num_lines] or [0] * num_lines
+        times = [
+            max(time - count * probe_cost, 0)
+            for time, count in zip(counters["times"][:num_lines] or [0] * num_lines, hits)
+        ]
+        probes = sum(counters["hits"]) + counters["childProbes"]
+        total_time = max(counters["totalTime"] - probes * probe_cost, 0)
+        block_times = list(times)
+        for start, end in function.block_ends.items():
+            block_times[start] = sum(times[start : end + 1])
+
+        callees = {}
+        for name, calls, time, callee_probes in zip(
+            function_names or [],
+            counters["calleeCalls"],
+            counters["calleeTimes"],
+            counters["calleeProbes"],
+        ):
+            if calls > 0:
+                callees[name] = CallStats(calls, max(time - callee_probes * probe_cost, 0))
+        callees_time = sum(stats.time_ns for stats in callees.values())
+        return cls(
+            function_name=function.name,
+            function_line=function.line,
+            calls=counters["calls"],
+            total_time_ns=total_time,
+            exclusive_time_ns=max(total_time - callees_time, 0),
+            probe_cost_ns=probe_cost,
+            lines=[
+                LineStats(line, hits[line], block_times[line], function.lines[line])
+                for line in range(num_lines)
+            ],
+            callees=callees,
+        )
+
+    def to_text(self) -> str:
+        """Format the statistics as a table, times in seconds."""
+        rows = [
+            "Timer unit: 1 ns",
+            "",
+            f"Total time: {self.total_time_ns / 1e9:.3f} s",
+            f"Probe cost: {self.probe_cost_ns} ns per hit (subtracted)",
+            f"Function: {self.function_name} at line {self.function_line}",
+            "",
+            "Line #      Hits         Time   Per Hit   % Time  Line Contents",
+            "===============================================================",
+        ]
+        for stats in self.lines:
+            percent_time = (
+                stats.time_ns / self.total_time_ns * 100 if self.total_time_ns > 0 else 0.0
+            )
+            rows.append(
+                f"{stats.line:6d} {stats.hits:10d} {stats.time_ns / 1e9:12.6f} "
+                f"{stats.per_hit_ns / 1e9:9.6f} {percent_time:8.1f}%  {stats.source}"
+            )
+        return "\n".join(rows)
+
+    def __str__(self) -> str:
+        return self.to_text()
+
+
+@dataclass
+class ProfileResult:
+    """Statistics of all functions profiled in a single run, by the function name."""
+
+    functions: dict[str, LineProfileResult]
+
+    @classmethod
+    def from_counters(
+        cls, functions: list[InstrumentedFunction], counters: list[dict[str, Any]]
+    ) -> "ProfileResult":
+        """Create the result from the _lineProfiles counters transferred from the REPL."""
+        names = [function.name for function in functions]
+        return cls(
+            {
+                function.name: LineProfileResult.from_counters(
+                    function, counters[function.index], names
+                )
+                for function in functions
+            }
+        )
+
+    def to_text(self) -> str:
+        """Format the functions summary sorted by the exclusive time, followed by the callees
+        and the lines statistics of each called function.
+        """
+        results = sorted(
+            self.functions.values(), key=lambda result: result.exclusive_time_ns, reverse=True
+        )
+        rows = [
+            "    Calls    Inclusive    Exclusive  Function",
+            "===============================================================",
+        ]
+        for result in results:
+            rows.append(
+                f"{result.calls:9d} {result.total_time_ns / 1e9:12.6f} "
+                f"{result.exclusive_time_ns / 1e9:12.6f}  {result.function_name}"
+            )
+            for name, stats in result.callees.items():
+                rows.append(f"{stats.calls:9d} {stats.time_ns / 1e9:12.6f} {'':12}    -> {name}")
+        for result in results:
+            if result.calls > 0:
+                rows += ["", result.to_text()]
+        return "\n".join(rows)
+
+    def __str__(self) -> str:
+        return self.to_text()
+
 
 def get_function_for_line_profiler(function_name: str, source_code: str) -> str:
+    """Return the function code instrumented with the line profiler probes, see
+    `instrument_function`.
+    """
+    return instrument_function(function_name, source_code).code
+
+
+def find_profiled_functions(source_code: str) -> list[str]:
+    """Return the names of the top-level functions which can be profiled, operator functions
+    and functions declared on a single line (see `instrument_function`) are skipped.
+    """
+    names = []
+    for declaration in code.split_declarations(source_code):
+        if declaration.kind == "func" and declaration.declares_name:
+            if declaration.start_line == declaration.end_line:
+                continue
+            if declaration.name not in names:
+                names.append(declaration.name)
+    return names
+
+
+def profile_prompt(functions: list[InstrumentedFunction], prompt: str) -> str:
+    """Return the prompt which resets the counters, defines the instrumented functions and runs
+    the given prompt.
+    """
+    reset = f"_lineProfileReset(functions: {len(functions)})"
+    return "\n".join([reset] + [function.code for function in functions] + [prompt])
+
+
+def instrument_function(
+    function_name: str, source_code: str, index: int = 0
+) -> InstrumentedFunction:
+    """Instrument the function with the line profiler probes.
+
+    The time and hits counters are flat buffers indexed by the line number. A probe is inserted
+    before each block and reads a single timestamp: the time elapsed since the previous probe is
+    added to the line which was executed last, so the end of one line is the start of the next.
+    When the function returns, the counters are added to the `_lineProfiles[index]` variable,
+    which is transferred to Python and converted to `LineProfileResult`.
+
+    Args:
+        function_name: name of the function
+        source_code: code with the function definition
+        index: index of the function counters, unique for each function profiled in a run
+
+    Raises:
+        ValueError: if the function is not found or it is declared on a single line e.g.
+            `func one() -> Int { return 1 }`, its body cannot be instrumented.
+    """
     function = code.find_function(function_name, source_code)
+    if function.code_start_line == function.code_end_line:
+        raise ValueError(
+            f"Function '{function_name}' is declared on a single line and cannot be profiled, "
+            f"move its body to separate lines."
+        )
     body_lines = code.make_body_return_var(function.body).split("\n")
     body_lines = [line for line in body_lines if line.strip()]
     return_line, body_lines = body_lines[-1], body_lines[:-1]
 
     # Initialize the profiling variables
-    indent_match = re.match(r"\s*", body_lines[0])
+    indent_match = re.match(r"\s*", return_line)
     indent = indent_match.group() if indent_match else ""
     num_lines = len(body_lines)
 
     line_contents: dict[int, str] = {}
+    block_ends: dict[int, int] = {}
+    # the last slot collects the time before the first probe
+    size = num_lines + 1
     instrumented_lines: list[str] = [
-        indent + "var __line_times = [Int: UInt64]()",
-        indent + "var __line_hits = [Int: Int]()",
-        indent + f"(0..<{num_lines}).map {{ i in __line_times[i] = 0}}",
-        indent + f"(0..<{num_lines}).map {{ i in __line_hits[i] = 0}}",
+        indent + f"let __line_times = UnsafeMutablePointer<UInt64>.allocate(capacity: {size})",
+        indent + f"let __line_hits = UnsafeMutablePointer<UInt64>.allocate(capacity: {size})",
+        indent + f"__line_times.initialize(repeating: 0, count: {size})",
+        indent + f"__line_hits.initialize(repeating: 0, count: {size})",
+        indent + f"var __line = {num_lines}",
+        indent + "var __now: UInt64 = 0",
+        indent + f"_lineProfileEnter({index})",
         indent + "let __start_time_func = DispatchTime.now().uptimeNanoseconds",
+        indent + "var __last = __start_time_func",
+        indent + "defer {",
+        indent + "    let __end_time_func = DispatchTime.now().uptimeNanoseconds",
+        indent + "    __line_times[__line] &+= __end_time_func &- __last",
+        indent + "    _lineProfileExit(",
+        indent + f"        {index},",
+        indent + "        times: __line_times,",
+        indent + "        hits: __line_hits,",
+        indent + f"        count: {size},",
+        indent + "        totalTime: __end_time_func - __start_time_func",
+        indent + "    )",
+        indent + "    __line_times.deallocate()",
+        indent + "    __line_hits.deallocate()",
+        indent + "}",
     ]
 
     blocks = code.extract_code_blocks(body_lines)
     for block in blocks:
-        render_for_profile(block, instrumented_lines, line_contents)
-
-    instrumented_lines.append(indent + "let __end_time_func = DispatchTime.now().uptimeNanoseconds")
-
-    # Insert code to print profiling statistics before the closing brace
-    profiling_output = [
-        indent + 'print("Timer unit: 1 ns")',
-        indent + "let __total_time = __end_time_func - __start_time_func",
-        indent + 'print(String(format: "\\nTotal time: %.3f s", Double('
-        "__total_time)/1_000_000_000))",
-        indent + f'print("Function: {function_name} at line {function.code_start_line + 1}")',
-        indent + 'print("")',
-        indent + 'print("Line #      Hits         Time   Per Hit   % Time  Line Contents")',
-        indent + 'print("===============================================================")',
-        indent + "for line in (__line_times.keys.sorted()) {",
-        indent + "    let hits = __line_hits[line] ?? 0",
-        indent + "    let time = __line_times[line] ?? 0",
-        indent + "    let per_hit = hits > 0 ? Double(time) / Double(hits) : 0",
-        indent + "    let percent_time = __total_time > 0 "
-        "? (Double(time) / Double(__total_time)) * 100 : 0",
-        indent + "    let lineContentDict: [Int: String] = [",
-    ]
+        render_for_profile(block, instrumented_lines, line_contents, block_ends)
 
-    # Add line contents to the dictionary
-    for ln in sorted(line_contents.keys()):
-        content = line_contents[ln]
-        profiling_output.append(indent + f'        {ln}: "{content}",')
-    profiling_output.append(indent + "    ]")
-    profiling_output.append(indent + '    let contents = lineContentDict[line] ?? ""')
-    profiling_output.append(
-        indent + '    print(String(format: "%6d %10d %12.6f %9.6f %8.1f%%  %@", line, hits, '
-        "Double(time)/1_000_000_000, per_hit/1_000_000_000, percent_time, contents))"
-    )
-    profiling_output.append(indent + "}")
-    # Find the closing brace line and insert profiling output before it
-    instrumented_lines = instrumented_lines + profiling_output + [return_line]
+    instrumented_lines.append(return_line)
     match = re.match(r"\s*", function.header)
     header_intent = match.group() if match else ""
     instrumented_lines = [function.header] + instrumented_lines + [header_intent + "}"]
 
-    return "\n".join(instrumented_lines)
+    return InstrumentedFunction(
+        name=function_name,
+        index=index,
+        code="\n".join(instrumented_lines),
+        line=function.code_start_line + 1,
+        lines=[line_contents.get(line, "") for line in range(num_lines)],
+        block_ends=block_ends,
+        original_code=function.code,
+    )
 
 
 def render_for_profile(
     block: code.CodeBlock,
     instrumented_lines: list[str],
     line_contents: dict[int, str],
+    block_ends: dict[int, int],
 ) -> None:
+    """Append the block code preceded by the probe of its first line. The blocks which can be
+    split (e.g. loops) are instrumented recursively, their line ranges are added to
+    `block_ends`.
+    """
     if block.num_lines == 0:
         return
 
@@ -82,32 +321,31 @@ def render_for_profile(
     indent = match.group() if match else ""
     line_number = block.start_line
 
-    start_time_var = f"__start_time_{line_number}"
-    end_time_var = f"__end_time_{line_number}"
-    # Insert timing code
+    if block.is_comment_block():
+        # comments are not executed, the probe would only add the overhead
+        for i, line in enumerate(lines):
+            line_contents[line_number + i] = line
+            instrumented_lines.append(line)
+        return
+
+    # the time since the previous probe is added to the previously executed line
     instrumented_lines.append(
-        indent + f"let {start_time_var} = DispatchTime.now().uptimeNanoseconds"
+        indent + "__now = DispatchTime.now().uptimeNanoseconds; "
+        "__line_times[__line] &+= __now &- __last; __last = __now; "
+        f"__line = {line_number}; __line_hits[{line_number}] &+= 1"
     )
     if len(lines) == 1:
-        line_contents[line_number] = lines[0].replace('"', '\\"')
+        line_contents[line_number] = lines[0]
         instrumented_lines.append(lines[0])
     elif not block.can_split():
         for i, line in enumerate(lines):
-            line_contents[line_number + i] = line.replace('"', '\\"')
+            line_contents[line_number + i] = line
             instrumented_lines.append(line)
     else:
         instrumented_lines.append(lines[0])
-        line_contents[line_number] = lines[0].replace('"', '\\"')
+        line_contents[line_number] = lines[0]
         for inner in block.split():
-            render_for_profile(inner, instrumented_lines, line_contents)
+            render_for_profile(inner, instrumented_lines, line_contents, block_ends)
         instrumented_lines.append(lines[-1])
-        line_contents[block.end_line] = lines[-1].replace('"', '\\"')
-
-    instrumented_lines.append(indent + f"let {end_time_var} = DispatchTime.now().uptimeNanoseconds")
-    instrumented_lines.append(
-        indent + f"__line_times[{line_number}] = (__line_times[{line_number}] ?? 0) "
-        f"+ ({end_time_var} - {start_time_var})"
-    )
-    instrumented_lines.append(
-        indent + f"__line_hits[{line_number}] = (__line_hits[{line_number}] ?? 0) + 1"
-    )
+        line_contents[block.end_line] = lines[-1]
+        block_ends[line_number] = block.end_line
@@ -0,0 +1,171 @@
+"""Functions related to the autoreload of source files in the REPL."""
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+from functools import cached_property
+
+from repltilian import code
+
+
+@dataclass
+class SourceFile:
+    path: str
+    mtime_ns: int
+    size: int
+    digest: str
+    content: str
+    names: set[str]
+
+    @cached_property
+    def declarations(self) -> dict[str, code.Declaration]:
+        """Top-level declarations of the file by their content hash."""
+        return {_hash(d.code): d for d in code.split_declarations(self.content)}
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def load_source_file(path: str, cached: SourceFile | None = None) -> SourceFile:
+    """Read the source file and compute its content hash and declared names. The cached state is
+    reused if the file modification time and size did not change.
+    """
+    stat = os.stat(path)
+    if cached is not None and (cached.mtime_ns, cached.size) == (stat.st_mtime_ns, stat.st_size):
+        return cached
+    content = code.get_file_content(path)
+    digest = _hash(content)
+    if cached is not None and cached.digest == digest:
+        names = cached.names
+    else:
+        names = code.find_declared_names(content)
+    return SourceFile(path, stat.st_mtime_ns, stat.st_size, digest, content, names)
+
+
+class ReloadTracker:
+    """Tracks which reload files were sent to the REPL, so only the changed code is resent.
+
+    A file (or a top-level declaration, when tracking by declarations) is resent when its content
+    changed since the last successful run. Code which uses the names declared in the changed code
+    is resent too, otherwise it would still refer to the stale definitions compiled in the REPL.
+    """
+
+    def __init__(self) -> None:
+        self._sent: dict[str, SourceFile] = {}
+        self._cache: dict[str, SourceFile] = {}
+        # names whose declarations must be resent even if they did not change
+        self._invalidated: set[str] = set()
+
+    def prepare(
+        self, paths: list[str], by_declaration: bool = False
+    ) -> tuple[str, list[SourceFile]]:
+        """Return the code which has to be sent to the REPL and the list of files states which
+        should be committed after the successful run.
+
+        Args:
+            paths: reload files paths
+            by_declaration: if True, only the changed top-level declarations are resent instead
+                of the whole changed files.
+        """
+        files = []
+        for path in paths:
+            source = load_source_file(path, self._cache.get(path))
+            self._cache[path] = source
+            files.append(source)
+
+        if by_declaration:
+            return self._prepare_declarations(files)
+
+        changed = set()
+        names: set[str] = set()
+        for i, source in enumerate(files):
+            if source.digest == self._digest(source.path) and not (
+                source.names & self._invalidated
+            ):
+                continue
+            changed.add(i)
+            names |= source.names
+            if (sent := self._sent.get(source.path)) is not None:
+                names |= sent.names
+                self._warn_removed(source.path, sent.names - source.names)
+
+        units = [(source.content, source.names) for source in files]
+        changed = _add_dependent_units(units, changed, names)
+        to_send = [files[i] for i in sorted(changed)]
+        return "\n".join(f.content for f in to_send), to_send
+
+    def _prepare_declarations(self, files: list[SourceFile]) -> tuple[str, list[SourceFile]]:
+        units: list[tuple[str, set[str]]] = []
+        changed: set[int] = set()
+        changed_files = []
+        names: set[str] = set()
+        for source in files:
+            sent = self._sent.get(source.path)
+            sent_declarations = sent.declarations if sent is not None else {}
+            invalidated = False
+            for digest, declaration in source.declarations.items():
+                declared_names = {declaration.name} if declaration.declares_name else set()
+                if digest not in sent_declarations or declared_names & self._invalidated:
+                    changed.add(len(units))
+                    names |= declared_names
+                    invalidated |= bool(declared_names & self._invalidated)
+                units.append((declaration.code, declared_names))
+            if sent_declarations.keys() != source.declarations.keys():
+                changed_files.append(source)
+                self._warn_removed(
+                    source.path,
+                    {d.name for d in sent_declarations.values() if d.declares_name}
+                    - {d.name for d in source.declarations.values() if d.declares_name},
+                )
+            elif invalidated:
+                changed_files.append(source)
+
+        changed = _add_dependent_units(units, changed, names)
+        return "\n".join(units[i][0] for i in sorted(changed)), changed_files
+
+    def commit(self, files: list[SourceFile]) -> None:
+        """Mark the files as successfully sent to the REPL."""
+        for source in files:
+            self._sent[source.path] = source
+            self._invalidated -= source.names
+
+    def invalidate(self, names: set[str]) -> None:
+        """Resend the declarations of the names with the next run even if they did not change,
+        e.g. when they were shadowed in the REPL by other declarations.
+        """
+        self._invalidated |= names
+
+    def reset(self) -> None:
+        """Forget the sent files, they will be sent again with the next run."""
+        self._sent.clear()
+        self._invalidated.clear()
+
+    def _digest(self, path: str) -> str | None:
+        sent = self._sent.get(path)
+        return sent.digest if sent is not None else None
+
+    @staticmethod
+    def _warn_removed(path: str, removed: set[str]) -> None:
+        if removed:
+            print(
+                f"WARNING! Declarations removed from '{path}' are still defined in the REPL: "
+                f"{', '.join(sorted(removed))}"
+            )
+
+
+def _add_dependent_units(
+    units: list[tuple[str, set[str]]], changed: set[int], names: set[str]
+) -> set[int]:
+    """Add units (code and its declared names) which use the given names to the changed units,
+    repeated until no more units are affected.
+    """
+    changed = set(changed)
+    while names:
+        pattern = re.compile(r"\b(?:" + "|".join(map(re.escape, sorted(names))) + r")\b")
+        names = set()
+        for i, (text, declared_names) in enumerate(units):
+            if i not in changed and pattern.search(text):
+                changed.add(i)
+                names |= declared_names
+    return changed
@@ -1,20 +1,107 @@
+import collections
 import json
 import os
 import re
-import tempfile
+import select
+import subprocess
+import sys
+import time
+import warnings
+from collections.abc import Callable, Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
-import sys
+from typing import Any, TypeVar
+
 import pexpect
 
-from repltilian import code, constants, profiler, repl_output
+from repltilian import (
+    benchmark,
+    buffers,
+    channel,
+    code,
+    constants,
+    history,
+    loader,
+    profiler,
+    reload,
+    repl_output,
+    sampler,
+    stats,
+)
+from repltilian.benchmark import BenchmarkResult, Comparison
+
+# a regex which matches the waiting prompt e.g. "1>" or "102>" but there must not be any text
+# after the prompt
+PROMPT_PATTERN = re.compile(r"(\d+>$)")
+# seconds without any REPL output after which the input is assumed to be consumed even if its
+# echo was not received
+_ECHO_STALL_TIMEOUT = 1.0
+# maximum number of characters of the input blocks, the blocks are only used to track the echo,
+# the input is sent as a whole
+_INPUT_BLOCK_SIZE = 2000
+# terminal escape sequence in the raw output e.g. "\x1b[1G", the echoed lines are matched without
+# them
+_ESCAPE_SEQUENCE_PATTERN = re.compile(r"\x1b(?:\[[^A-Za-z]*[A-Za-z])?")
 
 
 class SwiftREPLException(Exception):
     pass
 
 
+def _tty_input_buffer_size(fd: int) -> int:
+    """Size of the tty input queue, writing more input without reading the REPL echo blocks (on
+    Linux) or drops the input (on macOS).
+    """
+    if sys.platform.startswith("linux"):
+        # N_TTY_BUF_SIZE, Linux reports MAX_INPUT of 255 which is not the real buffer size
+        return 4096
+    try:
+        return os.fpathconf(fd, "PC_MAX_INPUT")
+    except (OSError, ValueError):
+        return 1024
+
+
+class _EchoTracker:
+    """Counts the input bytes acknowledged by the REPL echo, each input line is echoed as a line
+    starting with the REPL prompt e.g. " 12> let x = 1" or " 13. }".
+    """
+
+    def __init__(self, blocks: list[str]) -> None:
+        self.data = "".join(block + "\n" for block in blocks).encode()
+        self.acked = 0
+        # raw output after the last new line character
+        self._line = ""
+
+    def feed(self, output: str) -> None:
+        """Acknowledge the input lines echoed in the raw output chunk, the lines of the program
+        output printed while the input is sent are not counted.
+        """
+        if self.done:
+            return
+        *lines, self._line = (self._line + output).split("\n")
+        for line in lines:
+            line = _ESCAPE_SEQUENCE_PATTERN.sub("", line).lstrip()
+            if not repl_output._PROMPT_INPUT_PATTERN.match(line):
+                continue
+            end = self.data.find(b"\n", self.acked)
+            self.acked = len(self.data) if end == -1 else end + 1
+            if self.done:
+                break
+
+    @property
+    def done(self) -> bool:
+        return self.acked >= len(self.data)
+
+
+def _crash_exception(error: Exception) -> SwiftREPLException:
+    return SwiftREPLException(
+        f"REPL crashed with error: '{error}'. Did you try to run "
+        f"async function ? If yes consider to use: 'try runSync "
+        f"{{ try await yourAsyncFunction }}'"
+    )
+
+
 @dataclass
 class Options:
     output_hide_inputs: bool = True
@@ -22,29 +109,72 @@ class Options:
     output_stop_pattern: str | None = None
     timeout: float = 0.01
     maxread: int = 4096
-    maxsend: int = 1000 if sys.platform == "darwin" else 2000
+    # deprecated, the input is sent as fast as the REPL echoes it, see `input_window`
+    maxsend: int | None = None
+    # maximum number of input bytes sent to the REPL but not echoed yet, by default the size of
+    # the tty input buffer
+    input_window: int | None = None
+    # reload files content larger than this number of characters is compiled into a module and
+    # imported instead of being typed into the REPL, only for the first load, None disables it
+    import_threshold: int | None = None
+    # directory with the compiled reload files modules, by default ~/.cache/repltilian/modules
+    module_cache_dir: str | None = None
+    # swiftc flags used to compile the reload files in the "compiled" reload mode
+    compiled_flags: tuple[str, ...] = ("-O",)
+    # "prompt" polls the output with `timeout` until the REPL prompt is displayed, "sentinel"
+    # prints a unique marker after each prompt and blocks until the marker is received
+    completion_mode: str = "prompt"
+    # "changed" sends only reload files which changed since the last successful run (and files
+    # which depend on them), "declarations" sends only the changed top-level declarations (and
+    # declarations which depend on them), "all" sends all reload files with each autoreload run,
+    # "compiled" imports the reload files compiled with optimizations (see `_import_include`)
+    reload_mode: str = "changed"
+    # print the output lines as they are printed by the REPL, see `SwiftREPL.stream`
+    output_streaming: bool = False
+    # maximum number of characters of the output kept in memory in the streaming mode
+    output_buffer_size: int = 1 << 20
+    # maximum number of characters of the runs output kept to parse the variables types and
+    # values printed by the REPL, the least recently used outputs are removed first
+    variables_echo_size: int = 1 << 20
+    # called with the `stats.RunStats` of each run, variables get and set call, e.g. to feed
+    # a metrics system
+    stats_hook: Callable[[stats.RunStats], None] | None = None
 
+    def __post_init__(self) -> None:
+        if self.maxsend is not None:
+            warnings.warn(
+                "Options.maxsend is deprecated and ignored, the input is limited by "
+                "Options.input_window instead.",
+                DeprecationWarning,
+                stacklevel=3,
+            )
 
-class SwiftREPL:
-    def __init__(self, cwd: str | None = None, options: Options = Options()) -> None:
-        """Initialize the Swift REPL.
 
-        Args:
-            cwd: optional path to the working directory, a folder with Package.swift file. If
-                provided, the REPL will be started with `swift run --repl` command, otherwise
-                with `swift repl`.
-            options: an instance of REPLOptions class with optional parameters for REPL output.
-        """
+class BaseSwiftREPL:
+    """REPL state and the logic shared by the blocking `SwiftREPL` and the asyncio based
+    `async_repl.AsyncSwiftREPL`, subclasses implement the communication with the process.
+    """
+
+    vars: "BaseVariablesRegister[Any]"
+    _process: pexpect.spawn
+    _channel: channel.TransferChannel
+
+    def __init__(self, cwd: str | None = None, options: Options | None = None) -> None:
         self.cwd = cwd
-        self.options = options
-        self.vars = VariablesRegister(self)
+        self.options = options if options is not None else Options()
         self._initialized = False
         self._reload_paths: set[str] = set()
+        self._reload_tracker = reload.ReloadTracker()
         self._output: str | None = None
-
-        self._process = self._initiate_repl()
-        self.run(constants.INIT_COMMANDS, verbose=False)
-        self.run("""print("REPL is running !")""")
+        self._sentinel_id = 0
+        # raw output received after the last completion marker
+        self._raw_output = ""
+        # name of the module compiled from the reload files, see `_import_include`
+        self._imported_module: str | None = None
+        # stats of the last completed run, variables get or set call
+        self.last_run_stats: stats.RunStats | None = None
+        # stats of the call in progress, None if no call is recorded
+        self._stats: stats.RunStats | None = None
 
     def _initiate_repl(self) -> pexpect.spawn:
         env = os.environ.copy()
@@ -64,7 +194,9 @@ class SwiftREPL:
         return self._process
 
     def add_reload_file(self, path: str | Path) -> None:
-        """Path to file which will be added to the REPL input before running the code."""
+        """Path to file which will be added to the REPL input before running the code. With the
+        default `Options.reload_mode` the file is sent only when its content changed.
+        """
         if path not in self._reload_paths:
             if not Path(path).is_file():
                 raise FileNotFoundError(f"File '{path}' does not exist.")
@@ -74,74 +206,502 @@ class SwiftREPL:
         """Clear the list of files which are reloaded before running the code."""
         self._reload_paths.clear()
 
-    def run(
-        self,
-        prompt: str,
-        autoreload: bool = False,
-        verbose: bool = True,
-    ) -> None:
+    @property
+    def is_alive(self) -> bool:
+        """Check if the REPL process is initialized and still running."""
+        return self._initialized and self._process.isalive()
+
+    def reset(self, options: Options | None = None) -> None:
+        """Reset the Python side state of the REPL: reload files, variables register and
+        options. The code already executed in the REPL process is not affected.
+        """
+        self.options = options if options is not None else Options()
+        self.vars.clear()
+        self._reload_paths.clear()
+        self._reload_tracker.reset()
+        self._output = None
+
+    @contextmanager
+    def _record_stats(self, operation: str) -> Iterator[stats.RunStats]:
+        """Record the timings of the call as `last_run_stats`, the nested calls add their
+        timings to the call in progress.
+        """
+        if self._stats is not None:
+            yield self._stats
+            return
+        self._stats = current = stats.RunStats(operation)
+        start = time.perf_counter_ns()
+        try:
+            yield current
+        finally:
+            current.total_ns = time.perf_counter_ns() - start
+            self._stats = None
+            self.last_run_stats = current
+            if self.options.stats_hook is not None:
+                self.options.stats_hook(current)
+
+    def _phase(self, name: str) -> AbstractContextManager[None]:
+        """Add the time of the code executed in the context to the phase of the recorded call."""
+        if self._stats is None:
+            return nullcontext()
+        return self._stats.phase(name)
+
+    def _count_received(self, buffer: str) -> None:
+        if self._stats is not None:
+            self._stats.chars_received += len(buffer)
+
+    def _count_transferred(self, size: int) -> None:
+        if self._stats is not None:
+            self._stats.bytes_transferred += size
+
+    def _prepare_run(
+        self, prompt: str, autoreload: bool
+    ) -> tuple[list[str], list[reload.SourceFile]]:
+        """Add the reload files content to the prompt and split it into blocks which are sent
+        to the REPL. Returns the blocks and the reload files states to commit after the run.
+        """
+        include_text, reloaded_files = self._prepare_include(autoreload)
+        if self._should_import(include_text):
+            with self._phase("reload"):
+                include_text = self._import_include(include_text)
+        return self._prepare_blocks(prompt, include_text), reloaded_files
+
+    def _prepare_include(self, autoreload: bool) -> tuple[str, list[reload.SourceFile]]:
+        """Return the reload files content to send before the prompt and the reload files
+        states to commit after the run.
+        """
         if not self._initialized:
             raise SwiftREPLException("REPL is not initialized.")
 
-        include_paths: list[str] | None = None
+        include_text = ""
+        reloaded_files: list[reload.SourceFile] = []
         if self._reload_paths and autoreload:
-            include_paths = list(self._reload_paths)
-        if include_paths:
-            include_text = code.get_files_content(include_paths)
+            with self._phase("reload"):
+                include_paths = list(self._reload_paths)
+                if self.options.reload_mode == "all":
+                    include_text = code.get_files_content(include_paths)
+                else:
+                    include_text, reloaded_files = self._reload_tracker.prepare(
+                        include_paths,
+                        by_declaration=self.options.reload_mode in ("declarations", "compiled"),
+                    )
+        return include_text, reloaded_files
+
+    def _prepare_blocks(self, prompt: str, include_text: str) -> list[str]:
+        if include_text:
             prompt = include_text + "\n" + constants.END_OF_INCLUDE + "\n" + prompt
 
         if not prompt.startswith("\n"):
             prompt = "\n" + prompt
 
-        blocks = repl_output.batch_prompt(prompt, self.options.maxsend)
-        repl_raw_outputs = []
-        while blocks:
-            block = blocks.pop(0)
-            self._process.sendline(block)
-            while True:
-                try:
-                    buffer = self._process.read_nonblocking(
-                        size=self.options.maxread,
-                        timeout=self.options.timeout,
-                    )
-                    repl_raw_outputs.append(buffer)
-                except pexpect.exceptions.EOF as e:
-                    raise SwiftREPLException(
-                        f"REPL crashed with error: '{e}'. Did you try to run "
-                        f"async function ? If yes consider to use: 'try runSync "
-                        f"{{ try await yourAsyncFunction }}'"
-                    )
-                except pexpect.exceptions.TIMEOUT:
-                    if blocks:
-                        break
-                    # a regex which matches the waiting prompt e.g. "1>" or "102>" but
-                    # there must not be any text after the prompt
-                    prompt_pattern = re.compile(r"(\d+>$)")
-                    buffer_end = "".join(repl_raw_outputs[-10:])
-                    has_prompt = prompt_pattern.search(repl_output.clean(buffer_end))
-                    if has_prompt is None:
-                        continue
-                    break
-                except Exception as e:
-                    raise SwiftREPLException(f"REPL error: {e}")
-
-        output = repl_output.clean("".join(repl_raw_outputs))
-        self._output = output
-        if error_line := repl_output.search_for_error(output):
+        with self._phase("batch"):
+            return repl_output.batch_prompt(prompt, _INPUT_BLOCK_SIZE)
+
+    def _should_import(self, include_text: str) -> bool:
+        """Check if the reload files content is compiled with `_import_include`: always in the
+        "compiled" reload mode, otherwise when it is longer than `Options.import_threshold`.
+        """
+        if not include_text:
+            return False
+        threshold = self.options.import_threshold
+        return self.options.reload_mode == "compiled" or (
+            threshold is not None and len(include_text) >= threshold
+        )
+
+    def _import_include(self, include_text: str) -> str:
+        """Compile the reload files content into a module and return the REPL input which
+        imports it, so the code is not typed (and echoed) through the terminal. The code is
+        compiled with `Options.compiled_flags` in the "compiled" reload mode. The compiled
+        modules are cached by the content hash. The compilation blocks, `AsyncSwiftREPL` runs
+        it in an executor.
+
+        Only the first include is imported: the same declarations imported from two modules
+        are ambiguous, while the changed code typed later shadows the imported declarations.
+        The same module is imported again when the run which imported it failed, as the reload
+        files are committed only after a successful run.
+        """
+        compiled = self.options.reload_mode == "compiled"
+        if self._imported_module is None and not loader.is_declarations_only(include_text):
+            warnings.warn(
+                "Reload files with top-level statements cannot be compiled.", stacklevel=2
+            )
+            return include_text
+
+        directory = self.options.module_cache_dir or loader.default_cache_directory()
+        # modules of the package built by `swift run --repl`
+        search_paths = []
+        if self.cwd is not None:
+            build_path = os.path.join(self.cwd, ".build", "debug")
+            search_paths = [build_path, os.path.join(build_path, "Modules")]
+        flags = list(self.options.compiled_flags) if compiled else []
+        try:
+            if self._imported_module is None:
+                module_name = loader.build_cached_module(
+                    include_text, directory, search_paths, flags
+                )
+            else:
+                module_name = loader.cached_module_name(include_text, search_paths, flags)
+        except (OSError, subprocess.CalledProcessError) as e:
+            error = e.stderr if isinstance(e, subprocess.CalledProcessError) else e
+            warnings.warn(
+                f"Reload files cannot be compiled, they are typed into REPL: {error}",
+                stacklevel=2,
+            )
+            return include_text
+        if self._imported_module not in (None, module_name):
+            if compiled:
+                warnings.warn(
+                    "Reload files changed after they were imported, the changed declarations "
+                    "are typed into the REPL and are not optimized.",
+                    stacklevel=2,
+                )
+            return include_text
+        self._imported_module = module_name
+        return "\n".join(loader.load_commands(directory, module_name))
+
+    def _complete_run(
+        self,
+        output: str,
+        reloaded_files: list[reload.SourceFile],
+        verbose: bool,
+        sentinel: bool,
+    ) -> None:
+        """Check the REPL output for errors, print it and update the variables register."""
+        with self._phase("errors"):
+            if sentinel:
+                output = repl_output.remove_sentinel_lines(output)
+            self._output = output
+            error_line = repl_output.search_for_error(output)
+        if error_line:
             repl_output.print_output(output)
             raise SwiftREPLException(f"Error in Swift code: '{error_line}'")
 
         if verbose:
-            repl_output.print_output(
-                output,
-                stop_output_at_pattern=self.options.output_stop_pattern,
-                hide_inputs=self.options.output_hide_inputs,
-                hide_variables=self.options.output_hide_variables,
-            )
+            with self._phase("print"):
+                repl_output.print_output(
+                    output,
+                    stop_output_at_pattern=self.options.output_stop_pattern,
+                    hide_inputs=self.options.output_hide_inputs,
+                    hide_variables=self.options.output_hide_variables,
+                )
+
+        self._reload_tracker.commit(reloaded_files)
+        with self._phase("variables"):
+            self._register_variables(output)
+
+    def _complete_stream(
+        self, output: repl_output.OutputStream, reloaded_files: list[reload.SourceFile]
+    ) -> None:
+        """Check the streamed output for errors and update the variables register."""
+        self._output = output.text()
+        if output.error_line is not None:
+            raise SwiftREPLException(f"Error in Swift code: '{output.error_line}'")
+        self._reload_tracker.commit(reloaded_files)
+        with self._phase("variables"):
+            self._register_variables(self._output)
+
+    def _output_stream(self, blocks: list[str]) -> repl_output.OutputStream:
+        return repl_output.OutputStream(
+            has_include=any(constants.END_OF_INCLUDE in block for block in blocks),
+            stop_output_at_pattern=self.options.output_stop_pattern,
+            hide_inputs=self.options.output_hide_inputs,
+            hide_variables=self.options.output_hide_variables,
+            max_size=self.options.output_buffer_size,
+        )
+
+    def _register_variables(self, output: str) -> None:
+        self.vars._register_output(output)
+
+    @staticmethod
+    def _profile_prompt(
+        prompt: str, source_path: str, function_names: list[str] | None
+    ) -> tuple[str, list[profiler.InstrumentedFunction]]:
+        source_code = code.get_file_content(source_path)
+        if function_names is None:
+            function_names = profiler.find_profiled_functions(source_code)
+        functions = [
+            profiler.instrument_function(name, source_code, index)
+            for index, name in enumerate(function_names)
+        ]
+        return profiler.profile_prompt(functions, prompt), functions
+
+    @staticmethod
+    def _restore_prompt(functions: list[profiler.InstrumentedFunction]) -> str:
+        """Return the prompt which defines the original functions again after profiling."""
+        return "\n".join(function.original_code for function in functions)
+
+    @contextmanager
+    def _restoring_functions(
+        self, functions: list[profiler.InstrumentedFunction]
+    ) -> Iterator[None]:
+        """If the original functions cannot be defined again, they are resent with the next
+        autoreload instead.
+        """
+        try:
+            yield
+        except SwiftREPLException:
+            self._reload_tracker.invalidate({function.name for function in functions})
+            raise
+
+    @staticmethod
+    def _sample_prompt(prompt: str, interval_us: int, max_samples: int) -> str:
+        return "\n".join(
+            [
+                # the debugger must pass the timer signals to the REPL process without stopping
+                ":process handle SIGPROF --pass true --stop false --notify false",
+                f"_sampleProfileStart(intervalMicroseconds: {interval_us}, "
+                f"maxSamples: {max_samples})",
+                prompt,
+                "_sampleFrames = _sampleProfileStop()",
+            ]
+        )
+
+    @staticmethod
+    def _lookup_prompts(samples: list[list[int]]) -> Iterator[str]:
+        """Yield the prompts which symbolicate the samples addresses, in batches so the output
+        of a single run stays small.
+        """
+        addresses = sampler.lookup_addresses(samples)
+        for start in range(0, len(addresses), sampler.LOOKUP_BATCH_SIZE):
+            yield sampler.lookup_commands(addresses[start : start + sampler.LOOKUP_BATCH_SIZE])
+
+    @staticmethod
+    def _version_code(version: str | Path) -> str:
+        """Return the code of the benchmarked version, given as a path to a Swift file or as the
+        code itself.
+        """
+        if isinstance(version, Path) or os.path.isfile(version):
+            return code.get_file_content(str(version))
+        return version
+
+    @staticmethod
+    def _record_comparison(
+        comparison: Comparison,
+        name: str,
+        versions_code: list[str],
+        history_path: str | Path | None,
+    ) -> None:
+        """Store both results in the history and warn about the regressions since the last
+        recorded results.
+        """
+        if history_path is None:
+            return
+        store = history.BenchmarkHistory(str(history_path))
+        for label, result, version_code in [
+            (comparison.baseline_label, comparison.baseline, versions_code[0]),
+            (comparison.candidate_label, comparison.candidate, versions_code[1]),
+        ]:
+            if (regression := store.check_regression(name, label, result)) is not None:
+                print(
+                    f"WARNING! Benchmark '{name}' ({label}) is slower than the last recorded run: "
+                    f"{regression.speedup:.3f}x"
+                )
+            store.record(name, label, result, history.code_digest(version_code))
+
+
+class SwiftREPL(BaseSwiftREPL):
+    vars: "VariablesRegister"
+
+    def __init__(self, cwd: str | None = None, options: Options | None = None) -> None:
+        """Initialize the Swift REPL.
+
+        Args:
+            cwd: optional path to the working directory, a folder with Package.swift file. If
+                provided, the REPL will be started with `swift run --repl` command, otherwise
+                with `swift repl`.
+            options: an instance of REPLOptions class with optional parameters for REPL output.
+        """
+        super().__init__(cwd, options)
+        self.vars = VariablesRegister(self)
+
+        self._process = self._initiate_repl()
+        self._channel = channel.TransferChannel()
+        try:
+            self.run(constants.INIT_COMMANDS, verbose=False)
+            self.run("""print("REPL is running !")""")
+        except BaseException:
+            # do not leak the process and the channel file when the REPL fails to start
+            self._process.terminate(force=True)
+            self._process.close()
+            self._channel.close()
+            self._initialized = False
+            raise
+
+    def run(
+        self,
+        prompt: str,
+        autoreload: bool = False,
+        verbose: bool = True,
+        on_output: Callable[[str], None] | None = None,
+    ) -> None:
+        """Run the code in the REPL.
+
+        Args:
+            prompt: Swift code to run
+            autoreload: send the reload files before the prompt
+            verbose: print the REPL output
+            on_output: optional callback called with each displayed output line as soon as it
+                is printed by the REPL, see `stream`. With `Options.output_streaming` enabled
+                the lines are printed as they arrive.
+        """
+        if on_output is None and verbose and self.options.output_streaming:
+            on_output = print
+        with self._record_stats("run"):
+            if on_output is not None:
+                for line in self.stream(prompt, autoreload=autoreload):
+                    on_output(line)
+                return
+
+            blocks, reloaded_files = self._prepare_run(prompt, autoreload)
+            screen = repl_output.ScreenBuffer()
+            for _ in self._send_and_wait(blocks, screen):
+                pass
+            sentinel = self.options.completion_mode == "sentinel"
+            self._complete_run(screen.text(), reloaded_files, verbose, sentinel)
+
+    def stream(self, prompt: str, autoreload: bool = False) -> Iterator[str]:
+        """Run the code in the REPL and yield the output lines as soon as they are printed.
+
+        The output options (`output_hide_inputs`, `output_hide_variables` and
+        `output_stop_pattern`) are applied incrementally and only the last
+        `Options.output_buffer_size` characters of the output are kept in memory, so the
+        memory usage is bounded for long-running code with a lot of output. The generator must
+        be consumed until the end, `SwiftREPLException` is raised at the end if the output
+        contains an error.
+        """
+        with self._record_stats("stream"):
+            blocks, reloaded_files = self._prepare_run(prompt, autoreload)
+            screen = repl_output.ScreenBuffer()
+            output = self._output_stream(blocks)
+            for _ in self._send_and_wait(blocks, screen):
+                yield from output.feed(screen.pop_completed_lines())
+            yield from output.feed(screen.pop_lines())
+            self._complete_stream(output, reloaded_files)
+
+    def _send_and_wait(self, blocks: list[str], screen: repl_output.ScreenBuffer) -> Iterator[None]:
+        """Send the blocks and render the REPL output, yields after each received chunk."""
+        if self.options.completion_mode == "sentinel":
+            return self._send_and_wait_for_sentinel(blocks, screen)
+        return self._send_and_wait_for_prompt(blocks, screen)
+
+    def _send_and_wait_for_prompt(
+        self, blocks: list[str], screen: repl_output.ScreenBuffer
+    ) -> Iterator[None]:
+        """Send the blocks and poll the REPL output until the waiting prompt is displayed after
+        the whole input was echoed.
+        """
+        echo = _EchoTracker(blocks)
+
+        def feed(buffer: str) -> None:
+            echo.feed(buffer)
+            with self._phase("render"):
+                screen.feed(buffer)
+            self._count_received(buffer)
+
+        yield from self._write_input(echo, feed)
+        wait_start = time.perf_counter_ns()
+        silence = 0.0
+        while True:
+            try:
+                buffer = self._process.read_nonblocking(
+                    size=self.options.maxread,
+                    timeout=self.options.timeout,
+                )
+            except pexpect.exceptions.EOF as e:
+                raise _crash_exception(e)
+            except pexpect.exceptions.TIMEOUT:
+                silence += self.options.timeout
+                if not echo.done and silence < _ECHO_STALL_TIMEOUT:
+                    continue
+                has_prompt = PROMPT_PATTERN.search(screen.last_line.strip())
+                if has_prompt is None:
+                    continue
+                break
+            except Exception as e:
+                raise SwiftREPLException(f"REPL error: {e}")
+            silence = 0.0
+            feed(buffer)
+            yield
+        if self._stats is not None:
+            self._stats.add("wait", time.perf_counter_ns() - wait_start)
+
+    def _send_and_wait_for_sentinel(
+        self, blocks: list[str], screen: repl_output.ScreenBuffer
+    ) -> Iterator[None]:
+        """Send the blocks followed by a marker print and block until the marker is printed.
+
+        The empty line closes the (possibly multi-line) submission, so the marker is executed as
+        a separate REPL input and is printed even when the prompt fails to compile.
+        """
+        self._sentinel_id += 1
+        echo = _EchoTracker(blocks + ["", repl_output.sentinel_command(self._sentinel_id)])
+        done = False
+
+        def feed(buffer: str) -> None:
+            nonlocal done
+            echo.feed(buffer)
+            with self._phase("render"):
+                rendered, self._raw_output, found = repl_output.scan_for_sentinel(
+                    self._raw_output + buffer, self._sentinel_id
+                )
+                screen.feed(rendered)
+            self._count_received(buffer)
+            done = done or found
+
+        yield from self._write_input(echo, feed)
+        wait_start = time.perf_counter_ns()
+        while not done:
+            feed(self._read_output(timeout=None))
+            yield
+        if self._stats is not None:
+            self._stats.add("wait", time.perf_counter_ns() - wait_start)
+
+    def _write_input(self, echo: _EchoTracker, feed: Callable[[str], None]) -> Iterator[None]:
+        """Write the input to the pty as fast as it is accepted, without any pauses.
+
+        The REPL output is read and fed while writing, otherwise the REPL blocks on the full
+        output buffer and stops reading the input. The number of bytes sent but not echoed yet
+        is limited to `Options.input_window`, so the tty input buffer never overflows.
+        """
+        fd = self._process.child_fd
+        window = self.options.input_window or _tty_input_buffer_size(fd)
+        data = memoryview(echo.data)
+        sent = 0
+        write_start = time.perf_counter_ns()
+        os.set_blocking(fd, False)
+        try:
+            while sent < len(data):
+                in_flight = sent - min(echo.acked, sent)
+                can_write = in_flight < window
+                readable, writable, _ = select.select(
+                    [fd], [fd] if can_write else [], [], None if can_write else _ECHO_STALL_TIMEOUT
+                )
+                if not readable and not writable:
+                    # the echo is late or missing, do not wait for it anymore
+                    echo.acked = max(echo.acked, sent)
+                    continue
+                if readable:
+                    feed(self._read_output(timeout=0))
+                    yield
+                if writable:
+                    try:
+                        sent += os.write(fd, data[sent : sent + window - in_flight])
+                    except BlockingIOError:
+                        pass
+        finally:
+            os.set_blocking(fd, True)
+        if self._stats is not None:
+            self._stats.add("write", time.perf_counter_ns() - write_start)
+            self._stats.bytes_sent += sent
 
-        variable_updates = repl_output.find_variables(output)
-        for key, (dtype, value) in variable_updates.items():
-            self.vars[key] = Variable(self, key, dtype, value)
+    def _read_output(self, timeout: float | None) -> str:
+        try:
+            buffer: str = self._process.read_nonblocking(size=self.options.maxread, timeout=timeout)
+        except pexpect.exceptions.EOF as e:
+            raise _crash_exception(e)
+        except Exception as e:
+            raise SwiftREPLException(f"REPL error: {e}")
+        return buffer
 
     def line_profile(
         self,
@@ -149,86 +709,554 @@ class SwiftREPL:
         function_name: str,
         source_path: str,
         autoreload: bool = False,
-    ) -> None:
-        """Return the code with line profiling instrumentation."""
-        source_code = code.get_file_content(source_path)
-        profiled_function = profiler.get_function_for_line_profiler(function_name, source_code)
-        prompt = profiled_function + "\n" + prompt
-        self.run(prompt, autoreload=autoreload)
+        verbose: bool = True,
+    ) -> profiler.LineProfileResult:
+        """Run the prompt with the line profiling instrumentation of the function.
+
+        Args:
+            prompt: Swift code which calls the profiled function
+            function_name: name of the profiled function
+            source_path: path to the file with the function code
+            autoreload: send the reload files before the prompt
+            verbose: print the REPL output and the statistics table
+
+        Returns:
+            the statistics accumulated over all calls of the function
+        """
+        profile = self._profile(prompt, source_path, [function_name], autoreload, verbose)
+        result = profile.functions[function_name]
+        if verbose:
+            print(result.to_text())
+        return result
+
+    def profile_functions(
+        self,
+        prompt: str,
+        source_path: str,
+        function_names: list[str] | None = None,
+        autoreload: bool = False,
+        verbose: bool = True,
+    ) -> profiler.ProfileResult:
+        """Run the prompt with the line profiling instrumentation of many functions at once.
+
+        Args:
+            prompt: Swift code which calls the profiled functions
+            source_path: path to the file with the functions code
+            function_names: names of the profiled functions, by default all top-level
+                functions of the file
+            autoreload: send the reload files before the prompt
+            verbose: print the REPL output and the statistics
+
+        Returns:
+            the statistics of each function, with the inclusive and exclusive times and the
+            calls between the profiled functions
+        """
+        result = self._profile(prompt, source_path, function_names, autoreload, verbose)
+        if verbose:
+            print(result.to_text())
+        return result
+
+    def _profile(
+        self,
+        prompt: str,
+        source_path: str,
+        function_names: list[str] | None,
+        autoreload: bool,
+        verbose: bool,
+    ) -> profiler.ProfileResult:
+        prompt, functions = self._profile_prompt(prompt, source_path, function_names)
+        try:
+            self.run(prompt, autoreload=autoreload, verbose=verbose)
+            counters = self.vars.get_many([profiler.PROFILE_VARIABLE])[profiler.PROFILE_VARIABLE]
+        finally:
+            # the instrumented functions shadow the original ones
+            with self._restoring_functions(functions):
+                self.run(self._restore_prompt(functions), verbose=False)
+        return profiler.ProfileResult.from_counters(functions, counters)
+
+    def benchmark(
+        self,
+        setup: str,
+        stmt: str,
+        repeat: int = 5,
+        number: int | None = None,
+        warmup: int = 1,
+        autoreload: bool = False,
+        verbose: bool = True,
+    ) -> BenchmarkResult:
+        """Measure the execution time of the statement, similar to `timeit`. The timing loops
+        are executed in the REPL process, so the REPL communication is not measured. The value
+        of the last statement, if it is an expression, is passed to `_blackHole` so the compiler
+        cannot remove it, other values can be consumed explicitly with `_blackHole(value)`.
+
+        Args:
+            setup: code executed once before the timing loops, its declarations are visible in
+                stmt
+            stmt: benchmarked code
+            repeat: number of the timed repeats
+            number: number of iterations of each repeat, by default it is increased until a
+                repeat takes at least 0.2 seconds.
+            warmup: number of untimed repeats executed before the timed ones
+            autoreload: send the reload files before the benchmark
+            verbose: print the REPL output and the summary
+
+        Returns:
+            the time of a single iteration in each repeat and its statistics
+        """
+        prompt = benchmark.benchmark_code(setup, stmt, repeat, number, warmup)
+        self.run(prompt, autoreload=autoreload, verbose=verbose)
+        times = self.vars.get_many([benchmark.RESULT_VARIABLE])[benchmark.RESULT_VARIABLE]
+        result = BenchmarkResult.from_repeat_times(times["number"], times["times"])
+        if verbose:
+            print(result.to_text())
+        return result
+
+    def compare_benchmarks(
+        self,
+        stmt: str,
+        baseline: str | Path,
+        candidate: str | Path,
+        setup: str = "",
+        repeat: int = 5,
+        number: int | None = None,
+        warmup: int = 1,
+        rounds: int = 3,
+        labels: tuple[str, str] = ("baseline", "candidate"),
+        name: str | None = None,
+        history_path: str | Path | None = None,
+        verbose: bool = True,
+    ) -> Comparison:
+        """Benchmark the statement with two versions of the code in the same REPL session. The
+        versions are loaded alternately for each round, so slow drifts of the machine state
+        affect both of them. The number of iterations chosen for the first run is used for all
+        runs.
+
+        Args:
+            stmt: benchmarked code
+            baseline: path to the Swift file with the baseline version, or its code
+            candidate: path to the Swift file with the candidate version, or its code
+            setup: code executed once before the timing loops of each run, see `benchmark`
+            repeat: number of the timed repeats of each round
+            number: number of iterations of each repeat, chosen automatically by default
+            warmup: number of untimed repeats of each round
+            rounds: number of the alternating runs of each version
+            labels: names of the baseline and candidate versions
+            name: name of the benchmark in the history, by default the statement
+            history_path: path to the JSON lines history file, the results are not stored if
+                None
+            verbose: print the comparison
+
+        Returns:
+            the results of both versions and the speedup of the candidate
+        """
+        versions_code = [self._version_code(baseline), self._version_code(candidate)]
+        results: list[list[BenchmarkResult]] = [[], []]
+        try:
+            for _ in range(rounds):
+                for version, version_code in enumerate(versions_code):
+                    self.run(version_code, verbose=False)
+                    result = self.benchmark(setup, stmt, repeat, number, warmup, verbose=False)
+                    number = result.number
+                    results[version].append(result)
+        finally:
+            # the versions shadow the reload files declarations, the files must be resent
+            self._reload_tracker.reset()
+        comparison = Comparison(
+            BenchmarkResult.merge(results[0]),
+            BenchmarkResult.merge(results[1]),
+            *labels,
+        )
+        self._record_comparison(comparison, name or stmt, versions_code, history_path)
+        if verbose:
+            print(comparison.to_text())
+        return comparison
+
+    def sample_profile(
+        self,
+        prompt: str,
+        interval_us: int = 1000,
+        max_samples: int = 10_000,
+        autoreload: bool = False,
+        verbose: bool = True,
+    ) -> sampler.SampleProfileResult:
+        """Run the prompt with the sampling profiler. The code is not instrumented: the call
+        stack of the REPL process is recorded every `interval_us` microseconds of CPU time and
+        the samples are aggregated into the functions and lines hot spots, mapped back to the
+        reload files.
+
+        Args:
+            prompt: Swift code to profile
+            interval_us: sampling interval in microseconds
+            max_samples: maximum number of recorded samples, the later samples are dropped
+            autoreload: send the reload files before the prompt
+            verbose: print the REPL output and the hot spots
+
+        Returns:
+            the functions and lines sorted by the number of samples
+        """
+        prompt = self._sample_prompt(prompt, interval_us, max_samples)
+        self.run(prompt, autoreload=autoreload, verbose=verbose)
+        frames = self.vars[sampler.SAMPLES_VARIABLE].get_binary()
+        samples = sampler.split_samples([int(address) for address in frames])
+        symbols = {}
+        for lookup_prompt in self._lookup_prompts(samples):
+            self.run(lookup_prompt, verbose=False)
+            symbols.update(sampler.parse_lookup_output(self._output or ""))
+        locator = sampler.SourceLocator(sorted(self._reload_paths))
+        result = sampler.aggregate(samples, symbols, locator, interval_us)
+        if verbose:
+            print(result.to_text())
+        return result
 
     def close(self) -> None:
         self._process.sendline(":quit")
         self._process.terminate()
         self._process.close()
+        self._channel.close()
         self._initialized = False
 
 
-class Variable:
+class BaseVariable:
+    """Variable state shared by `Variable` and `async_repl.AsyncVariable`, the subclasses
+    transfer the value from the REPL.
+    """
+
     def __init__(
         self,
-        repl_ref: SwiftREPL,
+        repl_ref: BaseSwiftREPL,
         name: str,
         dtype: str | None = None,
         value: str | None = None,
+        echo: tuple[int, int] | None = None,
     ):
+        """Create the variable.
+
+        Args:
+            repl_ref: REPL instance
+            name: name of the variable
+            dtype: Swift type of the variable
+            value: value of the variable
+            echo: optional id of the run output and the offset of the variable declaration
+                printed by the REPL, the type and value are parsed from it when not provided.
+        """
         self.name = name
-        self.dtype = dtype
-        self.value = value
+        self._dtype = dtype
+        self._value = value
+        self._echo = echo
         self._repl = repl_ref
 
+    @property
+    def dtype(self) -> str | None:
+        """Swift type of the variable, parsed from the REPL output on the first access."""
+        if self._dtype is None and (declaration := self._parse_echo()) is not None:
+            self._dtype = declaration[0]
+        return self._dtype
+
+    @dtype.setter
+    def dtype(self, dtype: str | None) -> None:
+        self._dtype = dtype
+
+    @property
+    def value(self) -> Any:
+        """Value of the variable as printed by the REPL or set from Python. The printed value
+        is parsed on each access and is not stored in the variable, so it is available only as
+        long as the run output is kept (see `Options.variables_echo_size`).
+        """
+        if self._value is None and (declaration := self._parse_echo()) is not None:
+            return declaration[1]
+        return self._value
+
+    @value.setter
+    def value(self, value: Any) -> None:
+        self._value = value
+
+    def _parse_echo(self) -> tuple[str, str] | None:
+        if self._echo is None:
+            return None
+        return self._repl.vars._parse_echo(*self._echo)
+
+    def _get_binary_prompt(self) -> str:
+        path = self._repl._channel.path
+        return f'try _writeChannel(_encodeBinaryArray({self.name}), to: "{path}")'
+
+    def _read_binary(self, copy: bool) -> Any:
+        return self._repl.vars._read_binary(copy)
+
+    def __repr__(self) -> str:
+        return f"{self.name}[{self.dtype}] at {id(self)}"
+
+
+class Variable(BaseVariable):
+    _repl: "SwiftREPL"
+
     def get(self, verbose: bool = False) -> Any:
         """Return the JSON representation of the variable obtained through
         the JSON deserialization from REPL process.
         """
         if self._repl is None:
             raise SwiftREPLException("Variable is not associated with a REPL instance.")
+        return self._repl.vars.get_many([self.name], verbose=verbose)[self.name]
 
-        with tempfile.NamedTemporaryFile() as tmpfile:
-            path = f"{tmpfile.name}.json"
-            self._repl.run(
-                f'_serializeObject({self.name}, to: "{path}")',
-                verbose=verbose,
-                autoreload=False,
-            )
-            with open(path) as file:
-                data = json.load(file)
-            return data
+    def get_binary(self, verbose: bool = False, copy: bool = True) -> Any:
+        """Return the numeric array variable (e.g. [Float] or [[Double]]) transferred from the
+        REPL process as a raw binary buffer. The result is a NumPy array if NumPy is installed,
+        otherwise a flat array.array with the array elements.
 
-    def __repr__(self) -> str:
-        return f"{self.name}[{self.dtype}] at {id(self)}"
+        Args:
+            verbose: print the REPL output
+            copy: if False, a read-only NumPy array viewing the transfer channel memory is
+                returned without copying, it is valid only until the next variable transfer.
+        """
+        if self._repl is None:
+            raise SwiftREPLException("Variable is not associated with a REPL instance.")
+        with self._repl._record_stats("get"):
+            self._repl.run(self._get_binary_prompt(), verbose=verbose, autoreload=False)
+            return self._read_binary(copy)
 
 
-class VariablesRegister(dict[str, Variable]):
-    """A class which is responsible for managing variables in the REPL."""
+VariableT = TypeVar("VariableT", bound=BaseVariable)
+
 
-    def __init__(self, repl_ref: SwiftREPL) -> None:
+class BaseVariablesRegister(dict[str, VariableT]):
+    """Variables of the REPL, shared by `VariablesRegister` and
+    `async_repl.AsyncVariablesRegister`: the parsing of the output, the transfer prompts and
+    the decoding of the transferred values. The subclasses run the prompts.
+    """
+
+    def __init__(self, repl_ref: BaseSwiftREPL) -> None:
         super().__init__()
         self._repl_ref = repl_ref
+        # runs output (from the first variable declaration) by the output id, least recently
+        # used first
+        self._echoes: collections.OrderedDict[int, str] = collections.OrderedDict()
+        self._echoes_size = 0
+        self._echo_id = 0
 
-    def __setitem__(self, key: str, value: Any | Variable) -> None:
-        if not isinstance(value, Variable):
+    def __setitem__(self, key: str, value: VariableT) -> None:
+        if not isinstance(value, BaseVariable):
             raise SwiftREPLException(
                 "Only Variable instances can be added to the register, use set " "method instead."
             )
         super().__setitem__(key, value)
 
-    def __getitem__(self, key: str) -> Variable:
+    def __getitem__(self, key: str) -> VariableT:
         if key not in self:
-            return Variable(self._repl_ref, key)
+            return self._new_variable(key)
         return super().__getitem__(key)
 
+    def clear(self) -> None:
+        super().clear()
+        self._echoes.clear()
+        self._echoes_size = 0
+
+    def _new_variable(
+        self,
+        name: str,
+        dtype: str | None = None,
+        value: str | None = None,
+        echo: tuple[int, int] | None = None,
+    ) -> VariableT:
+        raise NotImplementedError
+
+    def _register_output(self, output: str) -> None:
+        """Register the variables printed in the run output. Only the names and offsets are
+        found, the types and values are parsed when they are accessed.
+        """
+        offsets = repl_output.find_variable_offsets(output)
+        if not offsets:
+            return
+        start = min(offsets.values())
+        self._echo_id += 1
+        self._echoes[self._echo_id] = output[start:]
+        self._echoes_size += len(output) - start
+        for name, offset in offsets.items():
+            self[name] = self._new_variable(name, echo=(self._echo_id, offset - start))
+
+        # the last output is always kept
+        while self._echoes_size > self._repl_ref.options.variables_echo_size and (
+            len(self._echoes) > 1
+        ):
+            _, echo = self._echoes.popitem(last=False)
+            self._echoes_size -= len(echo)
+
+    def _parse_echo(self, echo_id: int, offset: int) -> tuple[str, str] | None:
+        output = self._echoes.get(echo_id)
+        if output is None:
+            return None
+        self._echoes.move_to_end(echo_id)
+        declaration = repl_output.parse_variable(output, offset)
+        if declaration is None:
+            return None
+        return declaration[1], declaration[2]
+
+    def _get_many_prompt(self, names: list[str]) -> str:
+        items = ", ".join(f"_encodeObject({name})" for name in names)
+        return f'try _writeChannel(_packItems([{items}]), to: "{self._repl_ref._channel.path}")'
+
+    def _read_many(self, names: list[str]) -> dict[str, Any]:
+        with self._repl_ref._phase("decode"):
+            data = self._repl_ref._channel.read()
+            message = channel.unpack_items(data)
+            values = {name: json.loads(bytes(item)) for name, item in zip(names, message)}
+        self._repl_ref._count_transferred(len(data))
+        return values
+
+    def _read_binary(self, copy: bool) -> Any:
+        with self._repl_ref._phase("decode"):
+            data = self._repl_ref._channel.read()
+            values = buffers.decode_array(data)
+            if buffers.HAS_NUMPY:
+                if copy:
+                    values = values.copy()
+                else:
+                    # writing to the view would corrupt the channel
+                    values.flags.writeable = False
+        self._repl_ref._count_transferred(len(data))
+        return values
+
+    @staticmethod
+    def shape_name(name: str) -> str:
+        """Name of the Swift variable with the shape of the array set with `set_array`."""
+        return f"{name}Shape"
+
+    def _get_array_prompt(self, name: str) -> str:
+        path = self._repl_ref._channel.path
+        return (
+            f"try _writeChannel(_encodeBinaryArray({name}, shape: {self.shape_name(name)}), "
+            f'to: "{path}")'
+        )
+
+    def _array_variables(
+        self, name: str, value: Any, dtype: str | None
+    ) -> dict[str, tuple[str, Any]]:
+        """Return the flat array and shape variables of `set_array`."""
+        try:
+            scalar, flat, shape = buffers.flatten_array(value, dtype)
+        except ValueError as e:
+            raise SwiftREPLException(f"Cannot transfer '{name}' as an array: {e}")
+        return {name: (f"[{scalar}]", flat), self.shape_name(name): ("[Int]", list(shape))}
+
+    def _set_many_prompt(self, variables: dict[str, tuple[str, Any]]) -> str:
+        """Write the values to the transfer channel, returns the prompt which reads them."""
+        transfer = self._repl_ref._channel
+        items = []
+        commands = []
+        with self._repl_ref._phase("encode"):
+            for index, (name, (dtype, value)) in enumerate(variables.items()):
+                decoder, item = self._encode_value(name, dtype, value)
+                items.append(item)
+                commands.append(
+                    f"var {name}: {dtype} = "
+                    f'try {decoder}(_readChannelItem("{transfer.path}", {index}))'
+                )
+            message = channel.pack_items(items)
+            transfer.write(*message)
+        self._repl_ref._count_transferred(sum(memoryview(part).nbytes for part in message))
+        return "\n" + "\n".join(commands) + "\n"
+
+    def _register_many(self, variables: dict[str, tuple[str, Any]]) -> None:
+        for name, (dtype, value) in variables.items():
+            self[name] = self._new_variable(name, dtype, value)
+
+    @staticmethod
+    def _encode_value(name: str, dtype: str, value: Any) -> tuple[str, list[bytes | memoryview]]:
+        """Encode the value as JSON or as the binary array, returns the name of Swift decoding
+        function and the encoded data parts.
+        """
+        array_type = buffers.parse_array_type(dtype)
+        if array_type is not None:
+            try:
+                header, payload = buffers.encode_array(value, *array_type)
+                return "_decodeBinaryArray", [header, payload]
+            except ValueError as e:
+                if not isinstance(value, list):
+                    raise SwiftREPLException(f"Cannot transfer '{name}' as {dtype}: {e}")
+        return "_decodeObject", [json.dumps(value).encode()]
+
+
+class VariablesRegister(BaseVariablesRegister[Variable]):
+    """A class which is responsible for managing variables in the REPL."""
+
+    def _new_variable(
+        self,
+        name: str,
+        dtype: str | None = None,
+        value: str | None = None,
+        echo: tuple[int, int] | None = None,
+    ) -> Variable:
+        return Variable(self._repl_ref, name, dtype, value, echo)
+
+    def get_many(self, names: list[str], verbose: bool = False) -> dict[str, Any]:
+        """Return the JSON representation of many variables, obtained from the REPL process in a
+        single round trip.
+        """
+        if not names:
+            return {}
+        assert isinstance(self._repl_ref, SwiftREPL)
+        with self._repl_ref._record_stats("get"):
+            self._repl_ref.run(self._get_many_prompt(names), verbose=verbose, autoreload=False)
+            return self._read_many(names)
+
+    def get_array(self, name: str, copy: bool = True, verbose: bool = False) -> Any:
+        """Return the array set with `set_array` (or a flat Swift array with the shape variable
+        e.g. `values: [Float]` and `valuesShape: [Int]`) as a NumPy array of the same shape.
+
+        Args:
+            name: name of the array variable
+            copy: if False, a read-only NumPy array viewing the transfer channel memory is
+                returned without copying, its values are valid only until the next variable
+                transfer (any `get` or `set` call) of the REPL.
+            verbose: print the REPL output
+        """
+        assert isinstance(self._repl_ref, SwiftREPL)
+        if not buffers.HAS_NUMPY:
+            raise SwiftREPLException("NumPy is required to get the arrays with their shape.")
+        with self._repl_ref._record_stats("get"):
+            self._repl_ref.run(self._get_array_prompt(name), verbose=verbose, autoreload=False)
+            return self._read_binary(copy)
+
+    def set_array(
+        self, name: str, value: Any, dtype: str | None = None, verbose: bool = False
+    ) -> None:
+        """Set the NumPy array as a flat Swift array (e.g. `[Float]` for float32 arrays) and its
+        shape as the `[Int]` variable named by `shape_name` (e.g. `valuesShape`), in a single
+        round trip. The elements are written to the transfer channel without the conversion to
+        Python objects, the array is copied only if it is not contiguous, little-endian or of
+        the target type.
+
+        Args:
+            name: name of the array variable
+            value: NumPy array or a value accepted by `np.asarray`
+            dtype: Swift scalar type of the elements e.g. "Float" or "Double", by default the
+                type matching the array dtype. Arrays are converted only if the values do not
+                change, except for the rounding of floats (e.g. float64 to Float, but not
+                float to Int).
+            verbose: print the REPL output
+        """
+        self.set_many(self._array_variables(name, value, dtype), verbose=verbose)
+
     def set(self, name: str, dtype: str, value: Any, verbose: bool = False) -> None:
         """Set a variable in the REPL with the given name, type and value. This function will
         create or update existing variable.
+
+        Numeric arrays with a fixed shape (e.g. Array<Float> or [[Int]]) are transferred as raw
+        binary buffers, the value can be a (nested) list, array.array, memoryview or NumPy array.
+        Other values are transferred as JSON.
         """
-        with tempfile.NamedTemporaryFile() as tmpfile:
-            path = f"{tmpfile.name}.json"
-            with open(path, "w") as fp:
-                json.dump(value, fp)
+        self.set_many({name: (dtype, value)}, verbose=verbose)
 
-            self._repl_ref.run(
-                f'\nvar {name}: {dtype} = try _deserializeObject("{path}")\n',
-                verbose=verbose,
-                autoreload=False,
-            )
-            self[name] = Variable(self._repl_ref, name, dtype, value)
+    def set_many(self, variables: dict[str, tuple[str, Any]], verbose: bool = False) -> None:
+        """Set many variables in the REPL in a single round trip.
+
+        Args:
+            variables: a mapping from the variable name to the (type, value) tuple, values are
+                transferred in the same way as in the `set` method.
+            verbose: print the REPL output
+        """
+        if not variables:
+            return
+        assert isinstance(self._repl_ref, SwiftREPL)
+        with self._repl_ref._record_stats("set"):
+            prompt = self._set_many_prompt(variables)
+            self._repl_ref.run(prompt, verbose=verbose, autoreload=False)
+        self._register_many(variables)
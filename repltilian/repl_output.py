@@ -1,116 +1,168 @@
 """Functions related to parsing Swift REPL output."""
+import collections
 import re
+from collections.abc import Iterable, Iterator
 
 from repltilian import constants
 
 # var_name: var_type = var_value or $R\d: var_type = var_value
 VARIABLE_LINE_PATTERN = r"^(\w+|\$R+\d):\s*(.*?)\s*=\s*(.*)$"
+# beginning of the variable declaration line, used to find the variables without parsing them
+_VARIABLE_START_PATTERN = re.compile(r"^[ \t]*(\w+|\$R+\d):[^\n=]*=", re.MULTILINE)
+# a marker printed by the REPL after the prompt execution e.g. "__REPLTILIAN_DONE_12__"
+SENTINEL_PATTERN = re.compile(re.escape(constants.SENTINEL_PREFIX) + r"(\d+)__")
+# number of characters kept unprocessed at the end of the raw output, so the completion marker
+# split between two reads is not rendered
+_SENTINEL_TAIL = len(constants.SENTINEL_PREFIX) + 24
+# REPL input line e.g. "12> let x = 1" or "13. }"
+_PROMPT_INPUT_PATTERN = re.compile(r"^\d+[>.]")
+# REPL waiting prompt without any input e.g. "12>"
+_EMPTY_PROMPT_PATTERN = re.compile(r"\d+>")
+_ERROR_PATTERN = re.compile(r"(\$E\d+):|^error:")
+
+
+# tokens of the raw terminal output: a run of printable characters followed by one control token,
+# CRLF, carriage return, line feed, escape sequence (parameters and command) or stray escape
+_TERMINAL_TOKEN_PATTERN = re.compile(
+    r"([^\x1b\r\n]*)(?:(\r\n)|(\r)|(\n)|\x1b\[([^A-Za-z]*)([A-Za-z])|\x1b|\Z)"
+)
+# escape sequence which is not terminated yet, its end may arrive with the next chunk
+_INCOMPLETE_ESCAPE_PATTERN = re.compile(r"\x1b(?:\[[^A-Za-z]*)?\Z")
+_ESCAPE_PARAMS_PATTERN = re.compile(r"[0-9;]*")
+
+
+class ScreenBuffer:
+    """Incremental emulator of the terminal screen rendered by the Swift REPL.
+
+    Raw output chunks are fed as they arrive from the REPL process, each chunk is tokenized once
+    and rendered into mutable per-line buffers, so the cost is linear in the output size.
+    Supported control sequences are: cursor horizontal absolute (ESC[nG), erase display (ESC[J),
+    carriage return and line feed, other escape sequences are ignored.
+    """
+
+    def __init__(self) -> None:
+        self._lines: list[list[str]] = [[]]
+        self._line = 0  # Current line index
+        self._col = 0  # Current column index
+        self._pending = ""  # Unterminated escape sequence from the previous chunk
+
+    def feed(self, chunk: str) -> None:
+        """Render the next chunk of the raw REPL output."""
+        text = self._pending + chunk
+        self._pending = ""
+        if match := _INCOMPLETE_ESCAPE_PATTERN.search(text):
+            self._pending = text[match.start() :]
+            text = text[: match.start()]
+
+        lines = self._lines
+        line = self._line
+        col = self._col
+        for chars, crlf, cr, lf, params, cmd in _TERMINAL_TOKEN_PATTERN.findall(text):
+            if chars:
+                # Printable characters, replace the content at the cursor position
+                current_line = lines[line]
+                if col > len(current_line):
+                    current_line.extend(" " * (col - len(current_line)))
+                current_line[col : col + len(chars)] = chars
+                col += len(chars)
+            if crlf or lf:
+                # Line feed, the carriage return moves the cursor to the first column
+                if crlf:
+                    col = 0
+                line += 1
+                if line >= len(lines):
+                    lines.append([])
+            elif cr:
+                col = 0
+            elif cmd and _ESCAPE_PARAMS_PATTERN.fullmatch(params):
+                if cmd == "G":
+                    # Cursor horizontal absolute, move cursor to column N (default 1)
+                    column = params.split(";")[0]
+                    col = max(int(column) - 1, 0) if column else 0
+                elif cmd == "J":
+                    # Erase display from cursor to end of screen
+                    del lines[line + 1 :]
+                    del lines[line][col:]
+
+        self._line = line
+        self._col = col
+
+    def pop_completed_lines(self) -> list[str]:
+        """Remove and return the lines above the cursor. The cursor never moves up, so these
+        lines will not change anymore.
+        """
+        if self._line == 0:
+            return []
+        lines = ["".join(line) for line in self._lines[: self._line]]
+        del self._lines[: self._line]
+        self._line = 0
+        return lines
+
+    def pop_lines(self) -> list[str]:
+        """Remove and return all lines of the screen."""
+        lines = ["".join(line) for line in self._lines]
+        self._lines = [[]]
+        self._line = 0
+        self._col = 0
+        return lines
+
+    @property
+    def last_line(self) -> str:
+        """Content of the last line of the screen."""
+        return "".join(self._lines[-1])
+
+    def text(self) -> str:
+        """Return the rendered screen content."""
+        return "\n".join("".join(line) for line in self._lines).strip()
 
 
 def clean(text: str) -> str:
     """Cleans the raw output from a Swift REPL prompt output."""
-    # Initialize the screen buffer as a list of lines
-    screen_lines = [""]
-    line = 0  # Current line index
-    col = 0  # Current column index
-    i = 0  # Current index in the input text
-    n = len(text)
-
-    def read_escape_sequence(s: str, i_: int) -> tuple[str | None, int]:
-        """Reads an ANSI escape sequence starting from index i in string s.
-
-        Returns the escape sequence and the index after the sequence.
-        """
-        if s[i_ : i_ + 2] != "\x1b[":
-            return None, i_ + 1  # Not an escape sequence we recognize
-        j = i_ + 2
-        while j < len(s):
-            if "A" <= s[j] <= "Z" or "a" <= s[j] <= "z":
-                # End of the escape sequence
-                j += 1  # Include the command character
-                return s[i_:j], j
-            else:
-                j += 1
-        # If we reach here, didn't find the end of escape sequence
-        return s[i_:j], j
-
-    while i < n:
-        c = text[i]
-        if c == "\x1b":
-            # Process escape sequence
-            esc_seq, next_i = read_escape_sequence(text, i)
-            if esc_seq:
-                # Process the escape sequence
-                i = next_i
-                # Extract the command and parameters
-                cmd_match = re.match(r"\x1b\[([0-9;]*)([A-Za-z])", esc_seq)
-                if cmd_match:
-                    params = cmd_match.group(1)
-                    cmd = cmd_match.group(2)
-                    # Process the command
-                    if cmd == "G":
-                        # Cursor horizontal absolute
-                        # Move cursor to column N (default 1)
-                        N = int(params) if params else 1
-                        col = max(N - 1, 0)  # Adjust for zero-based index
-                    elif cmd == "J":
-                        # Erase display from cursor to end of screen
-                        # Clear from current line and position to end
-                        screen_lines = screen_lines[: line + 1]
-                        # Truncate the current line from cursor position
-                        screen_lines[line] = screen_lines[line][:col]
-                    else:
-                        # Other commands can be implemented as needed
-                        pass
-                continue
-            else:
-                # Not a recognized escape sequence
-                i += 1
-                continue
-        elif c == "\r":
-            # Carriage return
-            col = 0
-            i += 1
-        elif c == "\n":
-            # Line feed
-            line += 1
-            if line >= len(screen_lines):
-                screen_lines.append("")
-            i += 1
-        else:
-            # Printable character
-            # Ensure the current line exists
-            while len(screen_lines) <= line:
-                screen_lines.append("")
-            current_line = screen_lines[line]
-            # Extend the line with spaces if necessary
-            if col > len(current_line):
-                current_line += " " * (col - len(current_line))
-            # Insert or replace the character at the current position
-            if col < len(current_line):
-                current_line = current_line[:col] + c + current_line[col + 1 :]
-            else:
-                current_line += c
-            # Update the screen buffer
-            screen_lines[line] = current_line
-            # Move cursor forward
-            col += 1
-            i += 1
-
-    # After processing, join the lines
-    result = "\n".join(screen_lines)
-    return result.strip()
+    screen = ScreenBuffer()
+    screen.feed(text)
+    return screen.text()
 
 
 def search_for_error(cleaned_output: str) -> str | None:
     """Check if the text contains an error message: "error:" or "$E{number}:"."""
-    error_pattern = re.compile(r"(\$E\d+):|^error:")
     for line in cleaned_output.split("\n"):
-        if error_pattern.search(line):
+        if _ERROR_PATTERN.search(line):
             return line
     return None
 
 
+def sentinel_command(sentinel_id: int) -> str:
+    """Swift statement which prints the completion marker with the given id."""
+    return f'print("{constants.SENTINEL_PREFIX}\\({sentinel_id})__")'
+
+
+def scan_for_sentinel(raw_output: str, sentinel_id: int) -> tuple[str, str, bool]:
+    """Split the raw REPL output at the completion marker with the given id. Markers of the
+    previously interrupted runs are removed.
+
+    Returns:
+        - output which can be rendered
+        - remaining output which must be kept until more output is received, it can contain
+          the beginning of the marker or the output printed after the marker
+        - True if the marker was found
+    """
+    rendered = []
+    while match := SENTINEL_PATTERN.search(raw_output):
+        rendered.append(raw_output[: match.start()])
+        raw_output = raw_output[match.end() :]
+        if int(match.group(1)) == sentinel_id:
+            return "".join(rendered), raw_output, True
+    keep = max(len(raw_output) - _SENTINEL_TAIL, 0)
+    rendered.append(raw_output[:keep])
+    return "".join(rendered), raw_output[keep:], False
+
+
+def remove_sentinel_lines(cleaned_output: str) -> str:
+    """Remove the echoed sentinel command and the printed marker from the cleaned output."""
+    lines = cleaned_output.split("\n")
+    return "\n".join(line for line in lines if constants.SENTINEL_PREFIX not in line)
+
+
 def _find_end_of_include_line(cleaned_output_lines: list[str]) -> int:
     for i, line in enumerate(cleaned_output_lines):
         if constants.END_OF_INCLUDE in line:
@@ -191,6 +243,84 @@ def print_output(
         print(output)
 
 
+class OutputStream:
+    """Incremental version of the `print_output` filtering used by the streaming mode. Cleaned
+    lines are fed as they are completed and the lines which should be displayed are returned.
+
+    The include part, input lines (`hide_inputs`), variables (`hide_variables`, the variables
+    section and everything after it) and the output after `stop_output_at_pattern` are hidden,
+    error lines are always displayed. Only the last `max_size` characters of the output are kept
+    for the variables parsing and `text`.
+    """
+
+    def __init__(
+        self,
+        has_include: bool = False,
+        stop_output_at_pattern: str | None = None,
+        hide_inputs: bool = False,
+        hide_variables: bool = False,
+        max_size: int = 1 << 20,
+    ) -> None:
+        self.error_line: str | None = None
+        self._in_include = has_include
+        # None: no input lines seen yet, True: in the input lines, False: after the input lines
+        self._in_inputs: bool | None = None if hide_inputs else False
+        self._hide_variables = hide_variables
+        self._stop_pattern = (
+            re.compile(stop_output_at_pattern) if stop_output_at_pattern is not None else None
+        )
+        self._stopped = False
+        self._max_size = max_size
+        self._tail: collections.deque[str] = collections.deque()
+        self._tail_size = 0
+
+    def feed(self, lines: list[str]) -> list[str]:
+        """Process the next completed lines, returns the lines to display."""
+        visible = []
+        for line in lines:
+            stripped = line.strip()
+            if not stripped or constants.SENTINEL_PREFIX in line:
+                continue
+            self._keep(line)
+            if _ERROR_PATTERN.search(line):
+                if self.error_line is None:
+                    self.error_line = line
+                visible.append(line)
+            elif self._is_visible(line, stripped):
+                visible.append(line)
+        return visible
+
+    def text(self) -> str:
+        """Return the kept part of the output."""
+        return "\n".join(self._tail)
+
+    def _is_visible(self, line: str, stripped: str) -> bool:
+        if self._in_include:
+            self._in_include = constants.END_OF_INCLUDE not in line
+            return False
+        if self._stopped:
+            return False
+        if self._in_inputs is not False:
+            if _PROMPT_INPUT_PATTERN.match(stripped):
+                self._in_inputs = True
+                return False
+            if self._in_inputs is None:
+                return False
+            self._in_inputs = False
+        if (self._hide_variables and re.match(VARIABLE_LINE_PATTERN, stripped)) or (
+            self._stop_pattern is not None and self._stop_pattern.search(line)
+        ):
+            self._stopped = True
+            return False
+        return _EMPTY_PROMPT_PATTERN.fullmatch(stripped) is None
+
+    def _keep(self, line: str) -> None:
+        self._tail.append(line)
+        self._tail_size += len(line) + 1
+        while self._tail_size > self._max_size and len(self._tail) > 1:
+            self._tail_size -= len(self._tail.popleft()) + 1
+
+
 def find_variables(cleaned_output: str) -> dict[str, tuple[str, str]]:
     """Extract variable declarations from the cleaned REPL output. This function searches for
     lines with the following pattern: "var_name: var_type = var_value" and returns a dictionary
@@ -203,7 +333,63 @@ def find_variables(cleaned_output: str) -> dict[str, tuple[str, str]]:
         cleaned_output: cleaned output from the REPL
     """
     register = {}
-    lines = cleaned_output.splitlines()
+    for var_name, var_type, var_value in _iter_variables(cleaned_output.splitlines()):
+        register[var_name] = (var_type, var_value)
+    return register
+
+
+def find_variable_offsets(cleaned_output: str) -> dict[str, int]:
+    """Find the names of the variables declared in the cleaned REPL output and the offsets of
+    their declaration lines, the types and values are not parsed (see `parse_variable`).
+    """
+    offsets = {}
+    value_end = 0
+    for match in _VARIABLE_START_PATTERN.finditer(cleaned_output):
+        if match.start() < value_end:
+            # a member inside the multi-line value of the previous variable e.g. "  x: Float = 1"
+            continue
+        name = match.group(1)
+        if name not in ("warning", "error"):
+            offsets[name] = match.start()
+            value_end = _find_value_end(cleaned_output, match.end())
+    return offsets
+
+
+def _find_value_end(cleaned_output: str, start: int) -> int:
+    """Return the offset of the end of the variable value beginning at the start offset, the value
+    continues on the next lines while its braces are open (as in `_iter_variables`).
+    """
+    brace_counter = 0
+    while True:
+        end = cleaned_output.find("\n", start)
+        if end == -1:
+            return len(cleaned_output)
+        line = cleaned_output[start:end].strip()
+        if not (line.startswith("warning:") or line.startswith("error:")):
+            brace_counter += line.count("{") - line.count("}")
+        if brace_counter <= 0:
+            return end
+        start = end + 1
+
+
+def parse_variable(cleaned_output: str, offset: int) -> tuple[str, str, str] | None:
+    """Parse the variable declared at the given offset of the cleaned REPL output (see
+    `find_variable_offsets`), returns the variable name, type and value content.
+    """
+    return next(_iter_variables(_iter_lines(cleaned_output, offset)), None)
+
+
+def _iter_lines(text: str, start: int) -> Iterator[str]:
+    while True:
+        end = text.find("\n", start)
+        if end == -1:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
+
+
+def _iter_variables(lines: Iterable[str]) -> Iterator[tuple[str, str, str]]:
     variable_pattern = re.compile(VARIABLE_LINE_PATTERN)
 
     in_value = False
@@ -234,7 +420,7 @@ def find_variables(cleaned_output: str) -> dict[str, tuple[str, str]]:
                     current_var_type = var_type
                 else:
                     # Value is on a single line
-                    register[var_name] = (var_type, var_value)
+                    yield var_name, var_type, var_value
             else:
                 # Not a variable declaration line
                 continue
@@ -244,7 +430,7 @@ def find_variables(cleaned_output: str) -> dict[str, tuple[str, str]]:
             brace_counter += line.count("{") - line.count("}")
             if brace_counter <= 0:
                 # Finished collecting the variable value
-                register[current_var_name] = (current_var_type, current_var_value)
+                yield current_var_name, current_var_type, current_var_value
                 # Reset for the next variable
                 in_value = False
                 current_var_name = ""
@@ -252,8 +438,6 @@ def find_variables(cleaned_output: str) -> dict[str, tuple[str, str]]:
                 current_var_value = ""
                 brace_counter = 0
 
-    return register
-
 
 def batch_prompt(prompt: str, maxsize: int = 50) -> list[str]:
     blocks: list[str] = []
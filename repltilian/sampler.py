@@ -0,0 +1,260 @@
+"""Functions related to the sampling profiler.
+
+The samples are recorded in the REPL process: a SIGPROF timer interrupts the running code and
+the signal handler stores the return addresses of the interrupted thread (see
+`_sampleProfileStart` in the init commands). The addresses are symbolicated with the LLDB
+`image lookup` command of the REPL and mapped back to the reload files.
+"""
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+
+from repltilian import code
+
+# Swift variable with the recorded frames, see _sampleProfileStop in the init commands
+SAMPLES_VARIABLE = "_sampleFrames"
+# maximum number of frames recorded for each sample, must match _sampleDepth in the init commands
+SAMPLE_DEPTH = 32
+# number of addresses symbolicated in a single run
+LOOKUP_BATCH_SIZE = 100
+# frames of the signal handler and of the signal trampoline preceding the interrupted frame
+_HANDLER_FRAMES = 2
+_TRAMPOLINE_SYMBOLS = ("__restore_rt", "_sigtramp")
+
+_LOOKUP_COMMAND_PATTERN = re.compile(r"image lookup -v -a (0x[0-9a-fA-F]+)")
+_SUMMARY_PATTERN = re.compile(r"^\s*Summary: (?:\S+?`)?(?P<symbol>.*?)(?: \+ \d+)?(?: at .*)?$")
+_LINE_ENTRY_PATTERN = re.compile(
+    r"^\s*LineEntry: \[[^)]*\): (?P<file>.+?):(?P<line>\d+)(?::\d+)?$"
+)
+_DECL_PATTERN = re.compile(r"^\s*FuncType: .*\bdecl = (?P<file>[^,]+?):(?P<line>\d+)")
+
+
+@dataclass
+class Frame:
+    symbol: str
+    file: str | None = None
+    line: int | None = None
+    # line of the function declaration in the same file
+    decl_line: int | None = None
+
+    @property
+    def function(self) -> str:
+        return function_name(self.symbol)
+
+
+@dataclass
+class SampledFunction:
+    name: str
+    # samples in which the function was executed, not its callees
+    self_samples: int
+    # samples in which the function was on the stack
+    total_samples: int
+    # location of the function in the reload files, 1-based line
+    path: str | None = None
+    line: int | None = None
+
+
+@dataclass
+class SampledLine:
+    path: str
+    # 1-based line number
+    line: int
+    function: str
+    samples: int
+    source: str
+
+
+@dataclass
+class SampleProfileResult:
+    """Hot spots of the sampled run, sorted by the number of samples. `lines` are the innermost
+    reload files lines of each sample, e.g. the line which called a standard library function
+    in which the sample was taken.
+    """
+
+    samples: int
+    interval_us: int
+    functions: list[SampledFunction] = field(default_factory=list)
+    lines: list[SampledLine] = field(default_factory=list)
+
+    def to_text(self, limit: int = 20) -> str:
+        """Format the top functions and lines as tables."""
+        rows = [
+            f"Samples: {self.samples}, interval: {self.interval_us} us",
+            "",
+            "   Self %  Total %  Function",
+            "===============================================================",
+        ]
+        for function in self.functions[:limit]:
+            location = f" ({function.path}:{function.line})" if function.path else ""
+            self_percent = self._percent(function.self_samples)
+            total_percent = self._percent(function.total_samples)
+            rows.append(f"{self_percent:8.1f}% {total_percent:7.1f}%  {function.name}{location}")
+        rows += [
+            "",
+            "  Samples        %  Line",
+            "===============================================================",
+        ]
+        for line in self.lines[:limit]:
+            rows.append(
+                f"{line.samples:9d} {self._percent(line.samples):7.1f}%  "
+                f"{line.path}:{line.line}  {line.source.strip()}"
+            )
+        return "\n".join(rows)
+
+    def _percent(self, samples: int) -> float:
+        return samples / self.samples * 100 if self.samples > 0 else 0.0
+
+    def __str__(self) -> str:
+        return self.to_text()
+
+
+def split_samples(frames: list[int], depth: int = SAMPLE_DEPTH) -> list[list[int]]:
+    """Split the flat frames buffer into samples, zero padding is removed."""
+    samples = []
+    for start in range(0, len(frames), depth):
+        samples.append([address for address in frames[start : start + depth] if address])
+    return samples
+
+
+def lookup_addresses(samples: list[list[int]]) -> list[int]:
+    """Return the unique addresses to symbolicate. The return addresses point after the call
+    instruction, so the address before is looked up to get the line of the call.
+    """
+    addresses = set()
+    for sample in samples:
+        for index, address in enumerate(sample):
+            addresses.add(address if index == _HANDLER_FRAMES else address - 1)
+    return sorted(addresses)
+
+
+def lookup_commands(addresses: list[int]) -> str:
+    """LLDB commands which symbolicate the addresses, one command per line."""
+    return "\n".join(f":image lookup -v -a {address:#x}" for address in addresses)
+
+
+def parse_lookup_output(output: str) -> dict[int, Frame]:
+    """Parse the output of the `lookup_commands`, returns the frames by the looked up address.
+    Addresses which were not found are skipped.
+    """
+    frames: dict[int, Frame] = {}
+    frame: Frame | None = None
+    address = None
+    for line in output.split("\n"):
+        if match := _LOOKUP_COMMAND_PATTERN.search(line):
+            address = int(match.group(1), 16)
+            frame = None
+        elif address is None:
+            continue
+        elif match := _SUMMARY_PATTERN.match(line):
+            frame = frames[address] = Frame(symbol=match.group("symbol"))
+        elif frame is None:
+            continue
+        elif match := _LINE_ENTRY_PATTERN.match(line):
+            frame.file, frame.line = match.group("file"), int(match.group("line"))
+        elif match := _DECL_PATTERN.match(line):
+            frame.decl_line = int(match.group("line"))
+    return frames
+
+
+def function_name(symbol: str) -> str:
+    """Return the short function name of the demangled symbol, e.g. "findKNearestNeighbors" for
+    "__lldb_expr_12.findKNearestNeighbors<A>(query: [Point<A>]) -> [A]". Closures keep their
+    prefix e.g. "closure #1 in main".
+    """
+    prefix_match = re.match(r"((?:(?:implicit )?closure #\d+ .*? in )*)", symbol)
+    prefix = prefix_match.group(1) if prefix_match else ""
+    name = symbol[len(prefix) :]
+    # remove the generic parameters, which may contain dots and parentheses
+    while (stripped := re.sub(r"<[^<>]*>", "", name)) != name:
+        name = stripped
+    name = name.split("(")[0].split(" ")[0]
+    return prefix + name.rsplit(".", 1)[-1]
+
+
+class SourceLocator:
+    """Maps the frames of the functions defined in the reload files to the files lines."""
+
+    def __init__(self, paths: list[str]) -> None:
+        self._sources = {path: code.get_file_content(path) for path in paths}
+        self._functions: dict[str, tuple[str, int] | None] = {}
+
+    def function_location(self, name: str) -> tuple[str, int] | None:
+        """Return the path and the 0-based header line of the function with the given name."""
+        if name not in self._functions:
+            self._functions[name] = None
+            for path, source_code in self._sources.items():
+                try:
+                    function = code.find_function(name, source_code)
+                except ValueError:
+                    continue
+                self._functions[name] = (path, function.header_start_line)
+                break
+        return self._functions[name]
+
+    def line_location(self, frame: Frame) -> tuple[str, int] | None:
+        """Return the path and the 0-based line of the frame in the reload files. The code typed
+        into the REPL has no file, its line is mapped with the offset from the function
+        declaration line.
+        """
+        if frame.line is None:
+            return None
+        if frame.file in self._sources:
+            return frame.file, frame.line - 1
+        if frame.decl_line is None:
+            return None
+        location = self.function_location(frame.function.rsplit(" ", 1)[-1])
+        if location is None:
+            return None
+        path, header_line = location
+        return path, header_line + frame.line - frame.decl_line
+
+    def source_line(self, path: str, line: int) -> str:
+        lines = self._sources[path].split("\n")
+        return lines[line] if 0 <= line < len(lines) else ""
+
+
+def aggregate(
+    samples: list[list[int]],
+    frames: dict[int, Frame],
+    locator: SourceLocator,
+    interval_us: int,
+) -> SampleProfileResult:
+    """Aggregate the symbolicated samples into the functions and lines hot spots."""
+    self_samples: Counter[str] = Counter()
+    total_samples: Counter[str] = Counter()
+    line_samples: Counter[tuple[str, int, str]] = Counter()
+    for sample in samples:
+        stack = _sample_frames(sample, frames)
+        if not stack:
+            continue
+        self_samples[stack[0].function] += 1
+        total_samples.update({frame.function for frame in stack})
+        for frame in stack:
+            if (location := locator.line_location(frame)) is not None:
+                line_samples[(*location, frame.function)] += 1
+                break
+
+    functions = []
+    for name, count in sorted(
+        total_samples.items(), key=lambda item: (-self_samples[item[0]], -item[1])
+    ):
+        location = locator.function_location(name.rsplit(" ", 1)[-1])
+        path, line = (location[0], location[1] + 1) if location else (None, None)
+        functions.append(SampledFunction(name, self_samples[name], count, path, line))
+    lines = [
+        SampledLine(path, line + 1, function, count, locator.source_line(path, line))
+        for (path, line, function), count in line_samples.most_common()
+    ]
+    return SampleProfileResult(len(samples), interval_us, functions, lines)
+
+
+def _sample_frames(sample: list[int], frames: dict[int, Frame]) -> list[Frame]:
+    """Return the symbolicated frames of the sample, starting from the interrupted frame."""
+    stack = []
+    start = _HANDLER_FRAMES
+    for index, address in enumerate(sample):
+        frame = frames.get(address if index == _HANDLER_FRAMES else address - 1)
+        if frame is not None and frame.symbol.startswith(_TRAMPOLINE_SYMBOLS):
+            start = index + 1
+        stack.append(frame)
+    return [frame for frame in stack[start:] if frame is not None]
@@ -0,0 +1,75 @@
+"""Per-phase timings of the REPL calls."""
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+# phases in the order of their execution, used to format the stats
+PHASES = (
+    "reload",
+    "batch",
+    "encode",
+    "write",
+    "wait",
+    "render",
+    "errors",
+    "print",
+    "variables",
+    "decode",
+)
+
+
+@dataclass
+class RunStats:
+    """Timings of a single `run`, `stream`, variables `get` or `set` call, in nanoseconds. The
+    phases of the nested runs (e.g. the run which encodes the variable in `get`) are added to
+    the call which started them.
+
+    Phases:
+        reload: reading the reload files and preparing the changed code
+        batch: splitting the prompt into the input blocks
+        encode: encoding the values and writing them to the transfer channel
+        write: writing the input to the pty, the output is read at the same time
+        wait: waiting for the REPL to compile and execute the code after the input was written
+        render: rendering the output chunks, included in the write and wait times
+        errors: searching the output for the errors
+        print: printing the output
+        variables: finding the variables printed in the output
+        decode: reading and decoding the values from the transfer channel
+    """
+
+    operation: str
+    phases_ns: dict[str, int] = field(default_factory=dict)
+    total_ns: int = 0
+    # input bytes written to the pty and output characters read from it
+    bytes_sent: int = 0
+    chars_received: int = 0
+    # bytes written to or read from the transfer channel
+    bytes_transferred: int = 0
+
+    def add(self, phase: str, time_ns: int) -> None:
+        self.phases_ns[phase] = self.phases_ns.get(phase, 0) + time_ns
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Add the time of the code executed in the context to the phase."""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter_ns() - start)
+
+    def to_text(self) -> str:
+        phases = sorted(
+            self.phases_ns.items(),
+            key=lambda item: PHASES.index(item[0]) if item[0] in PHASES else len(PHASES),
+        )
+        rows = [
+            f"{self.operation}: {self.total_ns / 1e6:.3f} ms, sent {self.bytes_sent} B, "
+            f"received {self.chars_received} chars, transferred {self.bytes_transferred} B"
+        ]
+        rows += [f"  {name:10} {time_ns / 1e6:10.3f} ms" for name, time_ns in phases]
+        return "\n".join(rows)
+
+    def __str__(self) -> str:
+        return self.to_text()
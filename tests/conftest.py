@@ -1,8 +1,10 @@
+from collections.abc import Iterator
 from pathlib import Path
 
 import pytest
 
 import repltilian
+from repltilian.pool import REPLPool
 
 THIS_FILE_DIR = Path(__file__).parent
 RESOURCES_DIR = THIS_FILE_DIR / "resources"
@@ -19,6 +21,14 @@ def sample_code() -> str:
         return f.read()
 
 
+@pytest.fixture(scope="session")
+def repl_pool() -> Iterator[REPLPool]:
+    with REPLPool(size=2) as pool:
+        yield pool
+
+
 @pytest.fixture()
-def repl() -> repltilian.SwiftREPL:
-    return repltilian.SwiftREPL()
+def repl(repl_pool: REPLPool) -> Iterator[repltilian.SwiftREPL]:
+    # each test gets a new process, the next one is started in the background
+    with repl_pool.checkout() as repl:
+        yield repl
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from repltilian import SwiftREPLException
+from repltilian.async_repl import AsyncSwiftREPL
+
+
+def test__run_and_transfer_variables(sample_filepath: str) -> None:
+    async def main() -> None:
+        async with AsyncSwiftREPL() as repl:
+            await repl.run("var values = [1, 2, 3]")
+            assert await repl.vars["values"].get() == [1, 2, 3]
+
+            await repl.vars.set("values", "[Float]", [1.0, 2.0])
+            assert list(await repl.vars["values"].get_binary()) == [1.0, 2.0]
+
+            repl.add_reload_file(sample_filepath)
+            await repl.run("var p = Point<Float>(x: 1, y: 2)", autoreload=True)
+            assert await repl.vars.get_many(["p", "values"]) == {
+                "p": {"x": 1, "y": 2},
+                "values": [1.0, 2.0],
+            }
+
+            with pytest.raises(SwiftREPLException):
+                await repl.run("let x: Int = 1.5")
+
+    asyncio.run(main())
+
+
+def test__set_array_get_array() -> None:
+    np = pytest.importorskip("numpy")
+
+    async def main() -> None:
+        async with AsyncSwiftREPL() as repl:
+            matrix = np.eye(3)
+            await repl.vars.set_array("matrix", matrix)
+            assert await repl.vars["matrixShape"].get() == [3, 3]
+            np.testing.assert_array_equal(await repl.vars.get_array("matrix"), matrix)
+
+    asyncio.run(main())
+
+
+def test__run__concurrent_repls() -> None:
+    async def compute(repl: AsyncSwiftREPL, value: int) -> int:
+        await repl.run(f"let result = {value} * {value}")
+        result: int = await repl.vars["result"].get()
+        return result
+
+    async def main() -> list[int]:
+        repls = await asyncio.gather(*[AsyncSwiftREPL.create() for _ in range(3)])
+        try:
+            return await asyncio.gather(*[compute(r, i) for i, r in enumerate(repls)])
+        finally:
+            await asyncio.gather(*[r.close() for r in repls])
+
+    assert asyncio.run(main()) == [0, 1, 4]
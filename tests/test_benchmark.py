@@ -0,0 +1,76 @@
+import pytest
+
+from repltilian import benchmark
+
+
+def test__consume_result__wraps_last_expression() -> None:
+    stmt = "let x = values.count\nvalues.reduce(\n    0, +\n)"
+
+    assert benchmark.consume_result(stmt) == (
+        "let x = values.count\n_blackHole(values.reduce(\n    0, +\n))"
+    )
+
+
+@pytest.mark.parametrize(
+    "stmt", ["let x = values.count", "values[0] = 1", "total += 1", "for x in values { f(x) }"]
+)
+def test__consume_result__keeps_statements(stmt: str) -> None:
+    assert benchmark.consume_result(stmt) == stmt
+
+
+def test__benchmark_code() -> None:
+    prompt = benchmark.benchmark_code("var values = [1, 2]", "values.count", 3, 100, 2)
+
+    assert "    var values = [1, 2]" in prompt
+    assert "                _blackHole(values.count)" in prompt
+    assert "var __number = 100" in prompt
+    assert "for __repeat in 0..<5 {" in prompt
+    assert prompt.split("\n")[-1] == "_benchmarkResult = try _benchmarkRun()"
+
+
+@pytest.mark.parametrize("repeat, number", [(0, None), (1, 0)])
+def test__benchmark_code__invalid_arguments(repeat: int, number: int | None) -> None:
+    with pytest.raises(ValueError):
+        benchmark.benchmark_code("", "f()", repeat, number, 1)
+
+
+def test__benchmark_result__statistics() -> None:
+    result = benchmark.BenchmarkResult.from_repeat_times(10, [100, 200, 300, 400, 1000])
+
+    assert result.times_ns == [10, 20, 30, 40, 100]
+    assert result.min_ns == 10
+    assert result.ns_per_iter == 30
+    assert result.mean_ns == 40
+    assert 40 < result.p95_ns <= 100
+    assert "30.0 ns per iteration" in result.to_text()
+
+
+def test__benchmark_result__merge() -> None:
+    results = [benchmark.BenchmarkResult(10, [1.0, 2.0]), benchmark.BenchmarkResult(10, [3.0])]
+
+    assert benchmark.BenchmarkResult.merge(results) == benchmark.BenchmarkResult(10, [1, 2, 3])
+    with pytest.raises(ValueError):
+        benchmark.BenchmarkResult.merge(results + [benchmark.BenchmarkResult(20, [1.0])])
+
+
+def test__comparison__speedup_interval() -> None:
+    baseline = benchmark.BenchmarkResult(1, [200.0, 210.0, 190.0, 205.0, 195.0])
+    candidate = benchmark.BenchmarkResult(1, [100.0, 105.0, 95.0, 102.0, 98.0])
+
+    comparison = benchmark.Comparison(baseline, candidate)
+
+    assert comparison.speedup == 2
+    low, high = comparison.speedup_interval
+    assert 1 < low <= 2 <= high
+    assert comparison.significant
+    assert "candidate is faster" in comparison.to_text()
+
+
+def test__comparison__not_significant() -> None:
+    result = benchmark.BenchmarkResult(1, [100.0, 120.0, 80.0, 110.0, 90.0])
+
+    comparison = benchmark.Comparison(result, benchmark.BenchmarkResult(1, result.times_ns[::-1]))
+
+    assert comparison.speedup == 1
+    assert not comparison.significant
+    assert "no significant difference" in comparison.to_text()
@@ -0,0 +1,131 @@
+import array
+
+import pytest
+
+from repltilian import buffers
+
+
+def _join(header: bytes, payload: memoryview) -> bytes:
+    return header + payload.tobytes()
+
+
+def test__parse_array_type() -> None:
+    assert buffers.parse_array_type("[Float]") == ("f", 1)
+    assert buffers.parse_array_type("Array<Double>") == ("d", 1)
+    assert buffers.parse_array_type("[[Int]]") == ("q", 2)
+    assert buffers.parse_array_type("Array<Array<Array<UInt8>>>") == ("B", 3)
+    assert buffers.parse_array_type("[Array<Int32>]") == ("i", 2)
+    assert buffers.parse_array_type("Int") is None
+    assert buffers.parse_array_type("[String]") is None
+    assert buffers.parse_array_type("[String: Int]") is None
+    assert buffers.parse_array_type("[Point<Float>]") is None
+    assert buffers.parse_array_type("[[[[Float]]]]") is None
+
+
+def test__encode_header() -> None:
+    header = buffers.encode_header((2, 3), "f")
+    assert len(header) == 8 * 4
+    assert buffers.decode_header(header) == ((2, 3), "f", 32)
+
+
+def test__encode_array__list() -> None:
+    header, payload = buffers.encode_array([1.0, 2.0, 3.0], "d", 1)
+    assert buffers.decode_header(header) == ((3,), "d", 24)
+    assert payload.nbytes == 3 * 8
+    values = buffers.decode_array(_join(header, payload))
+    assert list(values) == [1.0, 2.0, 3.0]
+
+
+def test__encode_array__nested_list() -> None:
+    header, payload = buffers.encode_array([[1, 2, 3], [4, 5, 6]], "q", 2)
+    assert buffers.decode_header(header)[0] == (2, 3)
+    values = buffers.decode_array(_join(header, payload))
+    if buffers.HAS_NUMPY:
+        assert values.shape == (2, 3)
+        values = values.reshape(-1)
+    assert values.tolist() == [1, 2, 3, 4, 5, 6]
+
+
+def test__encode_array__array_and_memoryview() -> None:
+    values = array.array("f", [1.5, 2.5])
+    header, payload = buffers.encode_array(values, "f", 1)
+    assert list(buffers.decode_array(_join(header, payload))) == [1.5, 2.5]
+
+    header, payload = buffers.encode_array(memoryview(values), "f", 1)
+    assert list(buffers.decode_array(_join(header, payload))) == [1.5, 2.5]
+
+    # type conversion
+    header, payload = buffers.encode_array(array.array("i", [1, 2]), "d", 1)
+    assert list(buffers.decode_array(_join(header, payload))) == [1.0, 2.0]
+
+
+def test__encode_array__should_raise_error() -> None:
+    with pytest.raises(ValueError):
+        buffers.encode_array([[1, 2], [3]], "q", 2)
+    with pytest.raises(ValueError):
+        buffers.encode_array([1, [2]], "q", 2)
+    with pytest.raises(ValueError):
+        buffers.encode_array([1, 2], "q", 2)
+    with pytest.raises(ValueError):
+        buffers.encode_array(["a"], "q", 1)
+    with pytest.raises(ValueError):
+        buffers.encode_array({"a": 1}, "q", 1)
+
+
+def test__decode_array__truncated() -> None:
+    header, payload = buffers.encode_array([1, 2, 3], "q", 1)
+    with pytest.raises(ValueError):
+        buffers.decode_array(_join(header, payload)[:-1])
+
+
+def test__encode_array__numpy() -> None:
+    np = pytest.importorskip("numpy")
+    values = np.arange(12, dtype=np.float64).reshape(3, 4)
+    header, payload = buffers.encode_array(values, "f", 2)
+    decoded = buffers.decode_array(_join(header, payload))
+    assert decoded.dtype == np.float32
+    assert decoded.shape == (3, 4)
+    np.testing.assert_array_equal(decoded, values)
+
+    big_endian = values.astype(">f8")
+    header, payload = buffers.encode_array(big_endian.T, "d", 2)
+    np.testing.assert_array_equal(buffers.decode_array(_join(header, payload)), values.T)
+
+
+def test__flatten_array() -> None:
+    np = pytest.importorskip("numpy")
+    values = np.arange(6, dtype=np.float32).reshape(2, 3)
+    scalar, flat, shape = buffers.flatten_array(values)
+    assert (scalar, shape) == ("Float", (2, 3))
+    assert flat.shape == (6,)
+    # contiguous little-endian arrays are not copied
+    assert np.shares_memory(flat, values)
+
+    scalar, flat, shape = buffers.flatten_array(values.T.astype(">f8"), "Float")
+    assert (scalar, shape, flat.dtype) == ("Float", (3, 2), np.dtype("<f4"))
+    np.testing.assert_array_equal(flat, values.T.reshape(-1))
+
+    assert buffers.flatten_array(np.arange(3, dtype=np.uint8))[0] == "UInt8"
+    with pytest.raises(ValueError):
+        buffers.flatten_array(values, "Int")
+    with pytest.raises(ValueError):
+        buffers.flatten_array(np.array([300]), "Int8")
+    assert buffers.flatten_array(np.array([1, 2]), "Int8")[1].tolist() == [1, 2]
+    with pytest.raises(ValueError):
+        buffers.flatten_array(np.array([True, False]))
+    with pytest.raises(ValueError):
+        buffers.flatten_array(values, "String")
+
+
+def test__encode_array__numpy_should_not_change_values() -> None:
+    np = pytest.importorskip("numpy")
+    with pytest.raises(ValueError):
+        buffers.encode_array(np.array([1.7, -2.9]), "q", 1)
+    with pytest.raises(ValueError):
+        buffers.encode_array(np.array([300]), "B", 1)
+    with pytest.raises(ValueError):
+        buffers.encode_array(np.array([-1]), "Q", 1)
+    with pytest.raises(ValueError):
+        buffers.encode_array(np.array([1.0, -2.0]), "q", 1)
+    header, payload = buffers.encode_array(np.array([255], dtype=np.int64), "B", 1)
+    assert list(buffers.decode_array(_join(header, payload))) == [255]
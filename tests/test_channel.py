@@ -0,0 +1,58 @@
+import os
+import struct
+
+from repltilian import channel
+
+
+def test__write_read() -> None:
+    transfer = channel.TransferChannel(capacity=64)
+    transfer.write(b"hello", memoryview(b" world"))
+    assert bytes(transfer.read()) == b"hello world"
+    transfer.write(b"abc")
+    assert bytes(transfer.read()) == b"abc"
+    assert transfer.capacity == 64
+    transfer.close()
+
+
+def test__write__should_grow_capacity() -> None:
+    transfer = channel.TransferChannel(capacity=16)
+    message = bytes(range(256)) * 10
+    transfer.write(message)
+    assert transfer.capacity >= len(message) + 8
+    assert bytes(transfer.read()) == message
+    transfer.close()
+
+
+def test__read__message_written_by_repl() -> None:
+    transfer = channel.TransferChannel(capacity=16)
+    view = transfer.read()
+    # emulate the REPL side which writes the file in place without truncating it
+    message = b"x" * 1000
+    with open(transfer.path, "r+b") as file:
+        file.write(struct.pack("<q", len(message)) + message)
+    assert bytes(transfer.read()) == message
+    del view
+    transfer.close()
+
+
+def test__close__should_remove_file() -> None:
+    transfer = channel.TransferChannel()
+    assert os.path.exists(transfer.path)
+    transfer.write(b"abc")
+    view = transfer.read()
+    transfer.close()
+    assert not os.path.exists(transfer.path)
+    assert bytes(view) == b"abc"
+    transfer.close()
+
+
+def test__pack_items() -> None:
+    transfer = channel.TransferChannel(capacity=16)
+    items: list[list[bytes | memoryview]] = [[b"abc"], [b"", b""], [b"0123", memoryview(b"4567")]]
+    transfer.write(*channel.pack_items(items))
+    message = transfer.read()
+    assert len(message) % 8 == 0
+    unpacked = channel.unpack_items(message)
+    assert [bytes(item) for item in unpacked] == [b"abc", b"", b"01234567"]
+    del message, unpacked
+    transfer.close()
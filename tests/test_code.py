@@ -72,3 +72,113 @@ def test__make_body_return_var(sample_code: str) -> None:
     body = """Point(x: x + dx, y: y + dy)"""
     new_body = code.make_body_return_var(body, "val")
     assert new_body == "let val = Point(x: x + dx, y: y + dy)\nreturn val"
+
+
+def test__find_declared_names(sample_code: str) -> None:
+    names = code.find_declared_names(sample_code)
+    assert names == {
+        "NumberType",
+        "Point",
+        "Neighbor",
+        "SearchResult",
+        "findKNearestNeighbors",
+        "removeBrackets",
+    }
+
+
+def test__split_declarations(sample_code: str) -> None:
+    declarations = code.split_declarations(sample_code)
+    assert [(d.kind, d.name) for d in declarations] == [
+        ("import", "Foundation"),
+        ("protocol", "NumberType"),
+        ("extension", "Float"),
+        ("extension", "Double"),
+        ("struct", "Point"),
+        ("struct", "Neighbor"),
+        ("struct", "SearchResult"),
+        ("func", "findKNearestNeighbors"),
+        ("func", "+"),
+        ("func", "-"),
+        ("func", "removeBrackets"),
+    ]
+    point = declarations[4]
+    assert point.start_line == 8
+    assert point.end_line == 24
+    assert point.code.split("\n")[-1] == "}"
+    assert [d.name for d in declarations if d.declares_name] == [
+        "NumberType",
+        "Point",
+        "Neighbor",
+        "SearchResult",
+        "findKNearestNeighbors",
+        "removeBrackets",
+    ]
+
+
+def test__split_declarations__attributes() -> None:
+    source = "@inlinable\nfunc f() {}\nprint(f())\n"
+    declarations = code.split_declarations(source)
+    assert [(d.kind, d.name, d.code) for d in declarations] == [
+        ("func", "f", "@inlinable\nfunc f() {}"),
+        ("", "", "print(f())"),
+    ]
+    assert declarations[0].start_line == 0
+
+
+def test__scan_code__comments_and_strings() -> None:
+    source = (
+        'let a = "{ // }" // comment {\n'
+        "/* outer /* nested } */ still comment\n"
+        '*/ let b = #"raw \\(x) "quoted" "#\n'
+        'let c = "value: \\(items.map { "\\($0)" }.joined())"'
+    )
+    scanned = code.scan_code(source)
+
+    assert scanned.code_lines == ["let a =  ", "", " let b = ", "let c = "]
+    assert scanned.open_lines == {1}
+
+
+def test__scan_code__multiline_string() -> None:
+    source = 'let text = """\n    }\n    """\nfunc f() {}'
+    scanned = code.scan_code(source)
+
+    assert scanned.code_lines == ["let text = ", "", "", "func f() {}"]
+    assert scanned.open_lines == {0, 1}
+
+
+def test__find_function__braces_in_strings_and_comments() -> None:
+    source = (
+        "struct Box {\n"
+        "    func open() -> String {\n"
+        "        // closing } in the comment\n"
+        '        return "}" + """\n'
+        "        {\n"
+        '        """\n'
+        "    }\n"
+        "}\n"
+        "func close() { print(1) }"
+    )
+    function = code.find_function("open", source)
+
+    assert function.code_start_line == 1
+    assert function.code_end_line == 6
+    assert function.body_start_line == 2
+
+    function = code.find_function("close", source)
+    assert function.code == "func close() { print(1) }"
+    assert function.body_start_line == function.code_start_line
+
+
+def test__source_index__protocol_requirements() -> None:
+    source = "protocol Shape {\n    func area() -> Double\n}\nfunc area() -> Double {\n    1\n}"
+    index = code.SourceIndex(source)
+
+    assert index.find("Shape", "protocol") == code.DeclarationSpan("protocol", "Shape", 0, 0, 2)
+    assert index.find("area", "func") == code.DeclarationSpan("func", "area", 3, 3, 5)
+
+
+def test__extract_code_blocks__multiline_string() -> None:
+    lines = ['let text = """', "    {", '    """', "print(text)"]
+    blocks = code.extract_code_blocks(lines)
+
+    assert [block.text for block in blocks] == ["\n".join(lines[:3]), "print(text)"]
@@ -0,0 +1,34 @@
+from pathlib import Path
+
+import pytest
+
+from repltilian import SwiftREPLException
+from repltilian.executor import SwiftREPLExecutor
+
+
+def test__start__should_raise_start_error(tmp_path: Path) -> None:
+    with pytest.raises(SwiftREPLException, match="REPL failed to start"):
+        SwiftREPLExecutor(workers=2, cwd=str(tmp_path / "missing"))
+
+
+def test__run__parallel(sample_filepath: str) -> None:
+    with SwiftREPLExecutor(workers=2) as executor:
+        executor.add_reload_file(sample_filepath)
+        for future in executor.run_all("func square(_ x: Int) -> Int { x * x }"):
+            future.result()
+
+        futures = [executor.run(f"let y = square({x})", outputs=["y"]) for x in range(6)]
+        assert [f.result()["y"] for f in futures] == [x * x for x in range(6)]
+
+        result = executor.run(
+            "let p = Point<Float>(x: 1, y: 2) + Point<Float>(x: 2, y: 1)",
+            outputs=["p"],
+            autoreload=True,
+        )
+        assert result.result() == {"p": {"x": 3, "y": 3}}
+
+        names = executor.broadcast(lambda repl: repl.vars["p"].name)
+        assert [f.result() for f in names] == ["p", "p"]
+
+    with pytest.raises(SwiftREPLException, match="shut down"):
+        executor.run("let x = 1")
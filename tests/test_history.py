@@ -0,0 +1,35 @@
+from pathlib import Path
+
+from repltilian import history
+from repltilian.benchmark import BenchmarkResult
+
+
+def test__benchmark_history__record_and_entries(tmp_path: Path) -> None:
+    store = history.BenchmarkHistory(str(tmp_path / "results" / "history.jsonl"))
+    result = BenchmarkResult(10, [1.0, 2.0, 3.0])
+
+    store.record("sum", "baseline", result, history.code_digest("func f() {}"))
+    store.record("sum", "candidate", BenchmarkResult(10, [0.5, 1.0]))
+    store.record("sort", "baseline", result)
+
+    entries = store.entries("sum")
+    assert [entry.label for entry in entries] == ["baseline", "candidate"]
+    assert entries[0].result == result
+    assert entries[0].digest == history.code_digest("func f() {}")
+    latest = store.latest("sum", "candidate")
+    assert latest is not None and latest.result.times_ns == [0.5, 1.0]
+    assert store.latest("missing", "baseline") is None
+    assert "candidate" in store.report("sum")
+
+
+def test__benchmark_history__check_regression(tmp_path: Path) -> None:
+    store = history.BenchmarkHistory(str(tmp_path / "history.jsonl"))
+    store.record("sum", "candidate", BenchmarkResult(1, [100.0, 101.0, 99.0, 100.0, 102.0]))
+
+    slower = BenchmarkResult(1, [150.0, 151.0, 149.0, 152.0, 150.0])
+    same = BenchmarkResult(1, [101.0, 99.0, 100.0, 102.0, 100.0])
+
+    regression = store.check_regression("sum", "candidate", slower)
+    assert regression is not None and regression.speedup < 1
+    assert store.check_regression("sum", "candidate", same) is None
+    assert store.check_regression("sum", "baseline", slower) is None
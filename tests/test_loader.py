@@ -0,0 +1,39 @@
+import os
+from pathlib import Path
+
+from repltilian import loader
+
+
+def test__is_declarations_only(sample_code: str) -> None:
+    assert loader.is_declarations_only(sample_code)
+    assert loader.is_declarations_only("let x = max(1, 2)\nvar y: [Int] = []")
+    assert not loader.is_declarations_only("func f() {}\nprint(f())")
+    assert not loader.is_declarations_only("values.append(1)")
+
+
+def test__load_commands() -> None:
+    commands = loader.load_commands("/tmp/modules", "ReplInclude")
+    assert commands[0] == ':settings append target.swift-module-search-paths "/tmp/modules"'
+    assert commands[1] == f'_loadLibrary("/tmp/modules/libReplInclude{loader.LIBRARY_SUFFIX}")'
+    assert commands[2] == "@testable import ReplInclude"
+
+    commands = loader.load_commands('/tmp/my "modules"', "ReplInclude")
+    assert commands[0].endswith(' "/tmp/my \\"modules\\""')
+
+
+def test__compile_module(tmp_path: Path, sample_code: str) -> None:
+    path = loader.compile_module(sample_code, str(tmp_path), "Demo")
+    assert os.path.isfile(path)
+    assert os.path.isfile(tmp_path / "Demo.swiftmodule")
+
+
+def test__build_cached_module(tmp_path: Path, sample_code: str) -> None:
+    name = loader.build_cached_module(sample_code, str(tmp_path), flags=["-O"])
+    library = loader.library_path(str(tmp_path), name)
+    modified = os.stat(library).st_mtime_ns
+    # unchanged code reuses the cached module
+    assert loader.build_cached_module(sample_code, str(tmp_path), flags=["-O"]) == name
+    assert os.stat(library).st_mtime_ns == modified
+    assert loader.cached_module_name(sample_code, flags=["-O"]) == name
+    assert loader.build_cached_module(sample_code, str(tmp_path)) != name
+    assert loader.build_cached_module(sample_code + "\nlet x = 1", str(tmp_path)) != name
@@ -0,0 +1,34 @@
+from pathlib import Path
+
+import pytest
+
+from repltilian import SwiftREPLException
+from repltilian.pool import REPLPool
+
+
+def test__acquire__should_raise_start_error(tmp_path: Path) -> None:
+    with REPLPool(size=1, cwd=str(tmp_path / "missing")) as pool:
+        with pytest.raises(SwiftREPLException, match="REPL failed to start"):
+            pool.acquire(timeout=60)
+
+    with pytest.raises(SwiftREPLException, match="closed"):
+        pool.acquire()
+
+
+def test__checkout__recycle() -> None:
+    with REPLPool(size=1) as pool:
+        with pool.checkout(recycle=True) as repl:
+            repl.options.output_hide_variables = True
+            repl.run("var values = [1, 2, 3]")
+            assert repl.vars["values"].get() == [1, 2, 3]
+
+        with pool.checkout() as recycled:
+            # the state of the REPL process is kept, but the Python side state is reset
+            assert recycled is repl
+            assert recycled.options.output_hide_variables is False
+            assert "values" not in recycled.vars
+            assert recycled.vars["values"].get() == [1, 2, 3]
+
+        with pool.checkout() as fresh:
+            assert fresh is not repl
+        assert not repl.is_alive
@@ -0,0 +1,135 @@
+from typing import Any
+
+import pytest
+
+from repltilian import profiler
+
+
+def _counters(functions: int = 1, **values: Any) -> dict[str, Any]:
+    counters = {
+        "calls": 0,
+        "totalTime": 0,
+        "childProbes": 0,
+        "probeCost": 0,
+        "hits": [],
+        "times": [],
+        "calleeCalls": [0] * functions,
+        "calleeTimes": [0] * functions,
+        "calleeProbes": [0] * functions,
+    }
+    counters.update(values)
+    return counters
+
+
+def test__get_function_for_line_profiler__uses_flat_buffers(sample_code: str) -> None:
+    instrumented = profiler.get_function_for_line_profiler("findKNearestNeighbors", sample_code)
+
+    assert "[Int: UInt64]" not in instrumented
+    assert "UnsafeMutablePointer<UInt64>.allocate(capacity: 19)" in instrumented
+    # a single timestamp per probe
+    probes = [line for line in instrumented.split("\n") if "__line_hits[5] &+= 1" in line]
+    assert len(probes) == 1
+    assert probes[0].count("DispatchTime.now()") == 1
+    assert "_lineProfileExit(" in instrumented
+
+
+def test__instrument_function__skips_comments(sample_code: str) -> None:
+    function = profiler.instrument_function("findKNearestNeighbors", sample_code)
+
+    assert function.block_ends == {1: 17, 4: 9}
+    assert function.lines[3].strip() == "// Calculate distances to all dataPoints {"
+    assert "__line = 3;" not in function.code
+    assert "__line = 11;" in function.code
+
+
+def test__get_function_for_line_profiler__keeps_return(sample_code: str) -> None:
+    instrumented = profiler.get_function_for_line_profiler("findKNearestNeighbors", sample_code)
+    lines = instrumented.split("\n")
+
+    assert lines[-2].strip() == "return results"
+    assert lines[-1] == "}"
+
+
+def test__line_profile_result__from_counters(sample_code: str) -> None:
+    function = profiler.instrument_function("findKNearestNeighbors", sample_code)
+    hits = [0] * 19
+    times = [0] * 19
+    hits[1], times[1] = 1, 100
+    hits[4], times[4] = 2, 50
+    hits[5], times[5] = 20, 1000
+    counters = _counters(calls=1, totalTime=1500, probeCost=10, hits=hits, times=times)
+
+    result = profiler.LineProfileResult.from_counters(function, counters)
+
+    assert result.total_time_ns == 1500 - 23 * 10
+    assert result.exclusive_time_ns == result.total_time_ns
+    assert result.lines[5].time_ns == 1000 - 20 * 10
+    assert result.lines[5].per_hit_ns == 40
+    # compound blocks include the time of their lines
+    assert result.lines[4].time_ns == 30 + 800
+    assert result.lines[1].time_ns == 90 + 30 + 800
+    assert result.lines[5].source.strip() == "let dx = queryPoint.x - dataPoint.x"
+    assert "Function: findKNearestNeighbors at line 38" in result.to_text()
+
+
+def test__line_profile_result__function_not_called(sample_code: str) -> None:
+    function = profiler.instrument_function("findKNearestNeighbors", sample_code)
+    counters = _counters(probeCost=10)
+
+    result = profiler.LineProfileResult.from_counters(function, counters)
+
+    assert result.calls == 0
+    assert all(stats.hits == 0 and stats.time_ns == 0 for stats in result.lines)
+
+
+def test__find_profiled_functions(sample_code: str) -> None:
+    assert profiler.find_profiled_functions(sample_code) == [
+        "findKNearestNeighbors",
+        "removeBrackets",
+    ]
+
+
+def test__one_line_functions_are_not_profiled() -> None:
+    source_code = "func one() -> Int { return 1 }\n\nfunc two() -> Int {\n    return 2\n}\n"
+    assert profiler.find_profiled_functions(source_code) == ["two"]
+    with pytest.raises(ValueError, match="single line"):
+        profiler.instrument_function("one", source_code)
+
+
+def test__instrument_function__single_line_body(sample_code: str) -> None:
+    function = profiler.instrument_function("translate", sample_code, index=3)
+
+    assert function.lines == []
+    assert "_lineProfileEnter(3)" in function.code
+    assert function.code.split("\n")[-2].strip() == "return Point(x: x + dx, y: y + dy)"
+
+
+def test__profile_result__inclusive_and_exclusive_times(sample_code: str) -> None:
+    functions = [
+        profiler.instrument_function(name, sample_code, index)
+        for index, name in enumerate(["findKNearestNeighbors", "removeBrackets"])
+    ]
+    caller = _counters(
+        functions=2,
+        calls=1,
+        totalTime=1000,
+        childProbes=5,
+        probeCost=2,
+        hits=[1] * 10 + [0] * 9,
+        times=[0] * 19,
+        calleeCalls=[0, 3],
+        calleeTimes=[0, 400],
+        calleeProbes=[0, 5],
+    )
+    callee = _counters(functions=2, calls=3, totalTime=400, probeCost=2, hits=[5], times=[400])
+
+    result = profiler.ProfileResult.from_counters(functions, [caller, callee])
+
+    caller_result = result.functions["findKNearestNeighbors"]
+    assert caller_result.total_time_ns == 1000 - (10 + 5) * 2
+    assert caller_result.callees == {"removeBrackets": profiler.CallStats(3, 400 - 5 * 2)}
+    assert caller_result.exclusive_time_ns == 970 - 390
+    callee_result = result.functions["removeBrackets"]
+    assert callee_result.total_time_ns == 400 - 5 * 2
+    assert callee_result.exclusive_time_ns == callee_result.total_time_ns
+    assert "-> removeBrackets" in result.to_text()
@@ -0,0 +1,126 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from repltilian import reload
+
+
+def _write(path: Path, content: str) -> str:
+    path.write_text(content)
+    # make sure the modification time changes even on file systems with coarse resolution
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    return str(path)
+
+
+def test__prepare__only_changed_files(tmp_path: Path) -> None:
+    a = _write(tmp_path / "a.swift", "struct A {}\n")
+    b = _write(tmp_path / "b.swift", "func b() -> Int { 1 }\n")
+    tracker = reload.ReloadTracker()
+
+    text, files = tracker.prepare([a, b])
+    assert text == "struct A {}\n\nfunc b() -> Int { 1 }\n"
+    tracker.commit(files)
+
+    text, files = tracker.prepare([a, b])
+    assert text == ""
+    assert files == []
+
+    _write(tmp_path / "b.swift", "func b() -> Int { 2 }\n")
+    text, files = tracker.prepare([a, b])
+    assert text == "func b() -> Int { 2 }\n"
+    # files are resent until the run succeeds
+    text, files = tracker.prepare([a, b])
+    assert [f.path for f in files] == [b]
+    tracker.commit(files)
+    assert tracker.prepare([a, b])[0] == ""
+
+
+def test__prepare__should_resend_dependent_files(tmp_path: Path) -> None:
+    a = _write(tmp_path / "a.swift", "struct A {}\n")
+    b = _write(tmp_path / "b.swift", "struct B { let a: A }\n")
+    c = _write(tmp_path / "c.swift", "func c(_ b: B) {}\n")
+    d = _write(tmp_path / "d.swift", "func d() {}\n")
+    tracker = reload.ReloadTracker()
+    tracker.commit(tracker.prepare([a, b, c, d])[1])
+
+    _write(tmp_path / "a.swift", "struct A { let x: Int }\n")
+    _, files = tracker.prepare([a, b, c, d])
+    assert [f.path for f in files] == [a, b, c]
+
+
+def test__prepare__removed_declarations(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    a = _write(tmp_path / "a.swift", "struct A {}\nfunc f() {}\n")
+    tracker = reload.ReloadTracker()
+    tracker.commit(tracker.prepare([a])[1])
+
+    _write(tmp_path / "a.swift", "struct A {}\n")
+    tracker.prepare([a])
+    assert "f" in capsys.readouterr().out
+
+
+def test__reset(tmp_path: Path) -> None:
+    a = _write(tmp_path / "a.swift", "struct A {}\n")
+    tracker = reload.ReloadTracker()
+    tracker.commit(tracker.prepare([a])[1])
+    tracker.reset()
+    assert tracker.prepare([a])[0] == "struct A {}\n"
+
+
+def test__invalidate(tmp_path: Path) -> None:
+    a = _write(tmp_path / "a.swift", "struct A {}\n")
+    b = _write(tmp_path / "b.swift", "func b() -> Int { 1 }\n")
+    tracker = reload.ReloadTracker()
+    tracker.commit(tracker.prepare([a, b])[1])
+
+    tracker.invalidate({"b"})
+    text, files = tracker.prepare([a, b])
+    assert text == "func b() -> Int { 1 }\n"
+    tracker.commit(files)
+    assert tracker.prepare([a, b])[0] == ""
+
+
+def test__invalidate__by_declaration(tmp_path: Path) -> None:
+    a = _write(tmp_path / "a.swift", "struct A {}\nfunc f() -> Int { 1 }\nfunc g() {}\n")
+    tracker = reload.ReloadTracker()
+    tracker.commit(tracker.prepare([a], by_declaration=True)[1])
+
+    tracker.invalidate({"f"})
+    text, files = tracker.prepare([a], by_declaration=True)
+    assert text == "func f() -> Int { 1 }"
+    assert [f.path for f in files] == [a]
+    tracker.commit(files)
+    assert tracker.prepare([a], by_declaration=True) == ("", [])
+
+
+def test__prepare__by_declaration(tmp_path: Path) -> None:
+    a = _write(
+        tmp_path / "a.swift",
+        "import Foundation\n\nstruct A {\n    let x: Int\n}\n\n// comment\nfunc f() -> Int {\n"
+        "    return 1\n}\n\nfunc g(_ a: A) -> Int {\n    return a.x\n}\n",
+    )
+    b = _write(tmp_path / "b.swift", "func h() -> Int { f() + 1 }\nfunc k() {}\n")
+    tracker = reload.ReloadTracker()
+    text, files = tracker.prepare([a, b], by_declaration=True)
+    assert text.startswith("import Foundation\nstruct A {")
+    tracker.commit(files)
+    assert tracker.prepare([a, b], by_declaration=True) == ("", [])
+
+    # only the edited function and its dependent code is resent
+    _write(
+        tmp_path / "a.swift",
+        "import Foundation\n\nstruct A {\n    let x: Int\n}\n\n// new comment\nfunc f() -> Int {\n"
+        "    return 2\n}\n\nfunc g(_ a: A) -> Int {\n    return a.x\n}\n",
+    )
+    text, files = tracker.prepare([a, b], by_declaration=True)
+    assert text == "func f() -> Int {\n    return 2\n}\nfunc h() -> Int { f() + 1 }"
+    assert [f.path for f in files] == [a]
+    tracker.commit(files)
+
+    # changed type is resent with all the code which uses it
+    _write(
+        tmp_path / "a.swift", "struct A {\n    let x: Float\n}\nfunc g(_ a: A) -> Float { a.x }\n"
+    )
+    text, _ = tracker.prepare([a, b], by_declaration=True)
+    assert text == "struct A {\n    let x: Float\n}\nfunc g(_ a: A) -> Float { a.x }"
@@ -1,6 +1,12 @@
+import os
+import tempfile
+import warnings
+from pathlib import Path
+
 import pytest
 
-from repltilian import SwiftREPL, SwiftREPLException
+from repltilian import SwiftREPL, SwiftREPLException, channel, constants, history, stats
+from repltilian.repl import BaseSwiftREPL, Options, VariablesRegister, _EchoTracker
 
 
 def test_add_reload_file(repl: SwiftREPL, sample_filepath: str) -> None:
@@ -67,3 +73,348 @@ def test__run_async_function(repl: SwiftREPL) -> None:
     )
     repl.run("let result = try runSync {await sum(5, 7)}")
     assert repl.vars["result"].get() == 12
+
+
+def test__run__sentinel_completion_mode() -> None:
+    repl = SwiftREPL(options=Options(completion_mode="sentinel"))
+    repl.run("let x = 5")
+    assert repl.vars["x"].get() == 5
+    with pytest.raises(SwiftREPLException):
+        repl.run("let y = undefinedValue")
+    repl.run("let y = x + 1")
+    assert repl.vars["y"].get() == 6
+    repl.close()
+
+
+def test__set_variable__binary_array(repl: SwiftREPL) -> None:
+    repl.vars.set("values", "[Double]", [1.0, 2.0, 3.0])
+    assert repl.vars["values"].get() == [1.0, 2.0, 3.0]
+    assert list(repl.vars["values"].get_binary()) == [1.0, 2.0, 3.0]
+
+    repl.vars.set("matrix", "[[Int]]", [[1, 2], [3, 4]])
+    assert repl.vars["matrix"].get() == [[1, 2], [3, 4]]
+
+    # ragged arrays are transferred as JSON
+    repl.vars.set("ragged", "[[Int]]", [[1, 2], [3]])
+    assert repl.vars["ragged"].get() == [[1, 2], [3]]
+
+    # ragged arrays matching the total count of a fixed shape cannot be encoded
+    repl.run("let raggedRows: [[Int]] = [[1, 2], [3], [4, 5, 6]]")
+    with pytest.raises(SwiftREPLException):
+        repl.vars["raggedRows"].get_binary()
+    repl.run("let raggedCube: [[[Int]]] = [[[1, 2], [3, 4]], [[5, 6, 7], [8]]]")
+    with pytest.raises(SwiftREPLException):
+        repl.vars["raggedCube"].get_binary()
+
+
+def test__set_array_get_array(repl: SwiftREPL) -> None:
+    np = pytest.importorskip("numpy")
+    matrix = np.arange(12, dtype=np.float32).reshape(3, 4)
+    repl.vars.set_array("matrix", matrix)
+    assert repl.vars["matrixShape"].get() == [3, 4]
+    assert repl.vars["matrix"].get() == matrix.reshape(-1).tolist()
+
+    repl.run("matrix = matrix.map { $0 * 2 }")
+    result = repl.vars.get_array("matrix")
+    assert result.dtype == np.float32
+    np.testing.assert_array_equal(result, matrix * 2)
+
+    repl.vars.set_array("counts", np.arange(4, dtype=">i8"), dtype="Int")
+    view = repl.vars.get_array("counts", copy=False)
+    assert not view.flags.writeable
+    np.testing.assert_array_equal(view, np.arange(4))
+
+    with pytest.raises(SwiftREPLException):
+        repl.vars.set_array("flags", np.array([True, False]))
+    repl.run("matrixShape = [2, 2]")
+    with pytest.raises(SwiftREPLException):
+        repl.vars.get_array("matrix")
+
+
+def test__init__failure_should_remove_transfer_channel(tmp_path: Path) -> None:
+    directory = channel.SHARED_MEMORY_DIR if os.path.isdir(channel.SHARED_MEMORY_DIR) else None
+    channels = set(os.listdir(directory or tempfile.gettempdir()))
+    # the REPL exits without Package.swift in the working directory
+    with pytest.raises(Exception):
+        SwiftREPL(cwd=str(tmp_path))
+    assert set(os.listdir(directory or tempfile.gettempdir())) <= channels
+
+
+def test__close__should_remove_transfer_channel() -> None:
+    repl = SwiftREPL()
+    repl.vars.set("x", "Int", 10)
+    assert repl.vars["x"].get() == 10
+    path = repl._channel.path
+    assert os.path.exists(path)
+    repl.close()
+    assert not os.path.exists(path)
+
+
+def test__get_many_set_many(repl: SwiftREPL) -> None:
+    repl.vars.set_many(
+        {
+            "a": ("Int", 1),
+            "b": ("[Float]", [1.0, 2.0]),
+            "c": ("[String: Int]", {"x": 1}),
+        }
+    )
+    assert repl.vars.get_many(["a", "b", "c"]) == {"a": 1, "b": [1.0, 2.0], "c": {"x": 1}}
+    assert repl.vars.get_many([]) == {}
+
+
+def test__autoreload__should_send_only_changed_files(
+    repl: SwiftREPL, sample_filepath: str
+) -> None:
+    repl.add_reload_file(sample_filepath)
+    repl.run("var point = Point<Float>(x: 1, y: 2)", autoreload=True)
+    assert repl._output is not None and constants.END_OF_INCLUDE in repl._output
+    repl.run("var point2 = Point<Float>(x: 1, y: 2)", autoreload=True)
+    assert constants.END_OF_INCLUDE not in repl._output
+    assert repl.vars["point2"].get() == {"x": 1, "y": 2}
+
+
+def test__stream(repl: SwiftREPL) -> None:
+    repl.options.output_hide_variables = True
+    lines = list(repl.stream('for i in 0..<3 { print("step \\(i)") }\nvar total = 3'))
+    assert lines == ["step 0", "step 1", "step 2"]
+    assert repl.vars["total"].get() == 3
+
+    received: list[str] = []
+    repl.run('print("hello")', on_output=received.append)
+    assert received == ["hello"]
+
+    with pytest.raises(SwiftREPLException):
+        list(repl.stream("let x: Int = 1.5"))
+
+
+def test__variables_register__lazy_echo() -> None:
+    repl = BaseSwiftREPL(options=Options(variables_echo_size=40))
+    repl.vars = VariablesRegister(repl)
+    repl.vars._register_output("1> let x = 5\nx: Int = 5\ny: [Int] = 2 values {\n  [0] = 1\n}")
+    assert repl.vars["y"].dtype == "[Int]"
+    assert repl.vars["x"].value == "5"
+
+    repl.vars._register_output("2> var z = 1.0\nz: Double = 1")
+    assert repl.vars["z"].dtype == "Double"
+    # the least recently used output is removed when the limit is exceeded
+    repl.vars._register_output("3> var w = 1.0\nw: Double = 1")
+    assert repl.vars["x"].value is None
+    assert repl.vars["z"].value == "1"
+
+
+def test__options__maxsend_is_deprecated() -> None:
+    with pytest.warns(DeprecationWarning, match="maxsend"):
+        Options(maxsend=1000)
+
+
+def test__record_stats__nested_calls() -> None:
+    recorded: list[stats.RunStats] = []
+    repl = BaseSwiftREPL(options=Options(stats_hook=recorded.append))
+    repl.vars = VariablesRegister(repl)
+    repl._initialized = True
+
+    with repl._record_stats("get") as outer:
+        with repl._record_stats("run") as inner:
+            blocks, reloaded_files = repl._prepare_run("let x = 5", autoreload=False)
+            repl._complete_run("1> let x = 5\nx: Int = 5", reloaded_files, False, False)
+        assert inner is outer
+
+    assert blocks == ["let x = 5"]
+    assert recorded == [outer]
+    assert repl.last_run_stats is outer
+    assert outer.operation == "get"
+    assert {"batch", "errors", "variables"} <= outer.phases_ns.keys()
+    assert outer.total_ns >= sum(outer.phases_ns.values())
+
+
+def test__echo_tracker() -> None:
+    echo = _EchoTracker(["let x = 1", "", "print(x)"])
+    assert echo.data == b"let x = 1\n\nprint(x)\n"
+    echo.feed("\x1b[1G 1> let x")
+    assert echo.acked == 0
+    echo.feed(" = 1\r\n 2> \r\n")
+    assert echo.acked == 11
+    assert not echo.done
+    echo.feed(" 3> print(x)\r\n1\r\n")
+    assert echo.done
+    assert echo.acked == len(echo.data)
+
+
+def test__echo_tracker__ignores_program_output() -> None:
+    echo = _EchoTracker(["for i in 0..<3 { print(i) }", "let y = 2", "print(y)"])
+    echo.feed("\x1b[1G\x1b[J 1> for i in 0..<3 { print(i) }\r\n0\r\n1\r\n2\r\n")
+    assert echo.acked == 28
+    echo.feed("\x1b[1G\x1b[J 2> let y")
+    echo.feed(" = 2\r\ny: Int = 2\r\n\r\n")
+    assert echo.acked == 38
+    assert not echo.done
+    echo.feed(" 3> print(y)\r\n")
+    assert echo.done
+
+
+def test__autoreload__import_threshold(sample_filepath: str) -> None:
+    repl = SwiftREPL(options=Options(import_threshold=100))
+    repl.add_reload_file(sample_filepath)
+    repl.run("var p1 = Point<Float>(x: 1, y: 2)\nvar p2 = p1 + p1", autoreload=True)
+    assert repl.vars["p2"].get() == {"x": 2, "y": 4}
+    assert repl._output is not None
+    assert "struct Point" not in repl._output
+    repl.close()
+
+
+def test__autoreload__compiled_mode(sample_filepath: str, tmp_path: Path) -> None:
+    options = Options(reload_mode="compiled", module_cache_dir=str(tmp_path))
+    repl = SwiftREPL(options=options)
+    repl.add_reload_file(sample_filepath)
+    repl.run("var p1 = Point<Float>(x: 1, y: 2)\nvar p2 = p1 + p1", autoreload=True)
+    assert repl.vars["p2"].get() == {"x": 2, "y": 4}
+    assert any(name.endswith(".swiftmodule") for name in os.listdir(tmp_path))
+    # unchanged files are not sent again
+    repl.run("var p3 = p1 + p2", autoreload=True)
+    assert repl._output is not None
+    assert "ReplInclude" not in repl._output
+    repl.close()
+
+
+def test__autoreload__compiled_mode_after_failed_run(sample_filepath: str, tmp_path: Path) -> None:
+    options = Options(reload_mode="compiled", module_cache_dir=str(tmp_path))
+    repl = SwiftREPL(options=options)
+    repl.add_reload_file(sample_filepath)
+    with pytest.raises(SwiftREPLException):
+        repl.run("var p1 = Point<Float>(x: 1, y: undefinedValue)", autoreload=True)
+    # the reload files were not committed, the same module is imported instead of typing them
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        repl.run("var p1 = Point<Float>(x: 1, y: 2)\nvar p2 = p1 + p1", autoreload=True)
+    assert repl._output is not None
+    assert "struct Point" not in repl._output
+    assert repl.vars["p2"].get() == {"x": 2, "y": 4}
+    repl.close()
+
+
+def test__line_profile__returns_result(repl: SwiftREPL, sample_filepath: str) -> None:
+    repl.add_reload_file(sample_filepath)
+    repl.run("", autoreload=True)
+    repl.vars.set("query", "Array<Point<Float>>", [{"x": 1.0, "y": 2.0}] * 3)
+    repl.vars.set("dataset", "Array<Point<Float>>", [{"x": 0.0, "y": 1.0}] * 20)
+
+    result = repl.line_profile(
+        "let result = findKNearestNeighbors(query: query, dataset: dataset, k: 2)",
+        function_name="findKNearestNeighbors",
+        source_path=sample_filepath,
+        verbose=False,
+    )
+
+    assert result.calls == 1
+    assert result.lines[1].source.strip() == "for queryPoint in query {"
+    assert result.lines[1].hits == 1
+    assert result.lines[5].hits == 60
+    assert result.lines[1].time_ns >= result.lines[4].time_ns
+    assert len(repl.vars["result"].get()) == 3
+    # the original function is defined again, its calls are not counted anymore
+    repl.run("let again = findKNearestNeighbors(query: query, dataset: dataset, k: 2)")
+    counters = repl.vars.get_many(["_lineProfiles"])["_lineProfiles"]
+    assert counters[0]["calls"] == 1
+
+
+def test__profile_functions__call_tree(repl: SwiftREPL, tmp_path: Path) -> None:
+    source_path = tmp_path / "helpers.swift"
+    source_path.write_text(
+        "func square(_ x: Int) -> Int {\n"
+        "    let y = x * x\n"
+        "    return y\n"
+        "}\n"
+        "\n"
+        "func sumOfSquares(_ n: Int) -> Int {\n"
+        "    var total = 0\n"
+        "    for i in 0..<n {\n"
+        "        total += square(i)\n"
+        "    }\n"
+        "    return total\n"
+        "}\n"
+    )
+    repl.add_reload_file(source_path)
+    repl.run("", autoreload=True)
+
+    result = repl.profile_functions(
+        "let total = sumOfSquares(10)", source_path=str(source_path), verbose=False
+    )
+
+    assert set(result.functions) == {"square", "sumOfSquares"}
+    outer = result.functions["sumOfSquares"]
+    assert outer.calls == 1
+    assert outer.callees["square"].calls == 10
+    assert outer.exclusive_time_ns <= outer.total_time_ns
+    assert result.functions["square"].calls == 10
+    assert result.functions["square"].lines[0].hits == 10
+    assert repl.vars["total"].get() == 285
+
+
+def test__sample_profile(repl: SwiftREPL, sample_filepath: str) -> None:
+    repl.add_reload_file(sample_filepath)
+    repl.run("", autoreload=True)
+    repl.vars.set("query", "Array<Point<Float>>", [{"x": 1.0, "y": 2.0}] * 50)
+    repl.vars.set("dataset", "Array<Point<Float>>", [{"x": 0.0, "y": 1.0}] * 2000)
+
+    result = repl.sample_profile(
+        "let result = findKNearestNeighbors(query: query, dataset: dataset, k: 2)",
+        interval_us=500,
+        verbose=False,
+    )
+
+    assert result.samples > 0
+    assert "findKNearestNeighbors" in {function.name for function in result.functions}
+    assert all(line.path == sample_filepath for line in result.lines)
+
+
+def test__benchmark(repl: SwiftREPL) -> None:
+    result = repl.benchmark(
+        setup="var values = (0..<1000).map { Float($0) }",
+        stmt="values.reduce(0, +)",
+        repeat=3,
+        number=10,
+        verbose=False,
+    )
+
+    assert result.number == 10
+    assert len(result.times_ns) == 3
+    assert result.min_ns > 0
+
+
+def test__compare_benchmarks(repl: SwiftREPL, tmp_path: Path) -> None:
+    baseline = "func total(_ values: [Int]) -> Int { values.reduce(0, +) }"
+    candidate = (
+        "func total(_ values: [Int]) -> Int { var s = 0; for v in values { s += v }; return s }"
+    )
+    history_path = tmp_path / "history.jsonl"
+
+    comparison = repl.compare_benchmarks(
+        "total(values)",
+        baseline,
+        candidate,
+        setup="let values = Array(0..<1000)",
+        repeat=3,
+        number=100,
+        rounds=2,
+        history_path=history_path,
+        verbose=False,
+    )
+
+    assert len(comparison.baseline.times_ns) == len(comparison.candidate.times_ns) == 6
+    assert comparison.speedup > 0
+    assert len(history.BenchmarkHistory(str(history_path)).entries("total(values)")) == 2
+
+
+def test__last_run_stats(repl: SwiftREPL) -> None:
+    repl.run("let statsValue = 5", verbose=False)
+
+    run_stats = repl.last_run_stats
+    assert run_stats is not None and run_stats.operation == "run"
+    assert run_stats.bytes_sent > 0 and run_stats.chars_received > 0
+    assert {"batch", "write", "wait", "render", "errors", "variables"} <= run_stats.phases_ns.keys()
+
+    repl.vars["statsValue"].get()
+    get_stats = repl.last_run_stats
+    assert get_stats is not None and get_stats.operation == "get"
+    assert get_stats.bytes_transferred > 0
+    assert "decode" in get_stats.phases_ns
@@ -1,4 +1,4 @@
-from repltilian import repl_output
+from repltilian import constants, repl_output
 
 
 def assert_lines_equal(left: str, right: str) -> None:
@@ -247,4 +247,137 @@ def test__split_prompt() -> None:
     assert blocks == [prompt]
     blocks = repl_output.split_prompt(prompt, maxsize=10)
     assert blocks == ['\nlet x = 1', '\n// commen', 't\n\nlet y =', ' 2\n']
-    assert [len(b) for b in blocks] == [10, 10, 10, 3]
\ No newline at end of file
+    assert [len(b) for b in blocks] == [10, 10, 10, 3]
+
+def test__sentinel_command() -> None:
+    command = repl_output.sentinel_command(12)
+    assert command == 'print("__REPLTILIAN_DONE_\\(12)__")'
+    # the echoed command must not match the printed marker
+    assert repl_output.SENTINEL_PATTERN.search(command) is None
+    match = repl_output.SENTINEL_PATTERN.search("__REPLTILIAN_DONE_12__\r\n")
+    assert match is not None
+    assert match.group(1) == "12"
+
+
+def test__remove_sentinel_lines() -> None:
+    output = (
+        ' 10> let x = 5\nx: Int = 5\n 11> \n 12> print("__REPLTILIAN_DONE_\\(3)__")\n'
+        "__REPLTILIAN_DONE_3__"
+    )
+    cleaned = repl_output.remove_sentinel_lines(output)
+    assert cleaned == " 10> let x = 5\nx: Int = 5\n 11> "
+
+
+def test__screen_buffer__feed_in_chunks() -> None:
+    repl_output_str = (
+        "\x1b[1G\x1b[1G\x1b[J 63>  \r\n 64.  \x1b[1G 64. \r 64. \x1b[1G 64. \x1b["
+        "6Gvar point = Point<Float>(x\r 64. var point = Point<Float>(x:\x1b[1G 64. \x1b[33G 1, "
+        "y\r 64. var point = Point<Float>(x: 1, y:\x1b[1G 64. \x1b[39G 2)\x1b[1G\x1b[1G\x1b[J 64. "
+        "var point = Point<Float>(x: 1, y: 2) \r\n 65.  \x1b[1G 65. \r 65. \x1b[1G 65. \x1b["
+        "6G\x1b[6G\r\npoint: Point<Float> = {\r\n  x = 1\r\n  y = 2\r\n}\r\n\x1b[1G\x1b[J 65>  "
+        "\x1b[1G 65> \r 65> \x1b[1G 65> \x1b[6G"
+    )
+    expected_output = repl_output.clean(repl_output_str)
+    # escape sequences and CRLF pairs split between chunks must render the same screen
+    for split in range(len(repl_output_str) + 1):
+        screen = repl_output.ScreenBuffer()
+        screen.feed(repl_output_str[:split])
+        screen.feed(repl_output_str[split:])
+        assert screen.text() == expected_output, f"Split at {split}"
+
+    screen = repl_output.ScreenBuffer()
+    for c in repl_output_str:
+        screen.feed(c)
+    assert screen.text() == expected_output
+    assert screen.last_line.strip() == "65>"
+
+
+def test__clean__unknown_escape_sequences() -> None:
+    assert repl_output.clean("ab\x1b[?25hc\x1bd") == "abcd"
+    assert repl_output.clean("abc\x1b[2;5Gx") == "axc"
+    assert repl_output.clean("abc\x1b[") == "abc"
+    assert repl_output.clean("abc\x1b[3") == "abc"
+    assert repl_output.clean("abc\x1b[5Gx") == "abc x"
+
+
+def test__screen_buffer__pop_completed_lines() -> None:
+    screen = repl_output.ScreenBuffer()
+    screen.feed("line 1\r\nline 2\r\nline")
+    assert screen.pop_completed_lines() == ["line 1", "line 2"]
+    assert screen.pop_completed_lines() == []
+    screen.feed(" 3\r\n 4> ")
+    assert screen.pop_completed_lines() == ["line 3"]
+    assert screen.last_line.strip() == "4>"
+    assert screen.pop_lines() == [" 4> "]
+    assert screen.text() == ""
+
+
+def test__scan_for_sentinel() -> None:
+    output = "a\r\n__REPLTILIAN_DONE_1__\r\nb\r\n__REPLTILIAN_DONE_2__\r\n 5> "
+    assert repl_output.scan_for_sentinel(output, 2) == ("a\r\n\r\nb\r\n", "\r\n 5> ", True)
+
+    # the beginning of the marker is kept until the rest of the marker is received
+    rendered, rest, done = repl_output.scan_for_sentinel("x" * 100 + "__REPLTILIAN_DO", 3)
+    assert not done
+    assert rendered + rest == "x" * 100 + "__REPLTILIAN_DO"
+    assert "__REPLTILIAN_DO" in rest
+    assert repl_output.scan_for_sentinel(rest + "NE_3__ 6> ", 3) == (rest[:-15], " 6> ", True)
+
+
+def test__output_stream() -> None:
+    lines = [
+        " 1> struct A {}",
+        " 2. " + constants.END_OF_INCLUDE,
+        " 3> let x = 5",
+        " 4. print(x)",
+        "5",
+        "",
+        "done",
+        "x: Int = 5",
+        "y: Int = 6",
+        " 5> ",
+        ' 6> print("__REPLTILIAN_DONE_\\(1)__")',
+    ]
+    stream = repl_output.OutputStream(has_include=True, hide_inputs=True, hide_variables=True)
+    visible = [line for i in range(len(lines)) for line in stream.feed(lines[i : i + 1])]
+    assert visible == ["5", "done"]
+    assert repl_output.find_variables(stream.text()) == {"x": ("Int", "5"), "y": ("Int", "6")}
+
+    stream = repl_output.OutputStream(stop_output_at_pattern="done")
+    assert stream.feed(lines[2:]) == [" 3> let x = 5", " 4. print(x)", "5"]
+
+
+def test__output_stream__errors_and_memory_limit() -> None:
+    stream = repl_output.OutputStream(has_include=True, hide_inputs=True, max_size=20)
+    visible = stream.feed([" 1> let x: Int = 1.5", "error: cannot convert value", "a" * 10])
+    assert visible == ["error: cannot convert value"]
+    assert stream.error_line == "error: cannot convert value"
+    assert stream.text() == "a" * 10
+
+
+def test__find_variable_offsets__parse_variable() -> None:
+    output = (
+        " 3> let x = 5\nerror: a = b\n$R0: Int = 12\npoint: Point<Float> = {\n  x = 1\n  y = 2\n}"
+        "\nx: Int = 5\n 4> "
+    )
+    offsets = repl_output.find_variable_offsets(output)
+    assert list(offsets) == ["$R0", "point", "x"]
+    parsed = {name: repl_output.parse_variable(output, offset) for name, offset in offsets.items()}
+    assert parsed == {
+        "$R0": ("$R0", "Int", "12"),
+        "point": ("point", "Point<Float>", "{\nx = 1\ny = 2\n}\n"),
+        "x": ("x", "Int", "5"),
+    }
+    declarations = {k: v[1:] for k, v in parsed.items() if v is not None}
+    assert declarations == repl_output.find_variables(output)
+
+
+def test__find_variable_offsets__skips_members_of_multiline_values() -> None:
+    output = (
+        "line: Line = {\n  start: Point = {\n    x: Float = 1\n    y: Float = 2\n  }\n}\n"
+        "y: Int = 3\n 4> "
+    )
+    offsets = repl_output.find_variable_offsets(output)
+    assert list(offsets) == ["line", "y"]
+    assert repl_output.parse_variable(output, offsets["y"]) == ("y", "Int", "3")
+    assert set(repl_output.find_variables(output)) == {"line", "y"}
@@ -0,0 +1,80 @@
+from repltilian import sampler
+
+LOOKUP_OUTPUT = """\
+ 12> :image lookup -v -a 0x7f0000001000
+      Address: [0x00007f0000001000] (__lldb_expr_3 + 16)
+      Summary: repl`closure #1 (Swift.Int32) -> () in _sampleProfileStart + 16 at repl.swift:5:9
+     Function: id = {0x10}, name = "closure #1 (Swift.Int32) -> () in _sampleProfileStart"
+ 13> :image lookup -v -a 0x7f0000002000
+      Address: libc.so.6[0x0000000000042520] (libc.so.6..text + 100)
+      Summary: libc.so.6`__restore_rt
+ 14> :image lookup -v -a 0x7f0000003000
+      Address: [0x00007f0000003000] (__lldb_expr_9 + 120)
+      Summary: repl`__lldb_expr_9.findKNearestNeighbors<A>(query: [Point<A>], k: Int) -> [A]\
+ + 120 at repl.swift:48:13
+     Function: id = {0x20}, name = "findKNearestNeighbors", range = [0x7f0000002f00-0x7f0000003f00)
+     FuncType: id = {0x20}, byte-size = 0, decl = repl.swift:40, compiler_type = "() -> ()"
+    LineEntry: [0x00007f0000003000-0x00007f0000003010): repl.swift:48:13
+ 15> :image lookup -v -a 0x7f0000003fff
+ 16> :image lookup -v -a 0x7f0000004fff
+      Address: [0x00007f0000004fff] (__lldb_expr_2 + 10)
+      Summary: repl`main + 10 at repl.swift:2:1
+    LineEntry: [0x00007f0000004ff0-0x00007f0000005000): repl.swift:2:1
+"""
+
+
+def test__split_samples() -> None:
+    frames = [1, 2, 3, 0, 4, 5, 0, 0]
+
+    assert sampler.split_samples(frames, depth=4) == [[1, 2, 3], [4, 5]]
+
+
+def test__lookup_addresses__uses_call_addresses() -> None:
+    samples = [[0x1001, 0x2001, 0x3000, 0x4000]]
+
+    assert sampler.lookup_addresses(samples) == [0x1000, 0x2000, 0x3000, 0x3FFF]
+    assert sampler.lookup_commands([0x3000]) == ":image lookup -v -a 0x3000"
+
+
+def test__parse_lookup_output() -> None:
+    frames = sampler.parse_lookup_output(LOOKUP_OUTPUT)
+
+    assert set(frames) == {0x7F0000001000, 0x7F0000002000, 0x7F0000003000, 0x7F0000004FFF}
+    frame = frames[0x7F0000003000]
+    assert frame.function == "findKNearestNeighbors"
+    assert (frame.file, frame.line, frame.decl_line) == ("repl.swift", 48, 40)
+    assert frames[0x7F0000002000].symbol == "__restore_rt"
+    assert frames[0x7F0000001000].function == (
+        "closure #1 (Swift.Int32) -> () in _sampleProfileStart"
+    )
+    assert frames[0x7F0000004FFF].function == "main"
+
+
+def test__function_name() -> None:
+    assert sampler.function_name("__lldb_expr_2.Point<A>.translate(dx: A, dy: A)") == "translate"
+    assert sampler.function_name("Swift.Array.append(__owned A) -> ()") == "append"
+    assert (
+        sampler.function_name("closure #1 (A, A) -> Swift.Bool in __lldb_expr_5.sort<A>([A])")
+        == "closure #1 (A, A) -> Swift.Bool in sort"
+    )
+
+
+def test__aggregate__maps_lines_to_reload_files(sample_filepath: str) -> None:
+    frames = sampler.parse_lookup_output(LOOKUP_OUTPUT)
+    handler, trampoline = 0x7F0000001001, 0x7F0000002001
+    function, caller = 0x7F0000003000, 0x7F0000005000
+    samples = [[handler, trampoline, function, caller]] * 3 + [[handler, trampoline, caller - 1]]
+
+    result = sampler.aggregate(samples, frames, sampler.SourceLocator([sample_filepath]), 1000)
+
+    assert result.samples == 4
+    assert [(f.name, f.self_samples, f.total_samples) for f in result.functions] == [
+        ("findKNearestNeighbors", 3, 3),
+        ("main", 1, 4),
+    ]
+    assert result.functions[0].path == sample_filepath
+    assert result.functions[0].line == 38
+    # the function is declared at the line 38 of the file and at the line 40 of the REPL input
+    assert [(line.line, line.samples) for line in result.lines] == [(46, 3)]
+    assert result.lines[0].source.strip() == "let dx = queryPoint.x - dataPoint.x"
+    assert "findKNearestNeighbors (" in result.to_text()
@@ -0,0 +1,18 @@
+from repltilian import stats
+
+
+def test__run_stats__phases() -> None:
+    run_stats = stats.RunStats("run")
+
+    with run_stats.phase("wait"):
+        pass
+    run_stats.add("batch", 1_000_000)
+    run_stats.add("batch", 500_000)
+
+    assert run_stats.phases_ns["batch"] == 1_500_000
+    assert run_stats.phases_ns["wait"] >= 0
+    lines = run_stats.to_text().split("\n")
+    assert lines[0].startswith("run: ")
+    # phases are listed in the order of their execution
+    assert lines[1].split()[0] == "batch"
+    assert lines[2].split()[0] == "wait"